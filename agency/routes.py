@@ -4,10 +4,12 @@ from models import Agency, User
 from agency import agency_bp
 from auth.utils import login_required, role_required
 from utils.decorators import log_activity
+from utils.db_routing import read_replica
 
 @agency_bp.route('/')
 @login_required
 @role_required('super_admin', 'agency_admin')
+@read_replica
 def list_agencies():
     user_role = session.get('role')
     
@@ -112,6 +114,7 @@ def toggle_agency_status(agency_id):
 @agency_bp.route('/<int:agency_id>/users')
 @login_required
 @role_required('super_admin', 'agency_admin')
+@read_replica
 def agency_users(agency_id):
     user_role = session.get('role')
     current_agency_id = session.get('agency_id')
@@ -1,8 +1,19 @@
 from flask import jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy.exc import IntegrityError
 from app import db
 from models import User, Agency, Product, Order, Customer, Location
 from api import api_bp
+from order.services import create_orders_bulk, idempotency_key_error
+from utils.dashboard_stats import get_dashboard_snapshot
+from utils.db_routing import use_read_replica
+
+MAX_ORDERS_PER_BATCH = 500
+
+@api_bp.before_request
+def route_reads_to_replica():
+    if request.method == 'GET':
+        use_read_replica()
 
 @api_bp.route('/profile')
 @jwt_required()
@@ -162,29 +173,67 @@ def get_order_detail(order_id):
 @api_bp.route('/orders', methods=['POST'])
 @jwt_required()
 def create_order_api():
-    """Create new order via API"""
+    """Create one order, or a batch of orders, via API.
+
+    The body is either a single order object or {"orders": [...]}. Each order
+    may carry an "idempotency_key"; for a single order the Idempotency-Key
+    header is used instead. Retrying with a key that already produced an order
+    returns that order rather than creating a duplicate.
+    """
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
-    data = request.get_json()
-    
-    # Validate required fields
-    if not data.get('customer_id') or not data.get('items'):
-        return jsonify({'error': 'Customer and items are required'}), 400
-    
-    # Validate customer access
-    customer = Customer.query.get(data['customer_id'])
-    if not customer:
-        return jsonify({'error': 'Customer not found'}), 404
+    data = request.get_json(silent=True)
+    header_key = request.headers.get('Idempotency-Key')
     
-    if user.role != 'super_admin' and customer.location.agency_id != user.agency_id:
-        return jsonify({'error': 'Unauthorized customer access'}), 403
+    if isinstance(data, dict) and 'orders' in data:
+        orders = data['orders']
+        if not isinstance(orders, list) or not orders:
+            return jsonify({'error': 'orders must be a non-empty list'}), 400
+        if len(orders) > MAX_ORDERS_PER_BATCH:
+            return jsonify({'error': f'At most {MAX_ORDERS_PER_BATCH} orders per request'}), 400
+        order_requests = [
+            (o.get('idempotency_key') if isinstance(o, dict) else None, o) for o in orders
+        ]
+    elif isinstance(data, dict):
+        # Validate required fields
+        if not data.get('customer_id') or not data.get('items'):
+            return jsonify({'error': 'Customer and items are required'}), 400
+        key = header_key if header_key is not None else data.get('idempotency_key')
+        key_error = idempotency_key_error(key)
+        if key_error:
+            return jsonify({'error': key_error}), 400
+        order_requests = [(key, data)]
+    else:
+        return jsonify({'error': 'Invalid JSON body'}), 400
     
     try:
-        # Create order (implementation similar to web interface)
-        # This would include the full order creation logic
-        return jsonify({'message': 'Order created successfully'}), 201
+        results = create_orders_bulk(user, order_requests)
+    except IntegrityError:
+        # A concurrent request used the same idempotency key; retrying will report it
+        db.session.rollback()
+        return jsonify({'error': 'Conflicting concurrent request, please retry'}), 409
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
+    
+    if 'orders' not in data:
+        result = results[0]
+        if result['status'] == 'error':
+            status_code = {'Customer not found': 404, 'Unauthorized customer access': 403}.get(result['error'], 400)
+            return jsonify({'error': result['error']}), status_code
+        return jsonify({
+            'message': 'Order created successfully' if result['status'] == 'created' else 'Order already created',
+            'order_id': result['order_id'],
+            'order_number': result['order_number']
+        }), 201 if result['status'] == 'created' else 200
+    
+    failed = sum(1 for r in results if r['status'] == 'error')
+    return jsonify({
+        'created': sum(1 for r in results if r['status'] == 'created'),
+        'duplicates': sum(1 for r in results if r['status'] == 'duplicate'),
+        'failed': failed,
+        'results': results
+    }), 207 if failed else 201
 
 @api_bp.route('/dashboard/stats')
 @jwt_required()
@@ -193,24 +242,15 @@ def get_dashboard_stats():
     user_id = get_jwt_identity()
     user = User.query.get(user_id)
     
+    snapshot = get_dashboard_snapshot(user.role, user_id=user.id, agency_id=user.agency_id)
+    counters = snapshot['stats']
+    
     if user.role == 'super_admin':
-        stats = {
-            'total_agencies': Agency.query.count(),
-            'total_orders': Order.query.count(),
-            'total_products': Product.query.count(),
-            'total_customers': Customer.query.count()
-        }
+        keys = ['total_agencies', 'total_orders', 'total_products', 'total_customers']
     elif user.role == 'salesperson':
-        stats = {
-            'my_orders': Order.query.filter_by(salesperson_id=user_id).count(),
-            'pending_orders': Order.query.filter_by(salesperson_id=user_id, status='pending').count(),
-            'confirmed_orders': Order.query.filter_by(salesperson_id=user_id, status='confirmed').count()
-        }
+        keys = ['my_orders', 'pending_orders', 'confirmed_orders']
     else:
-        stats = {
-            'agency_orders': Order.query.filter_by(agency_id=user.agency_id).count(),
-            'agency_products': Product.query.filter_by(agency_id=user.agency_id).count(),
-            'agency_customers': Customer.query.join(Location).filter(Location.agency_id == user.agency_id).count()
-        }
+        keys = ['agency_orders', 'agency_products', 'agency_customers']
+    stats = {key: counters[key] for key in keys}
     
     return jsonify(stats)
@@ -1,11 +1,13 @@
 import os
 import logging
+import time
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from datetime import timedelta
+from utils.db_routing import RoutingSession, replica_binds
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -13,22 +15,58 @@ logging.basicConfig(level=logging.DEBUG)
 class Base(DeclarativeBase):
     pass
 
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={'class_': RoutingSession})
 jwt = JWTManager()
 
 def create_app():
+    started = time.perf_counter()
     app = Flask(__name__)
     
+    from utils.concurrency import engine_pool_options
+
     # Configuration
     app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key")
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL", "sqlite:///agency_sales.db")
     app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
         "pool_recycle": 300,
         "pool_pre_ping": True,
+        # Pool sized for this worker's threads or greenlets, as gunicorn.conf.py started it
+        **engine_pool_options(app.config["SQLALCHEMY_DATABASE_URI"]),
     }
+    # Optional read replica for reports, dashboards, list pages, exports and API reads,
+    # with its own pool sized to the replica's connection limit
+    replica_url = os.environ.get("DATABASE_REPLICA_URL")
+    app.config["SQLALCHEMY_BINDS"] = replica_binds(replica_url, {
+        "pool_recycle": 300,
+        "pool_pre_ping": True,
+        **engine_pool_options(replica_url or "", replica=True),
+    })
+    app.config["DATABASE_REPLICA_STICKY_SECONDS"] = float(os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", 5))
     app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY", "jwt-secret-string")
     app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=1)
     app.config["JWT_REFRESH_TOKEN_EXPIRES"] = timedelta(days=30)
+    app.config["ORDERS_PER_PAGE"] = int(os.environ.get("ORDERS_PER_PAGE", 50))
+    app.config["ORDERS_MAX_PER_PAGE"] = int(os.environ.get("ORDERS_MAX_PER_PAGE", 200))
+    app.config["LIST_PER_PAGE"] = int(os.environ.get("LIST_PER_PAGE", 50))
+    app.config["LIST_MAX_PER_PAGE"] = int(os.environ.get("LIST_MAX_PER_PAGE", 200))
+    app.config["ORDER_COUNT_CACHE_TTL"] = int(os.environ.get("ORDER_COUNT_CACHE_TTL", 60))
+    app.config["DASHBOARD_STATS_CACHE_TTL"] = int(os.environ.get("DASHBOARD_STATS_CACHE_TTL", 30))
+    app.config["TYPEAHEAD_MAX_AGE"] = int(os.environ.get("TYPEAHEAD_MAX_AGE", 60))
+    app.config["ACTIVITY_LOG_ASYNC"] = os.environ.get("ACTIVITY_LOG_ASYNC", "true").lower() == "true"
+    app.config["ACTIVITY_LOG_QUEUE_SIZE"] = int(os.environ.get("ACTIVITY_LOG_QUEUE_SIZE", 10000))
+    app.config["ACTIVITY_LOG_BATCH_SIZE"] = int(os.environ.get("ACTIVITY_LOG_BATCH_SIZE", 200))
+    app.config["ACTIVITY_LOG_FLUSH_INTERVAL"] = float(os.environ.get("ACTIVITY_LOG_FLUSH_INTERVAL", 1.0))
+    app.config["EXPORT_JOB_WORKERS"] = int(os.environ.get("EXPORT_JOB_WORKERS", 2))
+    app.config["EXPORT_JOB_TTL"] = int(os.environ.get("EXPORT_JOB_TTL", 3600))
+    app.config["BULK_LOAD_BACKEND"] = os.environ.get("BULK_LOAD_BACKEND", "auto")
+    app.config["USER_IMPORT_HASH_WORKERS"] = int(os.environ.get("USER_IMPORT_HASH_WORKERS", 0)) or None
+    app.config["AUTO_INIT_DB"] = os.environ.get("AUTO_INIT_DB", "false").lower() == "true"
+    app.config["QUERY_STATS"] = os.environ.get("QUERY_STATS", "true").lower() == "true"
+    app.config["N_PLUS_ONE_THRESHOLD"] = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 0))
+    if os.environ.get("N_PLUS_ONE_RAISE"):
+        app.config["N_PLUS_ONE_RAISE"] = os.environ["N_PLUS_ONE_RAISE"].lower() == "true"
+    if os.environ.get("EXPORT_SPOOL_DIR"):
+        app.config["EXPORT_SPOOL_DIR"] = os.environ["EXPORT_SPOOL_DIR"]
     
     app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
     
@@ -36,6 +74,27 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     
+    from utils.activity_log import activity_log_writer
+    activity_log_writer.init_app(app)
+    
+    from utils.export_jobs import export_job_runner
+    export_job_runner.init_app(app)
+    
+    from utils.query_stats import request_query_stats
+    request_query_stats.init_app(app)
+    
+    # CLI commands
+    from utils.sales_rollup import backfill_sales_rollup_command
+    app.cli.add_command(backfill_sales_rollup_command)
+    from utils.db_setup import init_db_command
+    app.cli.add_command(init_db_command)
+    from utils.db_indexes import create_indexes_command
+    app.cli.add_command(create_indexes_command)
+    from utils.search import create_search_index_command
+    app.cli.add_command(create_search_index_command)
+    from utils.synthetic_data import generate_data_command
+    app.cli.add_command(generate_data_command)
+    
     # Register blueprints
     from auth import auth_bp
     from agency import agency_bp
@@ -46,6 +105,8 @@ def create_app():
     from order import order_bp
     from super_admin import super_admin_bp
     from api import api_bp
+    from exports import exports_bp
+    from search import search_bp
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(agency_bp, url_prefix='/agency')
@@ -56,6 +117,8 @@ def create_app():
     app.register_blueprint(order_bp, url_prefix='/order')
     app.register_blueprint(super_admin_bp, url_prefix='/super_admin')
     app.register_blueprint(api_bp, url_prefix='/api/v1')
+    app.register_blueprint(exports_bp, url_prefix='/exports')
+    app.register_blueprint(search_bp, url_prefix='/search')
     
     # Main routes
     @app.route('/')
@@ -65,82 +128,20 @@ def create_app():
             return redirect(url_for('auth.login'))
         return render_template('index.html')
     
-    with app.app_context():
-        import models
-        db.create_all()
-        
-        # Create default super admin if not exists
-        from models import User, Agency
-        from werkzeug.security import generate_password_hash
-        
-        if not User.query.filter_by(role='super_admin').first():
-            admin = User(
-                username='admin',
-                email='admin@system.com',
-                password_hash=generate_password_hash('admin123'),
-                role='super_admin',
-                is_active=True
-            )
-            db.session.add(admin)
-            db.session.commit()
-            logging.info("Default super admin created: admin/admin123")
-        
-        # Create sample agency and users for testing
-        if not Agency.query.first():
-            # Create sample agency
-            sample_agency = Agency(
-                name='Sample Marketing Agency',
-                code='SMA001',
-                address='123 Business Street, City, State 12345',
-                phone='(555) 123-4567',
-                email='info@sampleagency.com',
-                is_active=True
-            )
-            db.session.add(sample_agency)
-            db.session.commit()
-            
-            # Create agency admin
-            agency_admin = User(
-                username='agency_admin',
-                email='admin@sampleagency.com',
-                password_hash=generate_password_hash('admin123'),
-                first_name='John',
-                last_name='Manager',
-                role='agency_admin',
-                agency_id=sample_agency.id,
-                is_active=True
-            )
-            
-            # Create agency staff
-            agency_staff = User(
-                username='agency_staff',
-                email='staff@sampleagency.com',
-                password_hash=generate_password_hash('staff123'),
-                first_name='Jane',
-                last_name='Staff',
-                role='staff',
-                agency_id=sample_agency.id,
-                is_active=True
-            )
-            
-            # Create salesperson
-            salesperson = User(
-                username='salesperson',
-                email='sales@sampleagency.com',
-                password_hash=generate_password_hash('sales123'),
-                first_name='Mike',
-                last_name='Sales',
-                role='salesperson',
-                agency_id=sample_agency.id,
-                is_active=True
-            )
-            
-            db.session.add_all([agency_admin, agency_staff, salesperson])
-            db.session.commit()
-            logging.info("Sample agency and users created:")
-            logging.info("  Agency Admin: agency_admin/admin123")
-            logging.info("  Staff: agency_staff/staff123")
-            logging.info("  Salesperson: salesperson/sales123")
+    # Schema and seed data are managed with `flask init-db`, so creating the app
+    # touches no database; AUTO_INIT_DB=true does it whenever the app is created.
+    init_seconds = None
+    if app.config["AUTO_INIT_DB"]:
+        with app.app_context():
+            from utils.db_setup import init_db
+            init_seconds = init_db()
+    
+    app.extensions['startup_timings'] = {
+        'create_app': time.perf_counter() - started,
+        'init_db': init_seconds
+    }
+    logging.info("App created in %.0f ms (%s)", app.extensions['startup_timings']['create_app'] * 1000,
+                 f"database init {init_seconds * 1000:.0f} ms" if init_seconds is not None else "no database init")
     
     return app
 
@@ -3,9 +3,10 @@ from flask_jwt_extended import create_access_token, create_refresh_token, jwt_re
 from werkzeug.security import check_password_hash, generate_password_hash
 from datetime import datetime
 from app import db
-from models import User, Agency, ActivityLog
+from models import User, Agency
 from auth import auth_bp
 from utils.decorators import log_activity
+from utils.activity_log import activity_log_writer
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -31,15 +32,13 @@ def login():
             session['agency_id'] = user.agency_id
             
             # Log activity
-            log = ActivityLog(
+            activity_log_writer.log(
                 user_id=user.id,
                 action='login',
                 description=f'User {user.username} logged in',
                 ip_address=request.remote_addr,
                 user_agent=request.headers.get('User-Agent')
             )
-            db.session.add(log)
-            db.session.commit()
             
             flash('Login successful!', 'success')
             
@@ -116,15 +115,13 @@ def logout():
     user_id = session.get('user_id')
     if user_id:
         # Log activity
-        log = ActivityLog(
+        activity_log_writer.log(
             user_id=user_id,
             action='logout',
             description=f'User logged out',
             ip_address=request.remote_addr,
             user_agent=request.headers.get('User-Agent')
         )
-        db.session.add(log)
-        db.session.commit()
     
     session.clear()
     flash('You have been logged out', 'info')
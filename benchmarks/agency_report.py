@@ -0,0 +1,140 @@
+"""Correctness and runtime of the super admin agency performance report.
+
+Run with: python -m benchmarks.agency_report [--agencies 100] [--orders 10000] [--legacy]
+Builds a synthetic dataset in a throwaway SQLite database (unless
+DATABASE_URL is set), checks every reported total against the values
+computed while generating the data, and times the report query.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from decimal import Decimal
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+from sqlalchemy import func, insert
+from app import app, db
+from models import Agency, Customer, Location, Order, Product, User
+from utils.reports import agency_performance
+from utils.sales_rollup import backfill_sales_rollup
+
+def build_dataset(agency_count, order_count, products_per_agency=20, customers_per_agency=10, seed=7):
+    """Bulk-insert a dataset and return the expected totals per agency code"""
+    rng = random.Random(seed)
+    salesperson_id = User.query.first().id
+
+    db.session.execute(insert(Agency), [
+        {'name': f'Bench Agency {i:04d}', 'code': f'BA{i:04d}', 'is_active': True}
+        for i in range(agency_count)
+    ])
+    agencies = {a.code: a.id for a in Agency.query.filter(Agency.code.like('BA%'))}
+    expected = {code: {'total_orders': 0, 'total_revenue': Decimal('0'), 'total_products': products_per_agency,
+                       'total_customers': customers_per_agency} for code in agencies}
+
+    db.session.execute(insert(Location), [
+        {'name': f'Location {code}', 'agency_id': agency_id, 'is_active': True}
+        for code, agency_id in agencies.items()
+    ])
+    locations = {l.agency_id: l.id for l in Location.query.filter(Location.agency_id.in_(agencies.values()))}
+
+    db.session.execute(insert(Product), [
+        {'name': f'Product {n}', 'sku': f'{code}-{n:03d}', 'price': 10, 'agency_id': agency_id, 'is_active': True}
+        for code, agency_id in agencies.items() for n in range(products_per_agency)
+    ])
+    db.session.execute(insert(Customer), [
+        {'name': f'Customer {n}', 'location_id': locations[agency_id], 'is_active': True}
+        for agency_id in agencies.values() for n in range(customers_per_agency)
+    ])
+    customers = {}
+    for customer_id, location_id in db.session.query(Customer.id, Customer.location_id):
+        customers.setdefault(location_id, []).append(customer_id)
+
+    codes = list(agencies)
+    rows = []
+    for n in range(order_count):
+        code = rng.choice(codes)
+        agency_id = agencies[code]
+        amount = Decimal(rng.randint(100, 100000)) / 100
+        expected[code]['total_orders'] += 1
+        expected[code]['total_revenue'] += amount
+        rows.append({
+            'order_number': f'BENCH-{n:08d}',
+            'customer_id': rng.choice(customers[locations[agency_id]]),
+            'agency_id': agency_id,
+            'salesperson_id': salesperson_id,
+            'status': 'pending',
+            'total_amount': amount
+        })
+        if len(rows) == 5000:
+            db.session.execute(insert(Order), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Order), rows)
+    db.session.commit()
+    backfill_sales_rollup()
+    return expected
+
+def legacy_report():
+    """The original single-statement report, for comparison"""
+    return db.session.query(
+        Agency.name,
+        Agency.code,
+        func.count(Order.id).label('total_orders'),
+        func.sum(Order.total_amount).label('total_revenue'),
+        func.count(Product.id).label('total_products'),
+        func.count(Customer.id).label('total_customers')
+    ).outerjoin(Order, Order.agency_id == Agency.id) \
+     .outerjoin(Product, Product.agency_id == Agency.id) \
+     .outerjoin(Location, Location.agency_id == Agency.id) \
+     .outerjoin(Customer, Customer.location_id == Location.id) \
+     .group_by(Agency.id).all()
+
+def check(rows, expected):
+    """Return the number of agencies whose reported totals differ from expected"""
+    mismatches = 0
+    for row in rows:
+        if row.code not in expected:
+            continue
+        want = expected[row.code]
+        got = (row.total_orders, Decimal(str(row.total_revenue or 0)).quantize(Decimal('0.01')),
+               row.total_products, row.total_customers)
+        if got != (want['total_orders'], want['total_revenue'], want['total_products'], want['total_customers']):
+            mismatches += 1
+    return mismatches
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agencies', type=int, default=100)
+    parser.add_argument('--orders', type=int, default=10000)
+    parser.add_argument('--legacy', action='store_true', help='also run the original cartesian-join report')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        expected, build_time = timed(lambda: build_dataset(args.agencies, args.orders))
+        print(f'dataset: {args.agencies} agencies, {args.orders} orders built in {build_time:.1f}s')
+
+        reports = [('agency_performance', agency_performance)]
+        if args.legacy:
+            reports.append(('legacy', legacy_report))
+
+        failed = False
+        for name, report in reports:
+            rows, elapsed = timed(report)
+            mismatches = check(rows, expected)
+            failed = failed or (name != 'legacy' and mismatches > 0)
+            print(f'{name:>20}: {elapsed * 1000:9.1f} ms, {mismatches} of {len(expected)} agencies wrong')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""Check that every bulk-load backend writes the same rows, and time the imports on each.
+
+Run with: python -m benchmarks.bulk_load [--rows 5000] [--users 40]
+Runs the location, customer, product (insert, then upsert) and user
+importers once per backend: executemany everywhere, and COPY as well when
+DATABASE_URL points at PostgreSQL with psycopg2 (otherwise a throwaway
+SQLite database is used and only executemany runs). Each backend imports
+into its own agency, from the same rows, which include quotes, commas,
+newlines, backslashes, a literal \\N, non-ASCII text and blank optional
+fields. The resulting rows are read back and compared column by column
+(ids, timestamps and password hashes aside); the exit status is 1 if
+they differ between backends or any import reports an error.
+"""
+import argparse
+import io
+import os
+import sys
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('ACTIVITY_LOG_ASYNC', 'false')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+import csv
+import logging
+from werkzeug.datastructures import FileStorage
+from app import app, db
+from models import Agency, Customer, Location, Product, User
+from customer.services import import_customer_rows
+from location.services import import_location_rows
+from super_admin.services import import_user_rows
+from utils.excel_utils import import_products_from_excel
+
+TRICKY = ['Comma, Inc', 'Quote "Q" Ltd', 'Line\nbreak', 'Back\\slash', '\\N', 'Café ☕ Ünïcode', "O'Brien"]
+
+def tricky(n):
+    return TRICKY[n % len(TRICKY)]
+
+def product_file(tag, rows, price_offset=0):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(['Name', 'SKU', 'Price', 'Cost', 'Stock Quantity', 'Category', 'Description'])
+    for n in range(rows):
+        writer.writerow([f'{tricky(n)} product {n}', f'BL-{tag}-{n:06d}', f'{n % 90 + 9.99 + price_offset:.2f}',
+                         f'{n % 40 + 1.5}' if n % 5 else '', n % 300, 'Bench' if n % 3 else '',
+                         tricky(n + 1) if n % 2 else ''])
+    return FileStorage(io.BytesIO(output.getvalue().encode()), filename='products.csv')
+
+def run_imports(tag, code, rows, users):
+    """Import everything for one backend into agency `code`; returns [(step, rows, seconds, errors)]"""
+    steps = []
+
+    def step(name, count, function):
+        started = time.perf_counter()
+        result = function()
+        steps.append((name, count, time.perf_counter() - started, result.get('error_count', 0)))
+
+    step('locations', 20, lambda: import_location_rows([{
+        'name': f'{tricky(n)} location {n}', 'address': tricky(n + 2), 'city': 'Springfield',
+        'state': 'IL', 'zip_code': '' if n % 2 else '62701', 'phone': '555-0100', 'agency_code': code
+    } for n in range(20)], 'super_admin', None))
+    step('customers', rows, lambda: import_customer_rows([{
+        'name': f'{tricky(n)} customer {n}', 'email': f'c{n}@{tag}.example.com' if n % 4 else '',
+        'phone': '' if n % 3 else '555-0199', 'address': tricky(n + 3),
+        'location_name': f'{tricky(n % 20)} location {n % 20}', 'agency_code': code
+    } for n in range(rows)], 'super_admin', None))
+    agency_id = Agency.query.filter_by(code=code).one().id
+    step('products insert', rows, lambda: import_products_from_excel(
+        product_file(tag, rows), agency_id, 'super_admin'))
+    # The same SKUs with new prices, plus half as many new ones
+    step('products upsert', rows + rows // 2, lambda: import_products_from_excel(
+        product_file(tag, rows + rows // 2, price_offset=1), agency_id, 'super_admin', mode='upsert'))
+    step('users', users, lambda: import_user_rows([{
+        'username': f'bl_{tag}_{n}', 'email': f'bl_{tag}_{n}@example.com', 'role': 'salesperson',
+        'agency_code': code, 'password': f'secret-{n}'
+    } for n in range(users)]))
+    return steps
+
+def snapshot(tag, code):
+    """The agency's rows, comparable across backends"""
+    agency_id = Agency.query.filter_by(code=code).one().id
+
+    def plain(obj, columns):
+        return tuple(str(getattr(obj, column)).replace(tag, '*') for column in columns)
+
+    locations = Location.query.filter_by(agency_id=agency_id).all()
+    names = {location.id: location.name for location in locations}
+    customers = Customer.query.filter(Customer.location_id.in_(names)).all()
+    rows = {
+        'locations': sorted(plain(l, ['name', 'address', 'city', 'state', 'zip_code', 'phone', 'is_active'])
+                            for l in locations),
+        'customers': sorted(plain(c, ['name', 'email', 'phone', 'address', 'is_active']) + (names[c.location_id],)
+                            for c in customers),
+        'products': sorted(plain(p, ['name', 'sku', 'price', 'cost', 'stock_quantity', 'category',
+                                     'description', 'is_active'])
+                           for p in Product.query.filter_by(agency_id=agency_id)),
+        'users': sorted(plain(u, ['username', 'email', 'role', 'is_active'])
+                        for u in User.query.filter_by(agency_id=agency_id)),
+    }
+    missing_defaults = sum(1 for model, query in (
+        (Location, Location.query.filter_by(agency_id=agency_id)),
+        (Customer, Customer.query.filter(Customer.location_id.in_(names))),
+        (Product, Product.query.filter_by(agency_id=agency_id)),
+        (User, User.query.filter_by(agency_id=agency_id)),
+    ) for obj in query if obj.created_at is None)
+    return rows, missing_defaults
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=40)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    failures = []
+    snapshots = {}
+    with app.app_context():
+        bind = db.engine
+        backends = ['executemany']
+        if bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2':
+            backends.append('copy')
+        print(f'Database: {bind.dialect.name}+{bind.dialect.driver}, backends: {", ".join(backends)}')
+
+        run = str(int(time.time()))[-6:]
+        for backend in backends:
+            app.config['BULK_LOAD_BACKEND'] = backend
+            tag = f'{backend[:2]}{run}'
+            code = f'BL{tag}'.upper()
+            db.session.add(Agency(name=f'Bulk load {backend} {run}', code=code, is_active=True))
+            db.session.commit()
+
+            for name, count, seconds, errors in run_imports(tag, code, args.rows, args.users):
+                print(f'{backend:>12} {name:>16}: {count:6d} rows in {seconds:6.2f}s '
+                      f'({count / seconds if seconds else 0:8.0f} rows/s), {errors} errors')
+                if errors:
+                    failures.append(f'{backend} {name} import reported {errors} errors')
+            snapshots[backend], missing_defaults = snapshot(tag, code)
+            if missing_defaults:
+                failures.append(f'{backend}: {missing_defaults} rows without created_at')
+
+    reference = snapshots['executemany']
+    for backend, rows in snapshots.items():
+        for table, table_rows in rows.items():
+            if table_rows != reference[table]:
+                differing = len(set(table_rows) ^ set(reference[table]))
+                failures.append(f'{backend} wrote different {table} rows than executemany ({differing} differ)')
+            elif backend != 'executemany':
+                print(f'{backend:>12} {table:>16}: {len(table_rows)} rows identical to executemany')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
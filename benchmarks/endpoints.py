@@ -0,0 +1,239 @@
+"""Latency and query counts of each blueprint's list, search, detail, export and import endpoints.
+
+Run with: python -m benchmarks.endpoints [--orders 100000] [--repeat 5]
+              [--output results.json] [--compare baseline.json --tolerance 25]
+Generates a synthetic dataset (see utils.synthetic_data) in a throwaway
+SQLite database unless DATABASE_URL is set, or reuses it when a dataset
+with the same prefix is already there. Each endpoint is requested once to
+warm caches and then --repeat times through the test client, as a super
+admin and as the admin of the largest agency. Imports run as dry runs so
+the dataset is unchanged. Results can be written as JSON and compared
+with an earlier run; the exit status is 1 when a median regresses by more
+than --tolerance percent or an endpoint fails.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('ACTIVITY_LOG_ASYNC', 'false')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+import logging
+from app import app, db
+from models import Agency, Customer, Location, Order, Product, User
+from utils.synthetic_data import SYNTHETIC_PASSWORD, SyntheticDataGenerator
+
+SERVER_TIMING_QUERIES = re.compile(r'db;dur=[\d.]+;desc="(\d+) queries"')
+
+def csv_upload(lines, filename='import.csv'):
+    return {'file': (io.BytesIO('\n'.join(lines).encode()), filename), 'dry_run': '1'}
+
+def import_rows(prefix, agency_code, location_name, rows):
+    """Upload payloads for the import endpoints: mostly new rows plus some that fail validation"""
+    customers = ['name,email,phone,address,location_name,agency_code'] + [
+        f'Bench Customer {n},bench{n}@example.com,555-0100,1 Bench Road,'
+        f'{location_name if n % 50 else "Missing"},{agency_code}' for n in range(rows)]
+    locations = ['name,address,city,state,zip_code,phone,agency_code'] + [
+        f'Bench Location {n},1 Bench Road,Springfield,IL,62701,555-0100,{agency_code if n % 50 else "NOPE"}'
+        for n in range(rows)]
+    products = ['Name,SKU,Price,Cost,Stock Quantity,Category'] + [
+        f'Bench Product {n},{prefix}-BENCH-{n:06d},{n % 90 + 9.99},{n % 40 + 1.5},{n % 300},Bench'
+        for n in range(rows)]
+    users = ['username,email,role,agency_code,password'] + [
+        f'bench_user_{n},bench_user_{n}@example.com,salesperson,{agency_code},{"secret12" if n % 50 else "x"}'
+        for n in range(rows)]
+    return {'customers': customers, 'locations': locations, 'products': products, 'users': users}
+
+def endpoints(ids, uploads):
+    """(name, role, method, path, data factory or None); role is 'super_admin' or 'agency_admin'"""
+    return [
+        ('order.list_orders', 'super_admin', 'GET', '/order/', None),
+        ('order.list_orders', 'agency_admin', 'GET', '/order/', None),
+        ('order.list_orders?status', 'agency_admin', 'GET', '/order/?status=pending', None),
+        ('order.view_order', 'agency_admin', 'GET', f'/order/{ids["order"]}', None),
+        ('order.export_orders', 'agency_admin', 'GET', '/order/export', None),
+        ('order.list_orders?q', 'agency_admin', 'GET', f'/order/?q={ids["order_number"]}', None),
+        ('search.search orders', 'agency_admin', 'GET', f'/search/orders?q={ids["customer_name"]}', None),
+        ('customer.list_customers', 'agency_admin', 'GET', '/customer/', None),
+        ('customer.list_customers?q', 'agency_admin', 'GET', f'/customer/?q={ids["customer_name"]}', None),
+        ('search.search customers', 'agency_admin', 'GET', f'/search/customers?q={ids["customer_name"]}', None),
+        ('customer.edit_customer', 'agency_admin', 'GET', f'/customer/{ids["customer"]}/edit', None),
+        ('customer.export_customers', 'agency_admin', 'GET', '/customer/export', None),
+        ('customer.import_customers', 'agency_admin', 'POST', '/customer/import',
+         lambda: csv_upload(uploads['customers'])),
+        ('product.list_products', 'agency_admin', 'GET', '/product/', None),
+        ('product.list_products?q', 'agency_admin', 'GET', f'/product/?q={ids["product_sku"]}', None),
+        ('search.search products', 'agency_admin', 'GET', '/search/products?q=item', None),
+        ('product.edit_product', 'agency_admin', 'GET', f'/product/{ids["product"]}/edit', None),
+        ('product.export_products', 'agency_admin', 'GET', '/product/export', None),
+        ('product.import_products', 'agency_admin', 'POST', '/product/import',
+         lambda: csv_upload(uploads['products'])),
+        ('location.list_locations', 'agency_admin', 'GET', '/location/', None),
+        ('location.edit_location', 'agency_admin', 'GET', f'/location/{ids["location"]}/edit', None),
+        ('location.export_locations', 'agency_admin', 'GET', '/location/export', None),
+        ('location.import_locations', 'agency_admin', 'POST', '/location/import',
+         lambda: csv_upload(uploads['locations'])),
+        ('salesperson.list_salespersons', 'agency_admin', 'GET', '/salesperson/', None),
+        ('agency.list_agencies', 'super_admin', 'GET', '/agency/', None),
+        ('agency.agency_users', 'super_admin', 'GET', f'/agency/{ids["agency"]}/users', None),
+        ('super_admin.dashboard', 'super_admin', 'GET', '/super_admin/dashboard', None),
+        ('super_admin.manage_users', 'super_admin', 'GET', '/super_admin/users', None),
+        ('super_admin.view_activities', 'super_admin', 'GET', '/super_admin/activities', None),
+        ('super_admin.reports', 'super_admin', 'GET', '/super_admin/reports', None),
+        ('super_admin.export_users', 'super_admin', 'GET', '/super_admin/users/export', None),
+        ('super_admin.import_users', 'super_admin', 'POST', '/super_admin/users/import',
+         lambda: csv_upload(uploads['users'])),
+        ('index', 'agency_admin', 'GET', '/', None),
+    ]
+
+def ensure_dataset(args):
+    prefix_agency = Agency.query.filter(Agency.code.like(f'{args.prefix}%')).first()
+    if prefix_agency:
+        print(f'reusing dataset with prefix {args.prefix}')
+        return
+    started = time.perf_counter()
+    counts = SyntheticDataGenerator(
+        agencies=args.agencies, customers=max(args.orders // 10, args.agencies), orders=args.orders,
+        seed=args.seed, prefix=args.prefix
+    ).generate()
+    print(f'dataset built in {time.perf_counter() - started:.1f}s: '
+          + ', '.join(f'{count} {table}' for table, count in counts.items()))
+
+def largest_agency(prefix):
+    agency_id, = db.session.query(Order.agency_id).join(Agency).filter(Agency.code.like(f'{prefix}%')) \
+        .group_by(Order.agency_id).order_by(db.func.count(Order.id).desc()).first()
+    return db.session.get(Agency, agency_id)
+
+def measure(client, method, path, data, repeat):
+    timings = []
+    response = None
+    for attempt in range(repeat + 1):
+        kwargs = {}
+        if data is not None:
+            kwargs = {'data': data(), 'content_type': 'multipart/form-data'}
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        response.get_data()
+        elapsed = (time.perf_counter() - started) * 1000
+        if attempt:  # the first request only warms caches
+            timings.append(elapsed)
+    match = SERVER_TIMING_QUERIES.search(', '.join(response.headers.getlist('Server-Timing')))
+    timings.sort()
+    return {
+        'status': response.status_code,
+        'queries': int(match.group(1)) if match else None,
+        'median_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'min_ms': round(timings[0], 2),
+        'bytes': len(response.get_data())
+    }
+
+def compare(results, baseline, tolerance):
+    """Print the change against baseline per endpoint and return the names that regressed"""
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get('results', {}).get(key)
+        if not before:
+            continue
+        change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100 if before['median_ms'] else 0
+        queries = '' if result['queries'] == before.get('queries') else f", queries {before.get('queries')} -> {result['queries']}"
+        flag = 'REGRESSED' if change > tolerance else ''
+        print(f'{key:>52}: {before["median_ms"]:9.1f} -> {result["median_ms"]:9.1f} ms ({change:+6.1f}%{queries}) {flag}')
+        if flag:
+            regressions.append(key)
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--agencies', type=int, default=20)
+    parser.add_argument('--orders', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='SYN')
+    parser.add_argument('--import-rows', type=int, default=2000, help='rows per import upload')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='only endpoints whose name contains this text')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=25.0, help='allowed median slowdown in percent')
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        ensure_dataset(args)
+        agency = largest_agency(args.prefix)
+        location = Location.query.filter_by(agency_id=agency.id).order_by(Location.id).first()
+        order = Order.query.filter_by(agency_id=agency.id).order_by(Order.id.desc()).first()
+        customer = Customer.query.filter_by(location_id=location.id).first()
+        product = Product.query.filter_by(agency_id=agency.id).first()
+        ids = {
+            'agency': agency.id,
+            'location': location.id,
+            'order': order.id,
+            'customer': customer.id,
+            'product': product.id,
+            # Search terms: a distinctive part of a real order number, customer name and SKU
+            'order_number': order.order_number[-6:],
+            'customer_name': customer.name.split()[-1],
+            'product_sku': product.sku[-5:]
+        }
+        admin_username = User.query.filter_by(role='agency_admin', agency_id=agency.id).order_by(User.id).first().username
+        uploads = import_rows(args.prefix, agency.code, location.name, args.import_rows)
+        dialect = db.engine.dialect.name
+
+    clients = {'super_admin': app.test_client(), 'agency_admin': app.test_client()}
+    clients['super_admin'].post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+    clients['agency_admin'].post('/auth/login', data={'username': admin_username, 'password': SYNTHETIC_PASSWORD})
+
+    results = {}
+    failed = []
+    for name, role, method, path, data in endpoints(ids, uploads):
+        if args.only and args.only not in name:
+            continue
+        key = f'{name} [{role}]'
+        result = measure(clients[role], method, path, data, args.repeat)
+        results[key] = result
+        if result['status'] >= 400:
+            failed.append(key)
+        print(f'{key:>52}: median {result["median_ms"]:9.1f} ms, p95 {result["p95_ms"]:9.1f} ms, '
+              f'{result["queries"]} queries, HTTP {result["status"]}')
+
+    report = {
+        'meta': {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'dialect': dialect,
+            'orders': args.orders,
+            'agencies': args.agencies,
+            'seed': args.seed,
+            'repeat': args.repeat,
+            'python': platform.python_version()
+        },
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+        print(f'results written to {args.output}')
+
+    regressions = []
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    for key in failed:
+        print(f'FAILED: {key} returned HTTP {results[key]["status"]}')
+    for key in regressions:
+        print(f'REGRESSED: {key} is more than {args.tolerance:.0f}% slower than the baseline')
+    return 1 if failed or regressions else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""Import time and memory of `import app`, as paid by every gunicorn worker.
+
+Run with: python -m benchmarks.import_budget [--max-ms 1500] [--max-rss-mb 90]
+Imports the app in a fresh interpreter with `python -X importtime` and the
+default configuration, under which creating the app does no database
+setup, so only module loading is measured. Fails when the cumulative
+import time or the resident memory afterwards is over budget, or when a
+heavy optional dependency (pandas, numpy, openpyxl) was loaded at import
+rather than on the code path that needs it.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+CHILD = """
+import sys
+import app
+rss_kb = 0
+try:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                rss_kb = int(line.split()[1])
+except OSError:
+    import resource
+    rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print('RSS_KB', rss_kb)
+print('HEAVY', ','.join(name for name in %r if name in sys.modules))
+""" % (HEAVY_MODULES,)
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def run_import():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=root, env=env,
+                            capture_output=True, text=True, check=True)
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    rss_kb = int(re.search(r'RSS_KB (\d+)', result.stdout).group(1))
+    heavy = [name for name in re.search(r'HEAVY (.*)', result.stdout).group(1).split(',') if name]
+    return modules, rss_kb, heavy
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--max-ms', type=float, default=1500, help='budget for the cumulative import time of app')
+    parser.add_argument('--max-rss-mb', type=float, default=90, help='budget for resident memory after import')
+    parser.add_argument('--top', type=int, default=10, help='how many of the slowest top-level imports to list')
+    args = parser.parse_args(argv)
+
+    modules, rss_kb, heavy = run_import()
+    app_ms = next(cumulative for name, _, cumulative, _ in modules if name == 'app') / 1000
+    rss_mb = rss_kb / 1024
+
+    print('slowest imports (cumulative):')
+    top_level = sorted((m for m in modules if m[3] <= 1), key=lambda m: -m[2])
+    for name, _, cumulative_us, _ in top_level[:args.top]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+    print(f'import app: {app_ms:.0f} ms (budget {args.max_ms:.0f} ms)')
+    print(f'RSS after import: {rss_mb:.0f} MB (budget {args.max_rss_mb:.0f} MB)')
+
+    failures = []
+    if app_ms > args.max_ms:
+        failures.append(f'import time {app_ms:.0f} ms is over budget')
+    if rss_mb > args.max_rss_mb:
+        failures.append(f'RSS {rss_mb:.0f} MB is over budget')
+    if heavy:
+        failures.append(f'loaded at import: {", ".join(heavy)}; import them where they are used')
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,152 @@
+"""Check that the hot list and API queries are planned with the indexes in models.py.
+
+Run with: python -m benchmarks.index_usage [--orders 20000] [--verbose]
+Builds a synthetic dataset in a throwaway SQLite database (unless
+DATABASE_URL is set), creates any declared index the database is
+missing, then EXPLAINs each query and fails if none of the expected
+indexes appears in its plan. On PostgreSQL sequential scans are disabled
+for the check, so a small dataset does not hide a missing index.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+from sqlalchemy import func, insert, text
+from app import app, db
+from models import ActivityLog, Agency, Customer, Location, Order, OrderItem, Product, User
+from utils.db_indexes import create_missing_indexes, explain
+
+def build_dataset(order_count, agency_count=20, seed=11):
+    rng = random.Random(seed)
+    db.session.execute(insert(Agency), [
+        {'name': f'Index Agency {i:03d}', 'code': f'IX{i:03d}', 'is_active': True} for i in range(agency_count)
+    ])
+    agency_ids = [a.id for a in Agency.query.filter(Agency.code.like('IX%'))]
+    db.session.execute(insert(User), [
+        {'username': f'ix_sales_{agency_id}', 'email': f'ix_sales_{agency_id}@example.com', 'password_hash': '-',
+         'role': 'salesperson', 'agency_id': agency_id, 'is_active': True}
+        for agency_id in agency_ids
+    ])
+    salespersons = dict(db.session.query(User.agency_id, User.id).filter(User.username.like('ix_sales_%')))
+    db.session.execute(insert(Location), [
+        {'name': f'Location {n}', 'agency_id': agency_id, 'is_active': True}
+        for agency_id in agency_ids for n in range(5)
+    ])
+    locations = db.session.query(Location.id, Location.agency_id).filter(Location.agency_id.in_(agency_ids)).all()
+    db.session.execute(insert(Customer), [
+        {'name': f'Customer {n}', 'location_id': location_id, 'is_active': n % 10 != 0}
+        for location_id, _ in locations for n in range(20)
+    ])
+    db.session.execute(insert(Product), [
+        {'name': f'Product {n}', 'sku': f'IX-{agency_id}-{n}', 'price': 10, 'agency_id': agency_id,
+         'category': f'Category {n % 4}', 'is_active': True}
+        for agency_id in agency_ids for n in range(50)
+    ])
+    customers = db.session.query(Customer.id, Location.agency_id).join(Location).all()
+
+    start = datetime(2024, 1, 1)
+    rows = []
+    for n in range(order_count):
+        customer_id, agency_id = rng.choice(customers)
+        rows.append({
+            'order_number': f'IX-{n:08d}',
+            'customer_id': customer_id,
+            'agency_id': agency_id,
+            'salesperson_id': salespersons[agency_id],
+            'status': rng.choice(['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']),
+            'total_amount': 10,
+            'created_at': start + timedelta(minutes=n)
+        })
+    for chunk_start in range(0, len(rows), 5000):
+        db.session.execute(insert(Order), rows[chunk_start:chunk_start + 5000])
+    db.session.execute(insert(ActivityLog), [
+        {'user_id': rng.choice(list(salespersons.values())), 'action': 'view', 'created_at': start + timedelta(minutes=n)}
+        for n in range(order_count)
+    ])
+    db.session.commit()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(text('ANALYZE'))
+    return agency_ids[0], salespersons[agency_ids[0]]
+
+def hot_queries(agency_id, salesperson_id, location_id, order_id):
+    """(name, query, acceptable index names) as the list pages and API build them"""
+    newest_orders = (Order.created_at.desc(), Order.id.desc())
+    return [
+        ('order.list_orders (super admin)',
+         Order.query.order_by(*newest_orders).limit(51), ['ix_orders_created']),
+        ('order.list_orders (agency)',
+         Order.query.filter_by(agency_id=agency_id).order_by(*newest_orders).limit(51),
+         ['ix_orders_agency_created', 'ix_orders_agency_status_created']),
+        ('order.list_orders (agency, status)',
+         Order.query.filter_by(agency_id=agency_id).filter(Order.status == 'pending')
+         .order_by(*newest_orders).limit(51),
+         ['ix_orders_agency_status_created', 'ix_orders_agency_created']),
+        ('order.list_orders (salesperson)',
+         Order.query.filter_by(salesperson_id=salesperson_id).order_by(*newest_orders).limit(51),
+         ['ix_orders_salesperson_created']),
+        ('order count (agency)',
+         Order.query.filter_by(agency_id=agency_id).with_entities(func.count(Order.id)),
+         ['ix_orders_agency_created', 'ix_orders_agency_status_created']),
+        ('customer.list_customers (agency)',
+         Customer.query.join(Location).filter(Location.agency_id == agency_id)
+         .order_by(Customer.created_at.desc()),
+         ['ix_locations_agency_active', 'ix_customers_location_created']),
+        ('customer.list_customers (location, active)',
+         Customer.query.filter(Customer.location_id == location_id, Customer.is_active == True)
+         .order_by(Customer.created_at.desc()),
+         ['ix_customers_location_created']),
+        ('product.list_products (agency)',
+         Product.query.filter_by(agency_id=agency_id).order_by(Product.created_at.desc()),
+         ['ix_products_agency_active_created', 'ix_products_agency_category']),
+        ('product.list_products (agency, category)',
+         Product.query.filter_by(agency_id=agency_id).filter(Product.category == 'Category 1'),
+         ['ix_products_agency_category']),
+        ('api.get_products (agency)',
+         Product.query.filter_by(agency_id=agency_id, is_active=True),
+         ['ix_products_agency_active_created']),
+        ('api.get_orders (salesperson)',
+         Order.query.filter_by(salesperson_id=salesperson_id), ['ix_orders_salesperson_created']),
+        ('order items of an order',
+         OrderItem.query.filter_by(order_id=order_id), ['ix_order_items_order']),
+        ('super_admin.view_activities',
+         ActivityLog.query.order_by(ActivityLog.created_at.desc()).limit(50), ['ix_activity_logs_created']),
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--verbose', action='store_true', help='print every plan')
+    args = parser.parse_args(argv)
+
+    with app.app_context():
+        created = create_missing_indexes()
+        if created:
+            print(f'created missing indexes: {", ".join(created)}')
+        agency_id, salesperson_id = build_dataset(args.orders)
+        location_id = Location.query.filter_by(agency_id=agency_id).first().id
+        order_id = Order.query.filter_by(agency_id=agency_id).first().id
+        if db.engine.dialect.name == 'postgresql':
+            db.session.execute(text('ANALYZE'))
+            db.session.execute(text('SET LOCAL enable_seqscan = off'))
+
+        failed = 0
+        for name, query, expected in hot_queries(agency_id, salesperson_id, location_id, order_id):
+            plan = explain(query)
+            used = [index for index in expected if index in plan]
+            failed += not used
+            print(f'{"ok" if used else "FAIL":>4}  {name}: {used[0] if used else "no expected index in plan"}')
+            if args.verbose or not used:
+                print('      ' + plan.replace('\n', '\n      '))
+        db.session.rollback()
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
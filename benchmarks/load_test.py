@@ -0,0 +1,299 @@
+"""Throughput of each gunicorn concurrency profile under mixed read/write traffic.
+
+Run with: python -m benchmarks.load_test [--profiles sync,gthread,gevent]
+              [--clients 32] [--duration 20] [--orders 20000] [--output results.json]
+Generates a synthetic dataset (see utils.synthetic_data) in a throwaway
+SQLite database unless DATABASE_URL is set, then starts gunicorn with
+gunicorn.conf.py once per profile (GUNICORN_PROFILE) and drives it from
+--clients threads for --duration seconds. Each client logs in as the admin
+of one of the synthetic agencies and sends a weighted mix of list, detail
+and search reads, order creation and status updates. Reports requests per
+second, p50/p95 latency and errors per profile; the exit status is 1 when
+a profile could not start or more than --max-error-rate of its requests
+failed. Worker, thread and pool sizes come from utils.concurrency, so
+WEB_CONCURRENCY, GUNICORN_THREADS and DB_MAX_CONNECTIONS apply here too.
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'load.db')
+os.environ.setdefault('ACTIVITY_LOG_ASYNC', 'false')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+import logging
+from app import app, db
+from models import Agency, Customer, Location, Order, Product, User
+from utils.concurrency import PROFILES, concurrency_settings
+from utils.synthetic_data import SYNTHETIC_PASSWORD, SyntheticDataGenerator
+
+# (name, weight, is_write); roughly what the sales staff do during the day
+TRAFFIC_MIX = [
+    ('list_orders', 30, False),
+    ('view_order', 20, False),
+    ('list_customers', 10, False),
+    ('list_products', 10, False),
+    ('search_customers', 10, False),
+    ('dashboard', 5, False),
+    ('create_order', 10, True),
+    ('update_status', 5, True),
+]
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # A redirect after a POST is the success response; don't spend a request following it
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def ensure_dataset(args):
+    if Agency.query.filter(Agency.code.like(f'{args.prefix}%')).first():
+        print(f'reusing dataset with prefix {args.prefix}')
+        return
+    started = time.perf_counter()
+    counts = SyntheticDataGenerator(
+        agencies=args.agencies, customers=max(args.orders // 10, args.agencies), orders=args.orders,
+        seed=args.seed, prefix=args.prefix
+    ).generate()
+    print(f'dataset built in {time.perf_counter() - started:.1f}s: '
+          + ', '.join(f'{count} {table}' for table, count in counts.items()))
+
+def agency_fixtures(prefix):
+    """Per agency: its admin's username and the ids a client needs to build requests"""
+    fixtures = []
+    for agency in Agency.query.filter(Agency.code.like(f'{prefix}%')).order_by(Agency.id):
+        admin = User.query.filter_by(role='agency_admin', agency_id=agency.id).order_by(User.id).first()
+        customers = [c.id for c in Customer.query.join(Location).filter(Location.agency_id == agency.id)
+                     .order_by(Customer.id).limit(200)]
+        products = [p.id for p in Product.query.filter_by(agency_id=agency.id, is_active=True)
+                    .order_by(Product.id).limit(200)]
+        orders = [o.id for o in Order.query.filter_by(agency_id=agency.id).order_by(Order.id.desc()).limit(500)]
+        if admin and customers and products and orders:
+            fixtures.append({'username': admin.username, 'customers': customers,
+                             'products': products, 'orders': orders})
+    return fixtures
+
+def build_request(name, fixture, rng):
+    """(method, path, form data or None, statuses that count as success)"""
+    if name == 'list_orders':
+        return 'GET', f'/order/?page={rng.randint(1, 5)}', None, (200,)
+    if name == 'view_order':
+        return 'GET', f'/order/{rng.choice(fixture["orders"])}', None, (200,)
+    if name == 'list_customers':
+        return 'GET', '/customer/', None, (200,)
+    if name == 'list_products':
+        return 'GET', '/product/', None, (200,)
+    if name == 'search_customers':
+        return 'GET', '/order/api/customers/search?q=' + rng.choice('abcdehlmnrst'), None, (200,)
+    if name == 'dashboard':
+        return 'GET', '/', None, (200, 302)
+    if name == 'create_order':
+        products = rng.sample(fixture['products'], k=min(3, len(fixture['products'])))
+        data = {'customer_id': rng.choice(fixture['customers']), 'products': products,
+                'quantities': [rng.randint(1, 3) for _ in products], 'notes': 'load test'}
+        # Success redirects to the order list; a 200 is the form again with a validation error
+        return 'POST', '/order/create', data, (302,)
+    if name == 'update_status':
+        data = {'status': rng.choice(['pending', 'confirmed', 'shipped'])}
+        return 'POST', f'/order/{rng.choice(fixture["orders"])}/update_status', data, (302,)
+    raise ValueError(name)
+
+class Client(threading.Thread):
+    def __init__(self, base_url, fixture, seed, deadline):
+        super().__init__(daemon=True)
+        self.base_url = base_url
+        self.fixture = fixture
+        self.rng = random.Random(seed)
+        self.deadline = deadline
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+        self.samples = []  # (name, is_write, ms, ok)
+        self.errors = {}
+
+    def send(self, method, path, data=None):
+        body = urllib.parse.urlencode(data, doseq=True).encode() if data is not None else None
+        request = urllib.request.Request(self.base_url + path, data=body, method=method)
+        try:
+            with self.opener.open(request, timeout=60) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def run(self):
+        self.send('POST', '/auth/login', {'username': self.fixture['username'], 'password': SYNTHETIC_PASSWORD})
+        names = [name for name, _, _ in TRAFFIC_MIX]
+        weights = [weight for _, weight, _ in TRAFFIC_MIX]
+        writes = {name for name, _, is_write in TRAFFIC_MIX if is_write}
+        while time.monotonic() < self.deadline:
+            name = self.rng.choices(names, weights)[0]
+            method, path, data, ok_statuses = build_request(name, self.fixture, self.rng)
+            started = time.perf_counter()
+            try:
+                status = self.send(method, path, data)
+            except OSError as e:
+                status = type(e).__name__
+            elapsed = (time.perf_counter() - started) * 1000
+            ok = status in ok_statuses
+            self.samples.append((name, name in writes, elapsed, ok))
+            if not ok:
+                key = f'{name}: {status}'
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+def wait_until_up(process, port, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{port}/auth/login', timeout=5) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def run_profile(profile, fixtures, args):
+    port = free_port()
+    env = dict(os.environ, GUNICORN_PROFILE=profile, PORT=str(port), AUTO_INIT_DB='false')
+    settings = concurrency_settings(env)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen([sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py',
+                                '--access-logfile', '/dev/null', 'main:app'],
+                               cwd=root, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        if not wait_until_up(process, port, args.startup_timeout):
+            log.seek(0)
+            return {'profile': profile, 'error': 'gunicorn did not start',
+                    'log': log.read().decode(errors='replace')[-2000:]}
+
+        deadline = time.monotonic() + args.duration
+        clients = [Client(f'http://127.0.0.1:{port}', fixtures[n % len(fixtures)], args.seed + n, deadline)
+                   for n in range(args.clients)]
+        started = time.monotonic()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        elapsed = time.monotonic() - started
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        log.seek(0)
+        server_log = log.read().decode(errors='replace')
+        log.close()
+
+    samples = [sample for client in clients for sample in client.samples]
+    errors = {}
+    for client in clients:
+        for key, count in client.errors.items():
+            errors[key] = errors.get(key, 0) + count
+    latencies = sorted(ms for _, _, ms, _ in samples)
+    write_latencies = sorted(ms for _, is_write, ms, _ in samples if is_write)
+    failed = sum(1 for *_, ok in samples if not ok)
+    # gthread falls back from gevent when gevent is missing; say which profile actually ran
+    ran_as = 'gthread' if profile == 'gevent' and 'gevent is not installed' in server_log else profile
+    return {
+        'profile': profile,
+        'ran_as': ran_as,
+        'workers': settings['workers'],
+        'threads': settings['threads'],
+        'worker_connections': settings['worker_connections'],
+        'pool_size': settings['pool_size'],
+        'max_overflow': settings['max_overflow'],
+        'requests': len(samples),
+        'writes': len(write_latencies),
+        'errors': failed,
+        'error_rate': round(failed / len(samples), 4) if samples else 1.0,
+        'requests_per_second': round(len(samples) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 1) if latencies else 0.0,
+        'p95_ms': round(percentile(latencies, 0.95), 1),
+        'write_p95_ms': round(percentile(write_latencies, 0.95), 1),
+        'error_detail': errors
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--profiles', default=','.join(PROFILES), help='comma separated GUNICORN_PROFILE values')
+    parser.add_argument('--clients', type=int, default=32, help='concurrent client threads')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic per profile')
+    parser.add_argument('--agencies', type=int, default=8)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--prefix', default='SYN')
+    parser.add_argument('--startup-timeout', type=float, default=60)
+    parser.add_argument('--max-error-rate', type=float, default=0.01, help='fraction of failed requests allowed')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    profiles = [profile.strip() for profile in args.profiles.split(',') if profile.strip()]
+    for profile in profiles:
+        if profile not in PROFILES:
+            parser.error(f'unknown profile {profile}; choose from {", ".join(PROFILES)}')
+
+    with app.app_context():
+        ensure_dataset(args)
+        fixtures = agency_fixtures(args.prefix)
+        dialect = db.engine.dialect.name
+        db.engine.dispose()
+    print(f'{dialect} database, {args.clients} clients, {args.duration:.0f}s per profile')
+
+    results = []
+    failed = []
+    for profile in profiles:
+        result = run_profile(profile, fixtures, args)
+        results.append(result)
+        if 'error' in result:
+            print(f'{profile:>8}: {result["error"]}\n{result["log"]}')
+            failed.append(profile)
+            continue
+        concurrency = (f'{result["worker_connections"]} greenlets' if result['ran_as'] == 'gevent'
+                       else f'{result["threads"]} threads')
+        label = profile if result['ran_as'] == profile else f'{profile} (ran as {result["ran_as"]})'
+        print(f'{label:>8}: {result["workers"]} workers x {concurrency}, pool {result["pool_size"]}'
+              f'+{result["max_overflow"]} | {result["requests_per_second"]:7.1f} req/s, '
+              f'p50 {result["p50_ms"]:7.1f} ms, p95 {result["p95_ms"]:7.1f} ms, '
+              f'write p95 {result["write_p95_ms"]:7.1f} ms, {result["writes"]} writes, '
+              f'{result["errors"]} errors')
+        for key, count in sorted(result['error_detail'].items(), key=lambda item: -item[1])[:5]:
+            print(f'          {count:6d} x {key}')
+        if result['error_rate'] > args.max_error_rate:
+            failed.append(profile)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'dialect': dialect, 'clients': args.clients, 'duration': args.duration,
+                       'results': results}, f, indent=2, sort_keys=True)
+        print(f'results written to {args.output}')
+    for profile in failed:
+        print(f'FAILED: {profile}')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,74 @@
+"""Query count and latency of order creation for 1, 50 and 500 line items.
+
+Run with: python -m benchmarks.order_create
+Uses a throwaway SQLite database unless DATABASE_URL is already set.
+"""
+import os
+import sys
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+from sqlalchemy import event
+from app import app, db
+from models import Agency, Customer, Location, Product, User
+from order.services import create_order
+
+LINE_COUNTS = (1, 50, 500)
+REPEAT = 5
+
+def setup_catalog(size):
+    """Create an agency, customer and size products to order from"""
+    agency = Agency.query.filter_by(code='BENCH').first()
+    if not agency:
+        agency = Agency(name='Benchmark Agency', code='BENCH', is_active=True)
+        db.session.add(agency)
+        db.session.flush()
+        location = Location(name='Benchmark Location', agency_id=agency.id, is_active=True)
+        db.session.add(location)
+        db.session.flush()
+        db.session.add(Customer(name='Benchmark Customer', location_id=location.id, is_active=True))
+        db.session.add_all([
+            Product(name=f'Product {i}', sku=f'BENCH-{i:05d}', price=10 + i % 90,
+                    agency_id=agency.id, is_active=True)
+            for i in range(size)
+        ])
+        db.session.commit()
+
+    customer = Customer.query.join(Location).filter(Location.agency_id == agency.id).first()
+    salesperson = User.query.first()
+    product_ids = [p.id for p in Product.query.filter_by(agency_id=agency.id).order_by(Product.id)]
+    return customer, salesperson, product_ids
+
+def main():
+    counter = {'queries': 0}
+
+    def count_query(*args):
+        counter['queries'] += 1
+
+    with app.app_context():
+        customer, salesperson, product_ids = setup_catalog(max(LINE_COUNTS))
+        event.listen(db.engine, 'before_cursor_execute', count_query)
+
+        print(f"{'lines':>6} {'queries':>8} {'avg ms':>9}")
+        for line_count in LINE_COUNTS:
+            lines = [(product_id, 2) for product_id in product_ids[:line_count]]
+            timings = []
+            for _ in range(REPEAT):
+                db.session.expire_all()
+                counter['queries'] = 0
+                started = time.perf_counter()
+                create_order(customer, salesperson.id, lines)
+                timings.append(time.perf_counter() - started)
+            avg_ms = sum(timings) / len(timings) * 1000
+            print(f"{line_count:>6} {counter['queries']:>8} {avg_ms:>9.2f}")
+
+        event.remove(db.engine, 'before_cursor_execute', count_query)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Size and latency of the order form and of its product and customer typeaheads.
+
+Run with: python -m benchmarks.order_form [--products 20000] [--customers 5000]
+              [--repeat 20] [--max-form-kb 50] [--max-lookup-ms 20]
+Generates two agencies with large catalogs in a throwaway SQLite database
+unless DATABASE_URL is set. Reports the create-order page size and time,
+the first lookup (which builds the agency's prefix index) and the median
+of later lookups for a spread of prefixes, and checks that a repeated
+lookup revalidates to a 304, that results stay within the agency, and that
+renaming a product or importing products and customers shows up in the
+next lookup.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+if 'DATABASE_URL' not in os.environ:
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('ACTIVITY_LOG_ASYNC', 'false')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+import logging
+from werkzeug.datastructures import FileStorage
+from app import app, db
+from models import Agency, Customer, Location, Product, User
+from customer.services import import_customer_rows
+from utils.excel_utils import import_products_from_excel
+from utils.cache import cache_clear
+from utils.synthetic_data import SYNTHETIC_PASSWORD, SyntheticDataGenerator
+
+PREFIX = 'TA'
+
+def timed(client, path, **kwargs):
+    started = time.perf_counter()
+    response = client.get(path, **kwargs)
+    return response, (time.perf_counter() - started) * 1000
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--customers', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--max-form-kb', type=float, default=50)
+    parser.add_argument('--max-lookup-ms', type=float, default=20)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+
+    with app.app_context():
+        if not Agency.query.filter(Agency.code.like(f'{PREFIX}%')).first():
+            # Two agencies, to check that lookups stay scoped
+            SyntheticDataGenerator(agencies=2, customers=args.customers, products_per_agency=args.products,
+                                   orders=100, seed=11, prefix=PREFIX).generate()
+        agencies = Agency.query.filter(Agency.code.like(f'{PREFIX}%')).order_by(Agency.id).all()
+        agency = max(agencies, key=lambda a: Product.query.filter_by(agency_id=a.id).count())
+        admin = User.query.filter_by(role='agency_admin', agency_id=agency.id).order_by(User.id).first().username
+        agency_products = {p.id for p in db.session.query(Product.id).filter_by(agency_id=agency.id)}
+        sample = Product.query.filter_by(agency_id=agency.id, is_active=True).order_by(Product.id).first()
+        names = {
+            'products': [p.name for p in Product.query.filter_by(agency_id=agency.id).limit(args.repeat)],
+            'customers': [c.name for c in Customer.query.join(Location)
+                          .filter(Location.agency_id == agency.id).limit(args.repeat)],
+        }
+    cache_clear()
+
+    client = app.test_client()
+    client.post('/auth/login', data={'username': admin, 'password': SYNTHETIC_PASSWORD})
+    failures = []
+
+    form_times = []
+    for _ in range(5):
+        response, ms = timed(client, '/order/create')
+        form_times.append(ms)
+    form_kb = len(response.data) / 1024
+    print(f'{"order form":>22}: HTTP {response.status_code}, {form_kb:8.1f} KB, '
+          f'median {statistics.median(form_times):7.1f} ms')
+    if response.status_code != 200 or form_kb > args.max_form_kb:
+        failures.append(f'the order form should render in under {args.max_form_kb:g} KB')
+
+    for kind in ('products', 'customers'):
+        path = f'/order/api/{kind}/search'
+        response, cold = timed(client, path, query_string={'q': names[kind][0].split()[0][:2]})
+        warm, sizes = [], []
+        for name in names[kind]:
+            # One to four letters of a word of the name, like someone typing
+            word = name.split()[len(warm) % len(name.split())]
+            response, ms = timed(client, path, query_string={'q': word[:1 + len(warm) % 4]})
+            warm.append(ms)
+            sizes.append(len(response.data))
+        print(f'{kind + " lookup":>22}: first {cold:7.1f} ms (builds the index), then median '
+              f'{statistics.median(warm):5.2f} ms, max {max(warm):5.2f} ms, {statistics.mean(sizes) / 1024:.1f} KB')
+        if statistics.median(warm) > args.max_lookup_ms:
+            failures.append(f'{kind} lookups should take under {args.max_lookup_ms:g} ms')
+
+        etag = response.headers.get('ETag')
+        revalidated = client.get(path, query_string={'q': word[:1 + (len(warm) - 1) % 4]},
+                                 headers={'If-None-Match': etag})
+        print(f'{kind + " revalidate":>22}: HTTP {revalidated.status_code}, '
+              f'Cache-Control "{response.headers.get("Cache-Control")}"')
+        if revalidated.status_code != 304:
+            failures.append(f'a repeated {kind} lookup with its ETag should get a 304')
+
+    results = client.get('/order/api/products/search', query_string={'q': sample.name[0], 'limit': 50}).get_json()
+    if not results or any(item['id'] not in agency_products for item in results):
+        failures.append('product lookups should return only the agency\'s products')
+
+    with app.app_context():
+        product = db.session.get(Product, sample.id)
+        product.name = 'Zyzzogeton Typeahead Check'
+        db.session.commit()
+    renamed = client.get('/order/api/products/search', query_string={'q': 'zyzzog'}).get_json()
+    fresh = [item['id'] for item in renamed] == [sample.id]
+    print(f'{"after rename":>22}: {"found" if fresh else "MISSING"}')
+    if not fresh:
+        failures.append('a renamed product should be found by its new name straight away')
+
+    # Imports write through the bulk loader, past the session's flush and commit hooks
+    with app.app_context():
+        upload = FileStorage(io.BytesIO(b'Name,SKU,Price\nZebra Typeahead Import,TA-ZEBRA-IMPORT,9.99\n'),
+                             filename='products.csv')
+        import_products_from_excel(upload, agency.id, 'super_admin')
+        location = Location.query.filter_by(agency_id=agency.id).order_by(Location.id).first()
+        import_customer_rows([{'name': 'Quokka Typeahead Import', 'location_name': location.name,
+                               'agency_code': agency.code}], 'super_admin', None)
+    for kind, term in (('products', 'zebra typeahead'), ('customers', 'quokka typeahead')):
+        imported = client.get(f'/order/api/{kind}/search', query_string={'q': term}).get_json()
+        print(f'{kind + " after import":>22}: {"found" if imported else "MISSING"}')
+        if not imported:
+            failures.append(f'imported {kind} should be found straight away')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Check which engine each endpoint's queries run on when DATABASE_REPLICA_URL is set.
+
+Run with: python -m benchmarks.replica_routing [--orders 2000]
+Builds a synthetic dataset in a throwaway SQLite database and copies the
+file as the "replica", which then never sees later writes, like a replica
+that is far behind. Fails unless the reporting, dashboard, list, export
+and /api/v1 GET endpoints read only from the replica, other pages, the
+typeahead indexes and all writes use the primary, and an order created
+by a user shows up in their order list straight away (read from the
+primary) but not once the DATABASE_REPLICA_STICKY_SECONDS window has
+passed (read from the replica).
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+_tmp = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_tmp, 'primary.db')
+os.environ['DATABASE_REPLICA_URL'] = 'sqlite:///' + os.path.join(_tmp, 'replica.db')
+os.environ.setdefault('DATABASE_REPLICA_STICKY_SECONDS', '1')
+os.environ.setdefault('ACTIVITY_LOG_ASYNC', 'false')
+# Create the schema and default accounts when the app is created
+os.environ.setdefault('AUTO_INIT_DB', 'true')
+
+import logging
+from sqlalchemy import event
+from app import app, db
+from models import Agency, Customer, Location, Order, Product, User
+from utils.db_routing import REPLICA_BIND
+from utils.synthetic_data import SYNTHETIC_PASSWORD, SyntheticDataGenerator
+
+class StatementCounter:
+    """SELECTs per engine; writes (such as synchronous activity log inserts) are counted as 'writes'"""
+
+    def __init__(self, engines):
+        self.names = list(engines) + ['writes']
+        self.counts = dict.fromkeys(self.names, 0)
+        for name, engine in engines.items():
+            event.listen(engine, 'before_cursor_execute', self._counter(name))
+
+    def _counter(self, name):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            self.counts[name if statement.lstrip().upper().startswith('SELECT') else 'writes'] += 1
+        return count
+
+    def take(self):
+        counts = dict(self.counts)
+        self.counts = dict.fromkeys(self.names, 0)
+        return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000)
+    args = parser.parse_args(argv)
+    logging.disable(logging.WARNING)
+    # The API issues tokens with an integer subject, which newer PyJWT releases reject
+    app.config['JWT_VERIFY_SUB'] = False
+    sticky = app.config['DATABASE_REPLICA_STICKY_SECONDS']
+
+    with app.app_context():
+        SyntheticDataGenerator(agencies=2, customers=100, orders=args.orders, seed=5, prefix='RR').generate()
+        agency = Agency.query.filter(Agency.code.like('RR%')).order_by(Agency.id).first()
+        admin = User.query.filter_by(role='agency_admin', agency_id=agency.id).order_by(User.id).first().username
+        customer = Customer.query.join(Location).filter(Location.agency_id == agency.id).first().id
+        product = Product.query.filter_by(agency_id=agency.id).first().id
+        order = Order.query.filter_by(agency_id=agency.id).first().id
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        shutil.copyfile(os.path.join(_tmp, 'primary.db'), os.path.join(_tmp, 'replica.db'))
+        counter = StatementCounter({'primary': db.engines[None], 'replica': db.engines[REPLICA_BIND]})
+
+    client = app.test_client()
+    super_client = app.test_client()
+    client.post('/auth/login', data={'username': admin, 'password': SYNTHETIC_PASSWORD})
+    super_client.post('/auth/login', data={'username': 'admin', 'password': 'admin123'})
+    token = client.post('/auth/api/token', json={'username': admin, 'password': SYNTHETIC_PASSWORD}).get_json()['access_token']
+    api_headers = {'Authorization': f'Bearer {token}'}
+    time.sleep(sticky)  # logging in wrote last_login
+    counter.take()
+
+    # (name, client, method, path, kwargs, expected engine)
+    checks = [
+        ('order list', client, 'GET', '/order/', {}, 'replica'),
+        ('customer list', client, 'GET', '/customer/', {}, 'replica'),
+        ('product list', client, 'GET', '/product/', {}, 'replica'),
+        ('location list', client, 'GET', '/location/', {}, 'replica'),
+        ('salesperson list', client, 'GET', '/salesperson/', {}, 'replica'),
+        ('agency users', client, 'GET', f'/agency/{agency.id}/users', {}, 'replica'),
+        ('order export', client, 'GET', '/order/export', {}, 'replica'),
+        ('super admin dashboard', super_client, 'GET', '/super_admin/dashboard', {}, 'replica'),
+        ('super admin reports', super_client, 'GET', '/super_admin/reports', {}, 'replica'),
+        ('activity log', super_client, 'GET', '/super_admin/activities', {}, 'replica'),
+        ('api orders', client, 'GET', '/api/v1/orders', {'headers': api_headers}, 'replica'),
+        ('api dashboard stats', client, 'GET', '/api/v1/dashboard/stats', {'headers': api_headers}, 'replica'),
+        ('order detail', client, 'GET', f'/order/{order}', {}, 'primary'),
+        # Built into a cached index, so it must not be read from a lagging replica
+        ('product typeahead', client, 'GET', '/order/api/products/search', {}, 'primary'),
+    ]
+    failures = []
+    for name, test_client, method, path, kwargs, expected in checks:
+        response = test_client.open(path, method=method, **kwargs)
+        counts = counter.take()
+        other = 'primary' if expected == 'replica' else 'replica'
+        ok = response.status_code < 400 and counts[expected] > 0 and counts[other] == 0
+        print(f'{name:>24}: HTTP {response.status_code}, reads on primary {counts["primary"]:3d}, '
+              f'replica {counts["replica"]:3d} {"ok" if ok else "FAILED"}')
+        if not ok:
+            failures.append(f'{name} should query only the {expected}')
+
+    response = client.post('/order/create', data={'customer_id': customer, 'products': [product],
+                                                  'quantities': [1], 'notes': 'replica check'})
+    counts = counter.take()
+    print(f'{"create order":>24}: HTTP {response.status_code}, reads on primary {counts["primary"]:3d}, '
+          f'replica {counts["replica"]:3d}, {counts["writes"]} writes')
+    if response.status_code != 302 or counts['replica'] or not counts['writes']:
+        failures.append('creating an order should write to and read from the primary only')
+    with app.app_context():
+        order_number = Order.query.order_by(Order.id.desc()).first().order_number
+
+    listing = client.get('/order/').get_data(as_text=True)
+    counts = counter.take()
+    fresh = order_number in listing
+    print(f'{"list after write":>24}: reads on primary {counts["primary"]:3d}, replica {counts["replica"]:3d}, '
+          f'new order {"shown" if fresh else "missing"}')
+    if not fresh or counts['replica']:
+        failures.append('the order list right after a write should come from the primary and show the new order')
+
+    time.sleep(sticky)
+    listing = client.get('/order/').get_data(as_text=True)
+    counts = counter.take()
+    stale = order_number not in listing
+    print(f'{"list after window":>24}: reads on primary {counts["primary"]:3d}, replica {counts["replica"]:3d}, '
+          f'new order {"missing (replica lag)" if stale else "shown"}')
+    if not stale or counts['primary']:
+        failures.append(f'the order list {sticky:g}s after a write should come from the replica again')
+
+    for failure in failures:
+        print(f'FAILED: {failure}')
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,23 @@
-from flask import render_template, request, redirect, url_for, flash, session, make_response
+from flask import render_template, request, redirect, url_for, flash, session, make_response, current_app
 import csv, io
+from sqlalchemy.orm import contains_eager, joinedload
 from app import db
 from models import Customer, Location, Agency
 from customer import customer_bp
 from auth.utils import login_required, agency_access_required, role_required
 from utils.decorators import log_activity
+from customer.services import import_customer_rows
+from utils.export_jobs import register_export, export_response, csv_output, iter_with_progress
+from utils.filter_options import get_agency_options, get_location_options
+from utils.bulk_import import error_report_url
+from utils.db_routing import read_replica
+from utils.pagination import keyset_paginate, offset_paginate
+from utils.search import apply_search
 
 @customer_bp.route('/')
 @login_required
 @agency_access_required
+@read_replica
 def list_customers(current_agency_id=None):
     user_role = session.get('role')
     
@@ -24,6 +33,7 @@ def list_customers(current_agency_id=None):
     agency_filter = request.args.get('agency')
     location_filter = request.args.get('location')
     status_filter = request.args.get('status')
+    search_term = request.args.get('q', '').strip()
     
     if date_from:
         try:
@@ -52,29 +62,45 @@ def list_customers(current_agency_id=None):
     elif status_filter == 'inactive':
         query = query.filter(Customer.is_active == False)
     
-    customers = query.order_by(Customer.created_at.desc()).all()
+    if search_term:
+        query = apply_search(query, 'customers', search_term)
+    
+    # The list shows each customer's location and agency; load them with the join already made
+    query = query.options(contains_eager(Customer.location).joinedload(Location.agency))
+    per_page = request.args.get('per_page', current_app.config['LIST_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['LIST_MAX_PER_PAGE']))
+    if search_term:
+        page = offset_paginate(query, request.args.get('page', 1, type=int), per_page)
+    else:
+        page = keyset_paginate(query, Customer.created_at, Customer.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
     
     # Get filter options
     agencies = []
-    locations = []
     
     if user_role == 'super_admin':
-        agencies = Agency.query.filter_by(is_active=True).all()
-        locations = Location.query.filter_by(is_active=True).all()
+        agencies = get_agency_options()
+        locations = get_location_options()
     else:
-        locations = Location.query.filter_by(agency_id=current_agency_id, is_active=True).all()
-    
+        locations = get_location_options(current_agency_id)
+    
+    filters = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'agency': agency_filter,
+        'location': location_filter,
+        'status': status_filter,
+        'q': search_term
+    }
     return render_template('customer/list.html', 
-                         customers=customers,
+                         customers=page.items,
+                         page=page,
+                         per_page=per_page,
                          agencies=agencies,
                          locations=locations,
-                         filters={
-                             'date_from': date_from,
-                             'date_to': date_to,
-                             'agency': agency_filter,
-                             'location': location_filter,
-                             'status': status_filter
-                         })
+                         filters=filters,
+                         page_args={k: v for k, v in filters.items() if v})
 
 @customer_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -248,44 +274,37 @@ def download_customer_template():
 @role_required('super_admin', 'agency_admin', 'staff')
 def export_customers():
     """Export existing customers to CSV"""
-    user_role = session.get('role')
-    current_agency_id = session.get('agency_id')
-    
+    return export_response('customers')
+
+@register_export('customers', 'customers_export.csv', 'text/csv')
+def write_customers_csv(output, scope, progress):
     # Get customers based on user role
-    if user_role == 'super_admin':
-        customers = Customer.query.join(Location).join(Agency).all()
-    else:
-        customers = Customer.query.join(Location).filter(Location.agency_id == current_agency_id).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['name', 'email', 'phone', 'address', 'location_name', 'agency_code', 'is_active', 'created_at'])
-    
-    # Write data
-    for customer in customers:
-        writer.writerow([
-            customer.name,
-            customer.email or '',
-            customer.phone or '',
-            customer.address or '',
-            customer.location.name,
-            customer.location.agency.code,
-            'Yes' if customer.is_active else 'No',
-            customer.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=customers_export.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
+    query = Customer.query.join(Location).options(joinedload(Customer.location).joinedload(Location.agency))
+    if scope['role'] != 'super_admin':
+        query = query.filter(Location.agency_id == scope['agency_id'])
+    total = query.count()
+    
+    with csv_output(output) as writer:
+        # Write header
+        writer.writerow(['name', 'email', 'phone', 'address', 'location_name', 'agency_code', 'is_active', 'created_at'])
+        
+        # Write data
+        for customer in iter_with_progress(query.order_by(Customer.id).yield_per(1000), progress, total):
+            writer.writerow([
+                customer.name,
+                customer.email or '',
+                customer.phone or '',
+                customer.address or '',
+                customer.location.name,
+                customer.location.agency.code,
+                'Yes' if customer.is_active else 'No',
+                customer.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
 
 @customer_bp.route('/import', methods=['GET', 'POST'])
 @login_required
 @role_required('super_admin', 'agency_admin', 'staff')
-@log_activity('import_customers')
+@log_activity('import_customers', dry_run_action='validate_customers_import')
 def import_customers():
     """Import customers from CSV file"""
     if request.method == 'POST':
@@ -303,87 +322,25 @@ def import_customers():
             return redirect(url_for('customer.import_customers'))
         
         try:
-            # Read CSV file
+            # Read CSV file once; lookups and inserts are set-based
             stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream)
-            
-            user_role = session.get('role')
-            current_agency_id = session.get('agency_id')
+            rows = list(csv.DictReader(stream))
             
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(csv_input, start=2):  # Start from 2 to account for header
-                try:
-                    # Validate required fields
-                    if not row.get('name') or not row.get('name').strip():
-                        errors.append(f"Row {row_num}: Customer name is required")
-                        error_count += 1
-                        continue
-                    
-                    location_name = row.get('location_name', '').strip()
-                    agency_code = row.get('agency_code', '').strip()
-                    
-                    if not location_name or not agency_code:
-                        errors.append(f"Row {row_num}: Location name and agency code are required")
-                        error_count += 1
-                        continue
-                    
-                    # Find agency by code
-                    agency = Agency.query.filter_by(code=agency_code, is_active=True).first()
-                    if not agency:
-                        errors.append(f"Row {row_num}: Agency with code '{agency_code}' not found or inactive")
-                        error_count += 1
-                        continue
-                    
-                    # Check permissions for non-super admin users
-                    if user_role != 'super_admin' and agency.id != current_agency_id:
-                        errors.append(f"Row {row_num}: You can only import customers for your agency")
-                        error_count += 1
-                        continue
-                    
-                    # Find location by name and agency
-                    location = Location.query.filter_by(name=location_name, agency_id=agency.id, is_active=True).first()
-                    if not location:
-                        errors.append(f"Row {row_num}: Location '{location_name}' not found for agency '{agency_code}' or inactive")
-                        error_count += 1
-                        continue
-                    
-                    # Check if customer already exists (by name and location)
-                    existing_customer = Customer.query.filter_by(name=row['name'].strip(), location_id=location.id).first()
-                    if existing_customer:
-                        errors.append(f"Row {row_num}: Customer '{row['name'].strip()}' already exists at location '{location_name}'")
-                        error_count += 1
-                        continue
-                    
-                    # Validate email format if provided
-                    email = row.get('email', '').strip()
-                    if email and '@' not in email:
-                        errors.append(f"Row {row_num}: Invalid email format")
-                        error_count += 1
-                        continue
-                    
-                    # Create new customer
-                    customer = Customer(
-                        name=row['name'].strip(),
-                        email=email if email else None,
-                        phone=row.get('phone', '').strip(),
-                        address=row.get('address', '').strip(),
-                        location_id=location.id,
-                        is_active=True
-                    )
-                    
-                    db.session.add(customer)
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    error_count += 1
+            # A dry run validates every row and offers the rejected ones as a CSV
+            dry_run = bool(request.form.get('dry_run'))
+            result = import_customer_rows(rows, session.get('role'), session.get('agency_id'),
+                                          dry_run=dry_run)
+            if dry_run:
+                return render_template('customer/import.html', validation=result,
+                                       error_report_url=error_report_url(result, 'customer_import_errors.csv'))
+
+            success_count = result['success_count']
+            error_count = result['error_count']
+            errors = result['errors']
             
             if success_count > 0:
-                db.session.commit()
-                flash(f'Successfully imported {success_count} customers', 'success')
+                flash(f'Successfully imported {success_count} customers '
+                      f'({result["rows_per_second"]:.0f} rows/second)', 'success')
             
             if error_count > 0:
                 flash(f'{error_count} errors occurred during import', 'warning')
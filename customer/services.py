@@ -0,0 +1,137 @@
+import time
+from app import db
+from models import Customer, Location, Agency
+from utils.bulk_import import IMPORT_CHUNK_SIZE, ImportErrors, chunked
+from utils.bulk_load import get_bulk_loader
+from utils.typeahead import invalidate_typeahead
+
+def _prefetch_lookups(rows):
+    """Load every agency, location and existing customer key the rows refer to.
+
+    Returns (agencies by code, locations by (agency_id, name), set of
+    existing (name, location_id) pairs), using a handful of IN queries
+    chunked to stay under bind parameter limits.
+    """
+    codes = {(row.get('agency_code') or '').strip() for row in rows} - {''}
+    location_names = {(row.get('location_name') or '').strip() for row in rows} - {''}
+    customer_names = {(row.get('name') or '').strip() for row in rows} - {''}
+
+    agencies = {}
+    for chunk in chunked(codes, IMPORT_CHUNK_SIZE):
+        for agency in Agency.query.filter(Agency.code.in_(chunk), Agency.is_active == True):
+            agencies[agency.code] = agency
+
+    locations = {}
+    if agencies:
+        agency_ids = [agency.id for agency in agencies.values()]
+        for chunk in chunked(location_names, IMPORT_CHUNK_SIZE):
+            query = db.session.query(Location.id, Location.agency_id, Location.name).filter(
+                Location.agency_id.in_(agency_ids), Location.name.in_(chunk), Location.is_active == True
+            ).order_by(Location.id)
+            for location_id, agency_id, name in query:
+                locations.setdefault((agency_id, name), location_id)
+
+    existing = set()
+    location_ids = set(locations.values())
+    if location_ids:
+        for chunk in chunked(customer_names, IMPORT_CHUNK_SIZE):
+            existing.update(db.session.query(Customer.name, Customer.location_id).filter(
+                Customer.location_id.in_(location_ids), Customer.name.in_(chunk)
+            ))
+    return agencies, locations, existing
+
+def import_customer_rows(rows, user_role, current_agency_id, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Validate CSV rows in memory and bulk insert the valid customers.
+
+    rows is a list of dicts as produced by csv.DictReader. Lookups are
+    prefetched up front, so the number of queries depends on the number
+    of distinct agencies, locations and names rather than on the number of
+    rows. Customers are inserted and committed in chunks of chunk_size;
+    with dry_run nothing is written and success_count is what would have
+    been imported. Returns a dict with success_count, error_count, errors
+    (one message per rejected row), error_report (an ImportErrors),
+    dry_run, seconds and rows_per_second.
+    """
+    started = time.perf_counter()
+    agencies, locations, existing = _prefetch_lookups(rows)
+
+    errors = ImportErrors()
+    pending = []
+    added_agencies = set()
+    success_count = 0
+    for row_num, row in enumerate(rows, start=2):  # Start from 2 to account for header
+        # Validate required fields
+        name = (row.get('name') or '').strip()
+        if not name:
+            errors.add(row_num, f"Customer name is required", row)
+            continue
+
+        location_name = (row.get('location_name') or '').strip()
+        agency_code = (row.get('agency_code') or '').strip()
+        if not location_name or not agency_code:
+            errors.add(row_num, f"Location name and agency code are required", row)
+            continue
+
+        agency = agencies.get(agency_code)
+        if not agency:
+            errors.add(row_num, f"Agency with code '{agency_code}' not found or inactive", row)
+            continue
+
+        # Check permissions for non-super admin users
+        if user_role != 'super_admin' and agency.id != current_agency_id:
+            errors.add(row_num, f"You can only import customers for your agency", row)
+            continue
+
+        location_id = locations.get((agency.id, location_name))
+        if not location_id:
+            errors.add(row_num, f"Location '{location_name}' not found for agency '{agency_code}' or inactive", row)
+            continue
+
+        # Existing customers and earlier rows of the same file are both duplicates
+        if (name, location_id) in existing:
+            errors.add(row_num, f"Customer '{name}' already exists at location '{location_name}'", row)
+            continue
+
+        # Validate email format if provided
+        email = (row.get('email') or '').strip()
+        if email and '@' not in email:
+            errors.add(row_num, f"Invalid email format", row)
+            continue
+
+        existing.add((name, location_id))
+        added_agencies.add(agency.id)
+        pending.append({
+            'name': name,
+            'email': email if email else None,
+            'phone': (row.get('phone') or '').strip(),
+            'address': (row.get('address') or '').strip(),
+            'location_id': location_id,
+            'is_active': True
+        })
+        if len(pending) >= chunk_size:
+            success_count += len(pending) if dry_run else _insert_chunk(pending)
+            pending = []
+
+    if pending:
+        success_count += len(pending) if dry_run else _insert_chunk(pending)
+
+    # Bulk inserts skip the flush listener that keeps the order form's customer typeahead fresh
+    if not dry_run:
+        for agency_id in added_agencies:
+            invalidate_typeahead('customers', agency_id)
+
+    seconds = time.perf_counter() - started
+    return {
+        'success_count': success_count,
+        'error_count': len(errors),
+        'errors': errors.messages(),
+        'error_report': errors,
+        'dry_run': dry_run,
+        'seconds': seconds,
+        'rows_per_second': len(rows) / seconds if seconds > 0 else 0
+    }
+
+def _insert_chunk(customers):
+    inserted = get_bulk_loader(Customer).insert(customers)
+    db.session.commit()
+    return inserted
@@ -0,0 +1,34 @@
+from flask import jsonify, session, send_file
+from exports import exports_bp
+from auth.utils import login_required
+from utils.export_jobs import export_job_runner, job_payload
+
+def _own_job(job_id):
+    """The job if it exists and belongs to the current user"""
+    job = export_job_runner.get(job_id)
+    if job is None or job['user_id'] != session.get('user_id'):
+        return None
+    return job
+
+@exports_bp.route('/<job_id>')
+@login_required
+def job_status(job_id):
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found or expired'}), 404
+    return jsonify(job_payload(job))
+
+@exports_bp.route('/<job_id>/download')
+@login_required
+def download(job_id):
+    job = _own_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found or expired'}), 404
+    if job['status'] != 'finished':
+        return jsonify(job_payload(job)), 409
+    return send_file(
+        export_job_runner.result_path(job_id),
+        as_attachment=True,
+        download_name=job['filename'],
+        mimetype=job['mimetype']
+    )
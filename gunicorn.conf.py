@@ -1,14 +1,31 @@
 # Gunicorn configuration file for Render deployment
 import os
+import time
+from utils.concurrency import concurrency_settings
+
+# Boot timing: the config file is read first, so this is when the master started
+_master_started = time.monotonic()
 
 # Server socket
 bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
-# Worker processes
-workers = int(os.environ.get('WEB_CONCURRENCY', 1))
-worker_class = "sync"
-worker_connections = 1000
+# Worker processes: GUNICORN_PROFILE picks sync, gthread or gevent workers, sized
+# together with each worker's database pool (see utils/concurrency.py)
+_concurrency = concurrency_settings()
+_gevent_missing = False
+if _concurrency['profile'] == 'gevent':
+    try:
+        import gevent  # noqa: F401
+    except ImportError:
+        _gevent_missing = True
+        os.environ['GUNICORN_PROFILE'] = 'gthread'
+        _concurrency = concurrency_settings()
+
+workers = _concurrency['workers']
+worker_class = _concurrency['worker_class']
+threads = _concurrency['threads']
+worker_connections = _concurrency['worker_connections']
 timeout = 30
 keepalive = 2
 
@@ -26,7 +43,9 @@ access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"
 proc_name = "agencysales_pro"
 
 # Server mechanics
-preload_app = True
+# gevent patches the standard library when each worker starts; loading the
+# app in the master first would leave its locks and threads unpatched
+preload_app = _concurrency['profile'] != 'gevent'
 daemon = False
 pidfile = None
 tmp_upload_dir = None
@@ -34,4 +53,64 @@ tmp_upload_dir = None
 # Security
 limit_request_line = 4094
 limit_request_fields = 100
-limit_request_field_size = 8190
\ No newline at end of file
+limit_request_field_size = 8190
+
+# Server hooks
+def when_ready(server):
+    # With preload_app the app (and any AUTO_INIT_DB work) has been loaded by now
+    server.log.info("Master ready in %.0f ms", (time.monotonic() - _master_started) * 1000)
+    if _gevent_missing:
+        server.log.warning("GUNICORN_PROFILE=gevent but gevent is not installed; using gthread")
+    server.log.info("Profile %s: %d workers x %d %s, DB pool %d + %d overflow per worker (%d connections at most)",
+                    _concurrency['profile'], workers,
+                    worker_connections if worker_class == 'gevent' else threads,
+                    'greenlets' if worker_class == 'gevent' else 'threads',
+                    _concurrency['pool_size'], _concurrency['max_overflow'], _concurrency['db_connections'])
+    if os.environ.get('DATABASE_REPLICA_URL'):
+        server.log.info("Replica DB pool %d + %d overflow per worker (%d connections at most)",
+                        _concurrency['replica_pool_size'], _concurrency['replica_max_overflow'],
+                        _concurrency['replica_connections'])
+
+def post_fork(server, worker):
+    worker.forked_at = time.monotonic()
+    if worker_class == 'gevent':
+        # Make psycopg2 yield to other greenlets while it waits on Postgres
+        try:
+            from psycogreen.gevent import patch_psycopg
+            patch_psycopg()
+        except ImportError:
+            pass
+
+def _rss_mb():
+    # Resident memory of this process; pages still shared with the master after fork count too
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+def _format_mb(value):
+    return '?' if value is None else f'{value:.0f}'
+
+def post_worker_init(worker):
+    worker.log.info("Worker %s booted in %.0f ms, RSS %s MB", worker.pid,
+                    (time.monotonic() - worker.forked_at) * 1000, _format_mb(_rss_mb()))
+
+def worker_exit(server, worker):
+    # Workers are recycled after max_requests; RSS at exit shows how much they grew
+    server.log.info("Worker %s exiting, RSS %s MB", worker.pid, _format_mb(_rss_mb()))
+
+    # Let running export jobs finish; queued ones are marked as interrupted
+    from utils.export_jobs import export_job_runner
+    if export_job_runner.app is not None:
+        export_job_runner.shutdown()
+
+    # Write any buffered activity log records before the worker goes away
+    from utils.activity_log import activity_log_writer
+    if activity_log_writer.app is not None:
+        activity_log_writer.shutdown()
+        if activity_log_writer.dropped:
+            server.log.warning("Worker %s dropped %d activity log records", worker.pid, activity_log_writer.dropped)
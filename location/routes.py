@@ -1,17 +1,22 @@
 from flask import render_template, request, redirect, url_for, flash, session, make_response, jsonify
 from werkzeug.utils import secure_filename
 import csv, io, os
+from sqlalchemy.orm import joinedload
 from app import db
 from models import Location, Agency
 from location import location_bp
 from auth.utils import login_required, role_required, agency_access_required
 from utils.decorators import log_activity
-import pandas as pd
+from location.services import import_location_rows
+from utils.export_jobs import register_export, export_response, csv_output, iter_with_progress
+from utils.bulk_import import error_report_url
+from utils.db_routing import read_replica
 from datetime import datetime
 
 @location_bp.route('/')
 @login_required
 @agency_access_required
+@read_replica
 def list_locations(current_agency_id=None):
     user_role = session.get('role')
     
@@ -195,45 +200,38 @@ def download_location_template():
 @role_required('super_admin', 'agency_admin', 'staff')
 def export_locations():
     """Export existing locations to CSV"""
-    user_role = session.get('role')
-    current_agency_id = session.get('agency_id')
-    
+    return export_response('locations')
+
+@register_export('locations', 'locations_export.csv', 'text/csv')
+def write_locations_csv(output, scope, progress):
     # Get locations based on user role
-    if user_role == 'super_admin':
-        locations = Location.query.join(Agency).all()
-    else:
-        locations = Location.query.filter_by(agency_id=current_agency_id).join(Agency).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['name', 'address', 'city', 'state', 'zip_code', 'phone', 'agency_code', 'is_active', 'created_at'])
+    query = Location.query.options(joinedload(Location.agency))
+    if scope['role'] != 'super_admin':
+        query = query.filter_by(agency_id=scope['agency_id'])
+    total = query.count()
     
-    # Write data
-    for location in locations:
-        writer.writerow([
-            location.name,
-            location.address or '',
-            location.city or '',
-            location.state or '',
-            location.zip_code or '',
-            location.phone or '',
-            location.agency.code,
-            'Yes' if location.is_active else 'No',
-            location.created_at.strftime('%Y-%m-%d %H:%M:%S')
-        ])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=locations_export.csv'
-    response.headers['Content-Type'] = 'text/csv'
-    
-    return response
+    with csv_output(output) as writer:
+        # Write header
+        writer.writerow(['name', 'address', 'city', 'state', 'zip_code', 'phone', 'agency_code', 'is_active', 'created_at'])
+        
+        # Write data
+        for location in iter_with_progress(query.order_by(Location.id).yield_per(1000), progress, total):
+            writer.writerow([
+                location.name,
+                location.address or '',
+                location.city or '',
+                location.state or '',
+                location.zip_code or '',
+                location.phone or '',
+                location.agency.code,
+                'Yes' if location.is_active else 'No',
+                location.created_at.strftime('%Y-%m-%d %H:%M:%S')
+            ])
 
 @location_bp.route('/import', methods=['GET', 'POST'])
 @login_required
 @role_required('super_admin', 'agency_admin', 'staff')
-@log_activity('import_locations')
+@log_activity('import_locations', dry_run_action='validate_locations_import')
 def import_locations():
     """Import locations from CSV file"""
     if request.method == 'POST':
@@ -251,73 +249,25 @@ def import_locations():
             return redirect(url_for('location.import_locations'))
         
         try:
-            # Read CSV file
+            # Read CSV file once; lookups and inserts are set-based
             stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream)
-            
-            user_role = session.get('role')
-            current_agency_id = session.get('agency_id')
+            rows = list(csv.DictReader(stream))
             
-            success_count = 0
-            error_count = 0
-            errors = []
-            
-            for row_num, row in enumerate(csv_input, start=2):  # Start from 2 to account for header
-                try:
-                    # Validate required fields
-                    if not row.get('name') or not row.get('name').strip():
-                        errors.append(f"Row {row_num}: Location name is required")
-                        error_count += 1
-                        continue
-                    
-                    agency_code = row.get('agency_code', '').strip()
-                    if not agency_code:
-                        errors.append(f"Row {row_num}: Agency code is required")
-                        error_count += 1
-                        continue
-                    
-                    # Find agency by code
-                    agency = Agency.query.filter_by(code=agency_code, is_active=True).first()
-                    if not agency:
-                        errors.append(f"Row {row_num}: Agency with code '{agency_code}' not found or inactive")
-                        error_count += 1
-                        continue
-                    
-                    # Check permissions for non-super admin users
-                    if user_role != 'super_admin' and agency.id != current_agency_id:
-                        errors.append(f"Row {row_num}: You can only import locations for your agency")
-                        error_count += 1
-                        continue
-                    
-                    # Check if location already exists
-                    existing_location = Location.query.filter_by(name=row['name'].strip(), agency_id=agency.id).first()
-                    if existing_location:
-                        errors.append(f"Row {row_num}: Location '{row['name'].strip()}' already exists for this agency")
-                        error_count += 1
-                        continue
-                    
-                    # Create new location
-                    location = Location(
-                        name=row['name'].strip(),
-                        address=row.get('address', '').strip(),
-                        city=row.get('city', '').strip(),
-                        state=row.get('state', '').strip(),
-                        zip_code=row.get('zip_code', '').strip(),
-                        phone=row.get('phone', '').strip(),
-                        agency_id=agency.id,
-                        is_active=True
-                    )
-                    
-                    db.session.add(location)
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    error_count += 1
+            # A dry run validates every row and offers the rejected ones as a CSV
+            dry_run = bool(request.form.get('dry_run'))
+            result = import_location_rows(rows, session.get('role'), session.get('agency_id'),
+                                          dry_run=dry_run)
+            if dry_run:
+                return render_template('location/import.html', validation=result,
+                                       error_report_url=error_report_url(result, 'location_import_errors.csv'))
+
+            success_count = result['success_count']
+            error_count = result['error_count']
+            errors = result['errors']
             
             if success_count > 0:
-                db.session.commit()
-                flash(f'Successfully imported {success_count} locations', 'success')
+                flash(f'Successfully imported {success_count} locations '
+                      f'({result["rows_per_second"]:.0f} rows/second)', 'success')
             
             if error_count > 0:
                 flash(f'{error_count} errors occurred during import', 'warning')
@@ -0,0 +1,111 @@
+import time
+from app import db
+from models import Location, Agency
+from utils.bulk_import import IMPORT_CHUNK_SIZE, ImportErrors, chunked
+from utils.bulk_load import get_bulk_loader
+from utils.filter_options import invalidate_filter_options
+from utils.typeahead import invalidate_typeahead
+
+def _prefetch_lookups(rows):
+    """Active agencies by code and the (agency_id, name) pairs of existing locations"""
+    codes = {(row.get('agency_code') or '').strip() for row in rows} - {''}
+    names = {(row.get('name') or '').strip() for row in rows} - {''}
+
+    agencies = {}
+    for chunk in chunked(codes):
+        for agency_id, code in db.session.query(Agency.id, Agency.code).filter(
+                Agency.code.in_(chunk), Agency.is_active == True):
+            agencies[code] = agency_id
+
+    existing = set()
+    if agencies:
+        for chunk in chunked(names):
+            existing.update(db.session.query(Location.agency_id, Location.name).filter(
+                Location.agency_id.in_(list(agencies.values())), Location.name.in_(chunk)
+            ))
+    return agencies, existing
+
+def import_location_rows(rows, user_role, current_agency_id, chunk_size=IMPORT_CHUNK_SIZE, dry_run=False):
+    """Validate CSV location rows in memory and bulk load the valid ones.
+
+    Same contract as customer.services.import_customer_rows, including
+    dry_run.
+    """
+    started = time.perf_counter()
+    agencies, existing = _prefetch_lookups(rows)
+    loader = get_bulk_loader(Location)
+
+    errors = ImportErrors()
+    pending = []
+    added = set()
+    success_count = 0
+    for row_num, row in enumerate(rows, start=2):  # Start from 2 to account for header
+        # Validate required fields
+        name = (row.get('name') or '').strip()
+        if not name:
+            errors.add(row_num, f"Location name is required", row)
+            continue
+
+        agency_code = (row.get('agency_code') or '').strip()
+        if not agency_code:
+            errors.add(row_num, f"Agency code is required", row)
+            continue
+
+        agency_id = agencies.get(agency_code)
+        if not agency_id:
+            errors.add(row_num, f"Agency with code '{agency_code}' not found or inactive", row)
+            continue
+
+        # Check permissions for non-super admin users
+        if user_role != 'super_admin' and agency_id != current_agency_id:
+            errors.add(row_num, f"You can only import locations for your agency", row)
+            continue
+
+        # Existing locations and earlier rows of the same file are both duplicates
+        if (agency_id, name) in existing:
+            errors.add(row_num, f"Location '{name}' already exists for this agency", row)
+            continue
+
+        existing.add((agency_id, name))
+        added.add((agency_id, name))
+        pending.append({
+            'name': name,
+            'address': (row.get('address') or '').strip(),
+            'city': (row.get('city') or '').strip(),
+            'state': (row.get('state') or '').strip(),
+            'zip_code': (row.get('zip_code') or '').strip(),
+            'phone': (row.get('phone') or '').strip(),
+            'agency_id': agency_id,
+            'is_active': True
+        })
+        if len(pending) >= chunk_size:
+            success_count += _load_chunk(loader, pending, dry_run)
+            pending = []
+
+    if pending:
+        success_count += _load_chunk(loader, pending, dry_run)
+
+    # Bulk inserts skip the flush listeners that keep the location filter lists
+    # and the customer typeahead (which shows location names) fresh
+    if not dry_run:
+        for agency_id in {agency_id for agency_id, _ in added}:
+            invalidate_filter_options('locations', agency_id)
+            invalidate_typeahead('customers', agency_id)
+
+    seconds = time.perf_counter() - started
+    return {
+        'success_count': success_count,
+        'error_count': len(errors),
+        'errors': errors.messages(),
+        'error_report': errors,
+        'dry_run': dry_run,
+        'seconds': seconds,
+        'rows_per_second': len(rows) / seconds if seconds > 0 else 0
+    }
+
+def _load_chunk(loader, locations, dry_run):
+    if dry_run:
+        return len(locations)
+    inserted = loader.insert(locations)
+    db.session.commit()
+    return inserted
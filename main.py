@@ -1,4 +1,9 @@
 from app import app
 
 if __name__ == '__main__':
+    # The development server sets up the schema and default accounts itself;
+    # deployments run `flask init-db` before starting gunicorn
+    with app.app_context():
+        from utils.db_setup import init_db
+        init_db()
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -21,6 +21,9 @@ class Agency(db.Model):
 
 class User(db.Model):
     __tablename__ = 'ASP_users'
+    __table_args__ = (
+        db.Index('ix_users_agency_role', 'agency_id', 'role', 'is_active'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(80), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
@@ -48,6 +51,9 @@ class User(db.Model):
 
 class Location(db.Model):
     __tablename__ = 'ASP_locations'
+    __table_args__ = (
+        db.Index('ix_locations_agency_active', 'agency_id', 'is_active'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     address = db.Column(db.Text)
@@ -64,6 +70,11 @@ class Location(db.Model):
 
 class Customer(db.Model):
     __tablename__ = 'ASP_customers'
+    __table_args__ = (
+        # Customer list: by location (joined from agency), newest first
+        db.Index('ix_customers_location_created', 'location_id', 'created_at'),
+        db.Index('ix_customers_created', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120))
@@ -78,6 +89,11 @@ class Customer(db.Model):
 
 class Product(db.Model):
     __tablename__ = 'ASP_products'
+    __table_args__ = (
+        # Product list and order forms: an agency's products, newest first or by category
+        db.Index('ix_products_agency_active_created', 'agency_id', 'is_active', 'created_at'),
+        db.Index('ix_products_agency_category', 'agency_id', 'category'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
@@ -95,6 +111,14 @@ class Product(db.Model):
 
 class Order(db.Model):
     __tablename__ = 'ASP_orders'
+    __table_args__ = (
+        # Order list keyset pagination is on (created_at, id), scoped by agency or salesperson
+        db.Index('ix_orders_created', 'created_at', 'id'),
+        db.Index('ix_orders_agency_created', 'agency_id', 'created_at', 'id'),
+        db.Index('ix_orders_agency_status_created', 'agency_id', 'status', 'created_at'),
+        db.Index('ix_orders_salesperson_created', 'salesperson_id', 'created_at', 'id'),
+        db.Index('ix_orders_customer', 'customer_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_number = db.Column(db.String(50), unique=True, nullable=False)
     customer_id = db.Column(db.Integer, db.ForeignKey('ASP_customers.id'), nullable=False)
@@ -114,6 +138,10 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     __tablename__ = 'ASP_order_items'
+    __table_args__ = (
+        db.Index('ix_order_items_order', 'order_id'),
+        db.Index('ix_order_items_product', 'product_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     order_id = db.Column(db.Integer, db.ForeignKey('ASP_orders.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('ASP_products.id'), nullable=False)
@@ -126,8 +154,37 @@ class OrderItem(db.Model):
         if self.quantity and self.unit_price:
             self.total_price = self.quantity * self.unit_price
 
+class OrderIdempotencyKey(db.Model):
+    __tablename__ = 'ASP_order_idempotency_keys'
+    __table_args__ = (db.UniqueConstraint('user_id', 'key', name='uq_order_idempotency_user_key'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('ASP_users.id'), nullable=False)
+    key = db.Column(db.String(255), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('ASP_orders.id', ondelete='CASCADE'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DailySalesRollup(db.Model):
+    __tablename__ = 'ASP_daily_sales_rollup'
+    __table_args__ = (
+        db.UniqueConstraint('agency_id', 'salesperson_id', 'day', 'status', name='uq_daily_sales_rollup_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    agency_id = db.Column(db.Integer, db.ForeignKey('ASP_agencies.id'), nullable=False)
+    salesperson_id = db.Column(db.Integer, db.ForeignKey('ASP_users.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20))
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    discount = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    tax = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
 class ActivityLog(db.Model):
     __tablename__ = 'ASP_activity_logs'
+    __table_args__ = (
+        # Activity log is paged newest first; per-user last activity uses the second index
+        db.Index('ix_activity_logs_created', 'created_at'),
+        db.Index('ix_activity_logs_user_created', 'user_id', 'created_at'),
+    )
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('ASP_users.id'), nullable=False)
     action = db.Column(db.String(100), nullable=False)
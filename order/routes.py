@@ -1,16 +1,26 @@
-from flask import render_template, request, redirect, url_for, flash, session, send_file, jsonify
+from flask import render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from datetime import datetime
-import uuid
+from sqlalchemy import func, text
+from sqlalchemy.orm import joinedload
 from app import db
 from models import Order, OrderItem, Customer, Product, Location, User, Agency
 from order import order_bp
 from auth.utils import login_required, agency_access_required
 from utils.decorators import log_activity
 from utils.excel_utils import export_orders_to_excel
+from utils.export_jobs import register_export, export_response
+from order.services import OrderValidationError, parse_order_lines, create_order as create_order_record
+from utils.cache import cache_get, cache_set
+from utils.pagination import keyset_paginate, offset_paginate
+from utils.filter_options import get_agency_options, get_location_options, get_salesperson_options, customer_search_query
+from utils.db_routing import read_replica
+from utils.search import apply_search
+from utils.typeahead import get_customer_index, get_product_index, typeahead_response
 
 @order_bp.route('/')
 @login_required
 @agency_access_required
+@read_replica
 def list_orders(current_agency_id=None):
     user_role = session.get('role')
     user_id = session.get('user_id')
@@ -31,6 +41,7 @@ def list_orders(current_agency_id=None):
     customer_filter = request.args.get('customer')
     salesperson_filter = request.args.get('salesperson')
     status_filter = request.args.get('status')
+    search_term = request.args.get('q', '').strip()
     
     if date_from:
         try:
@@ -63,41 +74,82 @@ def list_orders(current_agency_id=None):
     if status_filter:
         query = query.filter(Order.status == status_filter)
     
-    orders = query.order_by(Order.created_at.desc()).all()
+    if search_term:
+        query = apply_search(query, 'orders', search_term)
     
-    # Get filter options
-    agencies = []
-    if user_role == 'super_admin':
-        agencies = Agency.query.filter_by(is_active=True).all()
-    
-    locations = []
-    customers = []
-    salespersons = []
-    
-    if user_role == 'super_admin':
-        locations = Location.query.filter_by(is_active=True).all()
-        customers = Customer.query.filter_by(is_active=True).all()
-        salespersons = User.query.filter(User.role.in_(['salesperson', 'staff', 'agency_admin'])).all()
+    # Fixed-size page ordered by (created_at, id), or by rank when searching, with the rows the list template touches eager-loaded
+    per_page = request.args.get('per_page', current_app.config['ORDERS_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['ORDERS_MAX_PER_PAGE']))
+    count_query = query
+    query = query.options(
+        joinedload(Order.customer).joinedload(Customer.location),
+        joinedload(Order.salesperson)
+    )
+    if search_term:
+        # Best matches first; rank order cannot be followed with a cursor
+        page = offset_paginate(query, request.args.get('page', 1, type=int), per_page)
     else:
-        locations = Location.query.filter_by(agency_id=current_agency_id, is_active=True).all()
-        customers = Customer.query.join(Location).filter(Location.agency_id == current_agency_id, Customer.is_active == True).all()
-        salespersons = User.query.filter_by(agency_id=current_agency_id).filter(User.role.in_(['salesperson', 'staff', 'agency_admin'])).all()
+        page = keyset_paginate(query, Order.created_at, Order.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
+    
+    filters = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'agency': agency_filter,
+        'location': location_filter,
+        'customer': customer_filter,
+        'salesperson': salesperson_filter,
+        'status': status_filter,
+        'q': search_term
+    }
+    scope = user_id if user_role == 'salesperson' else current_agency_id
+    total_count = get_order_count_estimate(count_query, (user_role, scope, tuple(sorted(filters.items()))))
+    
+    # Get filter options (cached per agency; customers are loaded on demand via search_customers)
+    agencies = get_agency_options() if user_role == 'super_admin' else []
+    option_scope = None if user_role == 'super_admin' else current_agency_id
+    locations = get_location_options(option_scope)
+    salespersons = get_salesperson_options(option_scope)
+    customers = []
+    if customer_filter:
+        customers = [{'id': c.id, 'name': c.name}
+                     for c in customer_search_query(option_scope, None).filter(Customer.id == customer_filter).all()]
     
     return render_template('order/list.html', 
-                         orders=orders,
+                         orders=page.items,
+                         page=page,
+                         per_page=per_page,
+                         total_count=total_count,
                          agencies=agencies,
                          locations=locations,
                          customers=customers,
                          salespersons=salespersons,
-                         filters={
-                             'date_from': date_from,
-                             'date_to': date_to,
-                             'agency': agency_filter,
-                             'location': location_filter,
-                             'customer': customer_filter,
-                             'salesperson': salesperson_filter,
-                             'status': status_filter
-                         })
+                         filters=filters,
+                         page_args={k: v for k, v in filters.items() if v})
+
+def get_order_count_estimate(query, cache_key):
+    """Count the orders matched by query, cached so paging does not recount every time"""
+    cache_key = ('order_count',) + cache_key
+    count = cache_get(cache_key)
+    if count is not None:
+        return count
+    
+    count = None
+    unfiltered = cache_key[1] == 'super_admin' and not any(v for _, v in cache_key[3])
+    if unfiltered and db.engine.dialect.name == 'postgresql':
+        # Planner statistics are good enough for the whole table and avoid a full scan
+        estimate = db.session.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE relname = :table"),
+            {'table': Order.__tablename__}
+        ).scalar()
+        if estimate is not None and estimate >= 0:
+            count = estimate
+    
+    if count is None:
+        count = query.order_by(None).with_entities(func.count(Order.id)).scalar()
+    
+    return cache_set(cache_key, count, ttl=current_app.config['ORDER_COUNT_CACHE_TTL'])
 
 @order_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -118,81 +170,49 @@ def create_order():
         
         if not customer_id:
             flash('Customer is required', 'error')
-            return render_template('order/form.html', 
-                                 customers=get_customers_for_user(),
-                                 products=get_products_for_user())
+            return render_template('order/form.html')
         
         if not products_data or not quantities:
             flash('At least one product is required', 'error')
-            return render_template('order/form.html',
-                                 customers=get_customers_for_user(),
-                                 products=get_products_for_user())
+            return render_template('order/form.html')
         
         # Validate customer belongs to user's agency
-        customer = Customer.query.get(customer_id)
+        customer = Customer.query.options(joinedload(Customer.location)).get(customer_id)
         if not customer:
             flash('Invalid customer selected', 'error')
-            return render_template('order/form.html',
-                                 customers=get_customers_for_user(),
-                                 products=get_products_for_user())
+            return render_template('order/form.html')
         
         if user_role != 'super_admin' and customer.location.agency_id != current_agency_id:
             flash('You can only create orders for your agency customers', 'error')
-            return render_template('order/form.html',
-                                 customers=get_customers_for_user(),
-                                 products=get_products_for_user())
-        
-        # Generate order number
-        order_number = f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+            return render_template('order/form.html')
         
-        # Create order
-        order = Order(
-            order_number=order_number,
-            customer_id=customer_id,
-            agency_id=customer.location.agency_id,
-            salesperson_id=user_id,
-            status='pending',
-            discount=float(discount) if discount else 0,
-            tax=float(tax) if tax else 0,
-            notes=notes
-        )
-        
-        if delivery_date:
-            order.delivery_date = datetime.strptime(delivery_date, '%Y-%m-%d')
-        
-        db.session.add(order)
-        db.session.flush()  # Get order ID
-        
-        # Add order items
-        total_amount = 0
-        for i, product_id in enumerate(products_data):
-            if i < len(quantities) and quantities[i]:
-                quantity = int(quantities[i])
-                product = Product.query.get(product_id)
-                
-                if product and quantity > 0:
-                    # Validate product belongs to same agency
-                    if user_role != 'super_admin' and product.agency_id != customer.location.agency_id:
-                        continue
-                    
-                    order_item = OrderItem(
-                        order_id=order.id,
-                        product_id=product_id,
-                        quantity=quantity,
-                        unit_price=product.price
-                    )
-                    total_amount += order_item.total_price
-                    db.session.add(order_item)
+        try:
+            lines = parse_order_lines(products_data, quantities)
+        except ValueError:
+            flash('Invalid product quantity', 'error')
+            return render_template('order/form.html')
         
-        order.total_amount = total_amount
-        db.session.commit()
+        try:
+            create_order_record(
+                customer,
+                salesperson_id=user_id,
+                lines=lines,
+                discount=discount,
+                tax=tax,
+                notes=notes,
+                delivery_date=datetime.strptime(delivery_date, '%Y-%m-%d') if delivery_date else None,
+                restrict_to_agency=user_role != 'super_admin'
+            )
+        except OrderValidationError as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return render_template('order/form.html')
         
         flash('Order created successfully!', 'success')
         return redirect(url_for('order.list_orders'))
     
-    return render_template('order/form.html',
-                         customers=get_customers_for_user(),
-                         products=get_products_for_user())
+    # Customers and products are looked up as the user types (search_customers, search_products)
+    return render_template('order/form.html')
 
 @order_bp.route('/<int:order_id>')
 @login_required
@@ -317,26 +337,20 @@ def delete_order(order_id):
 @login_required
 @log_activity('export_orders')
 def export_orders():
-    user_role = session.get('role')
-    current_agency_id = session.get('agency_id')
-    user_id = session.get('user_id')
-    
-    if user_role == 'super_admin':
-        orders = Order.query.all()
-    elif user_role == 'salesperson':
-        orders = Order.query.filter_by(salesperson_id=user_id).all()
+    return export_response('orders')
+
+@register_export('orders', 'orders_export.xlsx',
+                 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+def write_orders_excel(output, scope, progress):
+    if scope['role'] == 'super_admin':
+        orders = Order.query
+    elif scope['role'] == 'salesperson':
+        orders = Order.query.filter_by(salesperson_id=scope['user_id'])
     else:
-        orders = Order.query.filter_by(agency_id=current_agency_id).all()
-    
-    # Create Excel file
-    output = export_orders_to_excel(orders)
+        orders = Order.query.filter_by(agency_id=scope['agency_id'])
     
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name='orders_export.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    # Create Excel file, streamed from the query
+    export_orders_to_excel(orders, output=output, progress=progress)
 
 @order_bp.route('/api/customers/<int:location_id>')
 @login_required
@@ -358,25 +372,22 @@ def get_customers_by_location(location_id):
         'phone': c.phone
     } for c in customers])
 
-def get_customers_for_user():
-    """Get customers based on current user role"""
-    user_role = session.get('role')
-    
-    if user_role == 'super_admin':
-        return Customer.query.filter_by(is_active=True).all()
-    else:
-        agency_id = session.get('agency_id')
-        return Customer.query.join(Location).filter(
-            Location.agency_id == agency_id,
-            Customer.is_active == True
-        ).all()
+@order_bp.route('/api/customers/search')
+@login_required
+def search_customers():
+    """Typeahead endpoint for customer dropdowns"""
+    agency_id, term, limit = typeahead_args()
+    return typeahead_response(get_customer_index(agency_id).lookup(term, limit))
 
-def get_products_for_user():
-    """Get products based on current user role"""
-    user_role = session.get('role')
-    
-    if user_role == 'super_admin':
-        return Product.query.filter_by(is_active=True).all()
-    else:
-        agency_id = session.get('agency_id')
-        return Product.query.filter_by(agency_id=agency_id, is_active=True).all()
+@order_bp.route('/api/products/search')
+@login_required
+def search_products():
+    """Typeahead endpoint for the order form's product dropdowns"""
+    agency_id, term, limit = typeahead_args()
+    return typeahead_response(get_product_index(agency_id).lookup(term, limit))
+
+def typeahead_args():
+    """(agency scope, search term, result limit) of a typeahead request"""
+    agency_id = None if session.get('role') == 'super_admin' else session.get('agency_id')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+    return agency_id, request.args.get('q', '').strip(), limit
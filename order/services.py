@@ -0,0 +1,235 @@
+from datetime import datetime
+from decimal import Decimal
+import uuid
+from sqlalchemy import insert
+from sqlalchemy.orm import joinedload
+from app import db
+from models import Order, OrderItem, Product, Customer, OrderIdempotencyKey
+from utils.sales_rollup import mark_sales_rollup_dirty
+
+class OrderValidationError(ValueError):
+    """Raised when an order request cannot be turned into an order"""
+
+IDEMPOTENCY_KEY_MAX_LENGTH = OrderIdempotencyKey.key.type.length
+
+def idempotency_key_error(key):
+    """Why key cannot be used as an idempotency key, or None if it can (or is absent)"""
+    if key is not None and not (isinstance(key, str) and 1 <= len(key) <= IDEMPOTENCY_KEY_MAX_LENGTH):
+        return f'idempotency_key must be a string of 1 to {IDEMPOTENCY_KEY_MAX_LENGTH} characters'
+    return None
+
+def generate_order_number():
+    """Generate a unique, human readable order number"""
+    return f"ORD-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+def parse_order_lines(product_ids, quantities):
+    """Pair up product ids and quantities from a submitted form, dropping blank lines"""
+    lines = []
+    for i, product_id in enumerate(product_ids):
+        if i < len(quantities) and quantities[i] and product_id:
+            lines.append((int(product_id), int(quantities[i])))
+    return lines
+
+def load_products(product_ids):
+    """Fetch every referenced product in a single IN query, keyed by id"""
+    ids = set(product_ids)
+    if not ids:
+        return {}
+    return {p.id: p for p in Product.query.filter(Product.id.in_(ids)).all()}
+
+def price_order_lines(lines, products, agency_id, restrict_to_agency=True):
+    """Validate lines in memory and return (item rows, total amount).
+
+    Lines that reference unknown products, non-positive quantities or (when
+    restrict_to_agency is set) products of another agency are skipped, which
+    matches how the order form has always behaved.
+    """
+    items = []
+    total_amount = Decimal('0')
+    for product_id, quantity in lines:
+        product = products.get(product_id)
+        if not product or quantity <= 0:
+            continue
+        if restrict_to_agency and product.agency_id != agency_id:
+            continue
+
+        unit_price = Decimal(product.price)
+        total_price = unit_price * quantity
+        items.append({
+            'product_id': product_id,
+            'quantity': quantity,
+            'unit_price': unit_price,
+            'total_price': total_price
+        })
+        total_amount += total_price
+    return items, total_amount
+
+def create_order(customer, salesperson_id, lines, discount=0, tax=0, notes=None,
+                 delivery_date=None, restrict_to_agency=True, commit=True):
+    """Create an order and its items with a fixed number of statements.
+
+    Products are fetched with one IN query, the order row is inserted with its
+    final total and the items are written with a single executemany insert.
+    """
+    agency_id = customer.location.agency_id
+    products = load_products(product_id for product_id, _ in lines)
+    items, total_amount = price_order_lines(lines, products, agency_id, restrict_to_agency)
+    if not items:
+        raise OrderValidationError('At least one valid product is required')
+
+    order = Order(
+        order_number=generate_order_number(),
+        customer_id=customer.id,
+        agency_id=agency_id,
+        salesperson_id=salesperson_id,
+        status='pending',
+        discount=float(discount) if discount else 0,
+        tax=float(tax) if tax else 0,
+        total_amount=total_amount,
+        notes=notes,
+        delivery_date=delivery_date
+    )
+    db.session.add(order)
+    db.session.flush()  # Get order ID
+
+    for item in items:
+        item['order_id'] = order.id
+    db.session.execute(insert(OrderItem), items)
+
+    if commit:
+        db.session.commit()
+    return order
+
+def _parse_order_request(data):
+    """Normalise one API order payload, raising OrderValidationError on bad input"""
+    if not isinstance(data, dict):
+        raise OrderValidationError('Order must be an object')
+    if not data.get('customer_id') or not data.get('items'):
+        raise OrderValidationError('Customer and items are required')
+    try:
+        customer_id = int(data['customer_id'])
+        lines = [(int(item['product_id']), int(item['quantity'])) for item in data['items']]
+        delivery_date = data.get('delivery_date')
+        return {
+            'customer_id': customer_id,
+            'lines': lines,
+            'discount': float(data.get('discount') or 0),
+            'tax': float(data.get('tax') or 0),
+            'notes': data.get('notes'),
+            'delivery_date': datetime.strptime(delivery_date, '%Y-%m-%d') if delivery_date else None
+        }
+    except (KeyError, TypeError, ValueError):
+        raise OrderValidationError('Invalid customer_id, items, discount, tax or delivery_date')
+
+def create_orders_bulk(user, order_requests):
+    """Create a batch of API orders with set-based reads and writes.
+
+    order_requests is a list of (idempotency_key or None, payload dict).
+    Returns one result dict per request, in order, with a status of
+    'created', 'duplicate' (key already used by this user) or 'error'.
+    """
+    results = [{'index': i, 'idempotency_key': key} for i, (key, _) in enumerate(order_requests)]
+
+    # Malformed keys fail their own order before any key reaches the database
+    for result, (key, _) in zip(results, order_requests):
+        error = idempotency_key_error(key)
+        if error:
+            result.update(status='error', error=error)
+
+    # Orders already created for these keys are reported, not recreated
+    keys = [key for result, (key, _) in zip(results, order_requests) if key and 'status' not in result]
+    existing = {}
+    if keys:
+        rows = db.session.query(OrderIdempotencyKey.key, Order.id, Order.order_number) \
+            .join(Order, OrderIdempotencyKey.order_id == Order.id) \
+            .filter(OrderIdempotencyKey.user_id == user.id, OrderIdempotencyKey.key.in_(set(keys))).all()
+        existing = {key: (order_id, order_number) for key, order_id, order_number in rows}
+
+    pending = []
+    seen_keys = set()
+    for result, (key, data) in zip(results, order_requests):
+        if 'status' in result:
+            continue
+        if key in existing:
+            result.update(status='duplicate', order_id=existing[key][0], order_number=existing[key][1])
+            continue
+        if key and key in seen_keys:
+            result.update(status='error', error='Duplicate idempotency key in batch')
+            continue
+        try:
+            parsed = _parse_order_request(data)
+        except OrderValidationError as e:
+            result.update(status='error', error=str(e))
+            continue
+        if key:
+            seen_keys.add(key)
+        pending.append((result, parsed))
+
+    # One query each for every customer and product referenced by the batch
+    customer_ids = {parsed['customer_id'] for _, parsed in pending}
+    customers = {}
+    if customer_ids:
+        customers = {c.id: c for c in Customer.query.options(joinedload(Customer.location))
+                     .filter(Customer.id.in_(customer_ids)).all()}
+    products = load_products(product_id for _, parsed in pending for product_id, _ in parsed['lines'])
+
+    order_rows = []
+    order_items = []
+    now = datetime.utcnow()
+    for result, parsed in pending:
+        customer = customers.get(parsed['customer_id'])
+        if not customer:
+            result.update(status='error', error='Customer not found')
+            continue
+        agency_id = customer.location.agency_id
+        if user.role != 'super_admin' and agency_id != user.agency_id:
+            result.update(status='error', error='Unauthorized customer access')
+            continue
+        items, total_amount = price_order_lines(parsed['lines'], products, agency_id,
+                                                restrict_to_agency=user.role != 'super_admin')
+        if not items:
+            result.update(status='error', error='At least one valid product is required')
+            continue
+
+        order_number = generate_order_number()
+        result.update(status='created', order_number=order_number)
+        order_rows.append({
+            'order_number': order_number,
+            'customer_id': customer.id,
+            'agency_id': agency_id,
+            'salesperson_id': user.id,
+            'status': 'pending',
+            'discount': parsed['discount'],
+            'tax': parsed['tax'],
+            'total_amount': total_amount,
+            'notes': parsed['notes'],
+            'delivery_date': parsed['delivery_date'],
+            'order_date': now,
+            'created_at': now
+        })
+        order_items.append((result, items))
+
+    if not order_rows:
+        return results
+
+    created = db.session.execute(
+        insert(Order).returning(Order.id, Order.order_number), order_rows
+    ).all()
+    order_ids = {order_number: order_id for order_id, order_number in created}
+
+    item_rows = []
+    key_rows = []
+    for result, items in order_items:
+        result['order_id'] = order_ids[result['order_number']]
+        item_rows.extend(dict(item, order_id=result['order_id']) for item in items)
+        if result['idempotency_key']:
+            key_rows.append({'user_id': user.id, 'key': result['idempotency_key'], 'order_id': result['order_id']})
+
+    db.session.execute(insert(OrderItem), item_rows)
+    # Bulk inserts bypass the unit of work, so the rollup buckets are marked by hand
+    for row in order_rows:
+        mark_sales_rollup_dirty(db.session, row['agency_id'], row['salesperson_id'], now)
+    if key_rows:
+        db.session.execute(insert(OrderIdempotencyKey), key_rows)
+    db.session.commit()
+    return results
@@ -1,18 +1,25 @@
-from flask import render_template, request, redirect, url_for, flash, session, send_file
+from flask import render_template, request, redirect, url_for, flash, session, current_app
 from werkzeug.utils import secure_filename
-import pandas as pd
 import io
 import os
+from sqlalchemy.orm import joinedload
 from app import db
 from models import Product, Agency
 from product import product_bp
 from auth.utils import login_required, agency_access_required
 from utils.decorators import log_activity
+from utils.filter_options import get_agency_options, get_category_options
 from utils.excel_utils import export_products_to_excel, import_products_from_excel
+from utils.export_jobs import register_export, export_response
+from utils.bulk_import import error_report_url
+from utils.db_routing import read_replica
+from utils.pagination import keyset_paginate, offset_paginate
+from utils.search import apply_search
 
 @product_bp.route('/')
 @login_required
 @agency_access_required
+@read_replica
 def list_products(current_agency_id=None):
     user_role = session.get('role')
     
@@ -28,6 +35,7 @@ def list_products(current_agency_id=None):
     agency_filter = request.args.get('agency')
     category_filter = request.args.get('category')
     status_filter = request.args.get('status')
+    search_term = request.args.get('q', '').strip()
     
     if date_from:
         try:
@@ -56,32 +64,45 @@ def list_products(current_agency_id=None):
     elif status_filter == 'inactive':
         query = query.filter(Product.is_active == False)
     
-    products = query.order_by(Product.created_at.desc()).all()
+    if search_term:
+        query = apply_search(query, 'products', search_term)
+    
+    per_page = request.args.get('per_page', current_app.config['LIST_PER_PAGE'], type=int)
+    per_page = max(1, min(per_page, current_app.config['LIST_MAX_PER_PAGE']))
+    if search_term:
+        page = offset_paginate(query, request.args.get('page', 1, type=int), per_page)
+    else:
+        page = keyset_paginate(query, Product.created_at, Product.id, per_page,
+                               after=request.args.get('after'),
+                               before=request.args.get('before'))
     
     # Get filter options
     agencies = []
     if user_role == 'super_admin':
-        agencies = Agency.query.filter_by(is_active=True).all()
+        agencies = get_agency_options()
     
     # Get unique categories
     if user_role == 'super_admin':
-        categories = db.session.query(Product.category.distinct()).filter(Product.category.isnot(None)).all()
+        categories = get_category_options()
     else:
-        categories = db.session.query(Product.category.distinct()).filter(Product.agency_id == current_agency_id, Product.category.isnot(None)).all()
-    
-    categories = [cat[0] for cat in categories if cat[0]]
+        categories = get_category_options(current_agency_id)
     
+    filters = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'agency': agency_filter,
+        'category': category_filter,
+        'status': status_filter,
+        'q': search_term
+    }
     return render_template('product/list.html', 
-                         products=products,
+                         products=page.items,
+                         page=page,
+                         per_page=per_page,
                          agencies=agencies,
                          categories=categories,
-                         filters={
-                             'date_from': date_from,
-                             'date_to': date_to,
-                             'agency': agency_filter,
-                             'category': category_filter,
-                             'status': status_filter
-                         })
+                         filters=filters,
+                         page_args={k: v for k, v in filters.items() if v})
 
 @product_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -248,27 +269,21 @@ def delete_product(product_id):
 @login_required
 @log_activity('export_products')
 def export_products():
-    user_role = session.get('role')
-    current_agency_id = session.get('agency_id')
-    
-    if user_role == 'super_admin':
-        products = Product.query.all()
-    else:
-        products = Product.query.filter_by(agency_id=current_agency_id).all()
+    return export_response('products')
+
+@register_export('products', 'products_export.xlsx',
+                 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+def write_products_excel(output, scope, progress):
+    products = Product.query.options(joinedload(Product.agency))
+    if scope['role'] != 'super_admin':
+        products = products.filter_by(agency_id=scope['agency_id'])
     
     # Create Excel file
-    output = export_products_to_excel(products)
-    
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name='products_export.xlsx',
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    export_products_to_excel(products.order_by(Product.id), output=output, progress=progress)
 
 @product_bp.route('/import', methods=['GET', 'POST'])
 @login_required
-@log_activity('import_products')
+@log_activity('import_products', dry_run_action='validate_products_import')
 def import_products():
     if request.method == 'POST':
         if 'file' not in request.files:
@@ -288,10 +303,18 @@ def import_products():
             user_role = session.get('role')
             current_agency_id = session.get('agency_id')
             
-            # Import products
-            result = import_products_from_excel(file, current_agency_id, user_role)
+            # Import products; upsert mode updates existing SKUs instead of skipping them
+            mode = 'upsert' if request.form.get('mode') == 'upsert' else 'insert'
+            dry_run = bool(request.form.get('dry_run'))
+            result = import_products_from_excel(file, current_agency_id, user_role, mode=mode, dry_run=dry_run)
             
-            if result['success']:
+            if result['success'] and dry_run:
+                return render_template('product/import.html', validation=result,
+                                       error_report_url=error_report_url(result, 'product_import_errors.csv'))
+            elif result['success'] and mode == 'upsert':
+                flash(f"Imported {result['imported']} new products, updated {result['updated']}, "
+                      f"{result['unchanged']} unchanged. Skipped {result['skipped']} rows.", 'success')
+            elif result['success']:
                 flash(f"Successfully imported {result['imported']} products. Skipped {result['skipped']} duplicates.", 'success')
             else:
                 flash(f"Import failed: {result['message']}", 'error')
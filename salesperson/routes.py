@@ -4,11 +4,13 @@ from models import User, Agency
 from salesperson import salesperson_bp
 from auth.utils import login_required, role_required, agency_access_required
 from utils.decorators import log_activity
+from utils.db_routing import read_replica
 
 @salesperson_bp.route('/')
 @login_required
 @role_required('super_admin', 'agency_admin', 'staff')
 @agency_access_required
+@read_replica
 def list_salespersons(current_agency_id=None):
     user_role = session.get('role')
     
@@ -0,0 +1,82 @@
+from flask import jsonify, request, session, url_for
+from sqlalchemy.orm import contains_eager, joinedload
+from models import Customer, Location, Order, Product
+from search import search_bp
+from auth.utils import login_required
+from utils.db_routing import read_replica
+from utils.pagination import offset_paginate
+from utils.search import SEARCHABLE, apply_search
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 50
+
+def _scoped_query(entity):
+    """The rows of entity the current user may see, as on the list pages"""
+    role = session.get('role')
+    agency_id = session.get('agency_id')
+    if entity == 'customers':
+        query = Customer.query.join(Location).options(contains_eager(Customer.location))
+        return query if role == 'super_admin' else query.filter(Location.agency_id == agency_id)
+    if entity == 'products':
+        query = Product.query
+        return query if role == 'super_admin' else query.filter(Product.agency_id == agency_id)
+    query = Order.query.options(joinedload(Order.customer))
+    if role == 'super_admin':
+        return query
+    if role == 'salesperson':
+        return query.filter(Order.salesperson_id == session.get('user_id'))
+    return query.filter(Order.agency_id == agency_id)
+
+def _payload(entity, row):
+    if entity == 'customers':
+        return {
+            'id': row.id,
+            'name': row.name,
+            'email': row.email,
+            'phone': row.phone,
+            'location_name': row.location.name,
+            'is_active': row.is_active,
+            'url': url_for('customer.edit_customer', customer_id=row.id)
+        }
+    if entity == 'products':
+        return {
+            'id': row.id,
+            'name': row.name,
+            'sku': row.sku,
+            'category': row.category,
+            'price': str(row.price),
+            'stock_quantity': row.stock_quantity,
+            'is_active': row.is_active,
+            'url': url_for('product.edit_product', product_id=row.id)
+        }
+    return {
+        'id': row.id,
+        'order_number': row.order_number,
+        'customer_name': row.customer.name,
+        'status': row.status,
+        'total_amount': str(row.total_amount),
+        'created_at': row.created_at.isoformat() if row.created_at else None,
+        'url': url_for('order.view_order', order_id=row.id)
+    }
+
+@search_bp.route('/<entity>')
+@login_required
+@read_replica
+def search(entity):
+    """Ranked, paginated matches for ?q= among the customers, products or orders the user can see"""
+    if entity not in SEARCHABLE:
+        return jsonify({'error': f"Unknown search '{entity}'"}), 404
+    term = request.args.get('q', '').strip()
+    number = request.args.get('page', 1, type=int)
+    per_page = max(1, min(request.args.get('per_page', DEFAULT_PER_PAGE, type=int), MAX_PER_PAGE))
+    if not term:
+        return jsonify({'query': term, 'page': 1, 'per_page': per_page, 'has_next': False, 'results': []})
+
+    page = offset_paginate(apply_search(_scoped_query(entity), entity, term), number, per_page)
+    return jsonify({
+        'query': term,
+        'page': page.number,
+        'per_page': per_page,
+        'has_next': page.has_next,
+        'results': [_payload(entity, row) for row in page.items]
+    })
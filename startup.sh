@@ -8,13 +8,8 @@ export PORT=${PORT:-5000}
 # Install openpyxl if needed (for Excel functionality)
 pip install --no-cache-dir openpyxl==3.1.5 || echo "Warning: Excel functionality may not work without openpyxl"
 
-# Create database tables if they don't exist
-python -c "
-from app import app, db
-with app.app_context():
-    db.create_all()
-    print('Database tables created successfully')
-"
+# Create missing tables and default accounts once, so workers start without touching the database
+flask --app main init-db
 
 # Start the application with gunicorn
 exec gunicorn --config gunicorn.conf.py main:app
\ No newline at end of file
@@ -26,6 +26,12 @@ document.addEventListener('DOMContentLoaded', function() {
     // Setup table enhancements
     setupTableEnhancements();
     
+    // Setup on-demand option loading for large dropdowns
+    setupRemoteSelects();
+    
+    // Setup background export links
+    setupBackgroundExports();
+    
     // Setup notification handling
     setupNotifications();
     
@@ -303,22 +309,24 @@ function setupOrderFormEnhancements() {
 }
 
 /**
- * Setup product search functionality
+ * Default the quantity to 1 when a product is picked
  */
 function setupProductSearch() {
-    const productSelects = document.querySelectorAll('select[name="products"]');
-    productSelects.forEach(function(select) {
-        // Add search functionality to product selects
-        select.addEventListener('change', function() {
-            const selectedOption = select.options[select.selectedIndex];
-            if (selectedOption && selectedOption.dataset.price) {
-                const quantityInput = select.closest('.order-item').querySelector('input[name="quantities"]');
-                if (quantityInput && !quantityInput.value) {
-                    quantityInput.value = 1;
-                    quantityInput.focus();
-                }
+    const orderForm = document.getElementById('orderForm');
+    
+    // Delegated so that rows added to the form get it too
+    orderForm.addEventListener('change', function(e) {
+        const select = e.target.closest('select[name="products"]');
+        if (!select) return;
+        
+        const selectedOption = select.options[select.selectedIndex];
+        if (selectedOption && selectedOption.dataset.price) {
+            const quantityInput = select.closest('.order-item').querySelector('input[name="quantities"]');
+            if (quantityInput && !quantityInput.value) {
+                quantityInput.value = 1;
+                quantityInput.focus();
             }
-        });
+        }
     });
 }
 
@@ -493,46 +501,64 @@ function getColumnIndex(table, column) {
 
 /**
  * Setup table search functionality
+ *
+ * Search inputs sit in a list page's GET filter form. Typing re-requests the
+ * page from the server with the form's filters and ?q=, and swaps in the
+ * element named by data-results, so matching happens against the search
+ * index rather than the rows that happen to be on the page.
  */
 function setupTableSearch() {
     const searchInputs = document.querySelectorAll('.table-search');
     searchInputs.forEach(function(input) {
-        const targetTable = document.querySelector(input.dataset.target);
-        if (targetTable) {
-            input.addEventListener('input', window.debounce(function() {
-                filterTable(targetTable, input.value);
-            }, 300));
-        }
+        const form = input.closest('form');
+        const results = document.querySelector(input.dataset.results);
+        if (!form || !results) return;
+
+        let lastTerm = input.value.trim();
+        let pending = null;
+        input.addEventListener('input', window.debounce(function() {
+            const term = input.value.trim();
+            // One- and two-letter terms match too much to be worth a request each
+            if (term === lastTerm || (term.length > 0 && term.length < 2)) return;
+            lastTerm = term;
+            if (pending) pending.abort();
+            pending = new AbortController();
+            refreshSearchResults(form, results, pending.signal);
+        }, 300));
     });
 }
 
 /**
- * Filter table rows based on search term
+ * Reload the current list page with the form's filters and replace the results
  */
-function filterTable(table, searchTerm) {
-    const rows = table.querySelectorAll('tbody tr');
-    const term = searchTerm.toLowerCase();
-    
-    rows.forEach(function(row) {
-        const text = row.textContent.toLowerCase();
-        const shouldShow = !term || text.includes(term);
-        row.style.display = shouldShow ? '' : 'none';
+function refreshSearchResults(form, results, signal) {
+    const params = new URLSearchParams();
+    new FormData(form).forEach(function(value, key) {
+        if (value) params.append(key, value);
     });
-    
-    // Show no results message if needed
-    const visibleRows = table.querySelectorAll('tbody tr:not([style*="display: none"])');
-    const noResultsRow = table.querySelector('.no-results');
-    
-    if (visibleRows.length === 0 && term && !noResultsRow) {
-        const tbody = table.querySelector('tbody');
-        const colCount = table.querySelectorAll('thead th').length;
-        const noResultsRow = document.createElement('tr');
-        noResultsRow.className = 'no-results';
-        noResultsRow.innerHTML = `<td colspan="${colCount}" class="text-center text-muted py-4">No results found for "${searchTerm}"</td>`;
-        tbody.appendChild(noResultsRow);
-    } else if (visibleRows.length > 0 && noResultsRow) {
-        noResultsRow.remove();
-    }
+    const url = (form.getAttribute('action') || window.location.pathname) + (params.toString() ? '?' + params : '');
+
+    results.classList.add('opacity-50');
+    fetch(url, { headers: { 'Accept': 'text/html' }, signal: signal })
+        .then(function(response) {
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            return response.text();
+        })
+        .then(function(html) {
+            const page = new DOMParser().parseFromString(html, 'text/html');
+            const fresh = page.getElementById(results.id);
+            if (!fresh) throw new Error('Results not found in response');
+            results.innerHTML = fresh.innerHTML;
+            window.history.replaceState(null, '', url);
+        })
+        .catch(function(error) {
+            if (error.name === 'AbortError') return;
+            // Fall back to a normal page load
+            window.location.href = url;
+        })
+        .finally(function() {
+            results.classList.remove('opacity-50');
+        });
 }
 
 /**
@@ -603,6 +629,125 @@ function updateBulkActions(table) {
     });
 }
 
+/**
+ * Run exports marked with data-background-export as background jobs,
+ * polling their status and downloading the file once it is ready
+ */
+function setupBackgroundExports() {
+    document.querySelectorAll('a[data-background-export]').forEach(function(link) {
+        link.addEventListener('click', function(event) {
+            event.preventDefault();
+            if (link.classList.contains('disabled')) return;
+            
+            const label = link.innerHTML;
+            link.classList.add('disabled');
+            const finish = function() {
+                link.classList.remove('disabled');
+                link.innerHTML = label;
+            };
+            
+            const url = new URL(link.href, window.location.origin);
+            url.searchParams.set('background', '1');
+            
+            const poll = function(statusUrl) {
+                fetch(statusUrl, { headers: { 'Accept': 'application/json' } })
+                    .then(function(response) { return response.json(); })
+                    .then(function(job) {
+                        if (job.status === 'finished') {
+                            finish();
+                            window.location = job.download_url;
+                        } else if (job.status === 'failed' || job.error) {
+                            finish();
+                            showNotification(job.error || 'Export failed', 'error');
+                        } else {
+                            const progress = job.total ? `${Math.floor(job.done * 100 / job.total)}%` : `${job.done} rows`;
+                            link.innerHTML = `<i class="fas fa-spinner fa-spin me-1"></i>Preparing export (${progress})`;
+                            setTimeout(function() { poll(statusUrl); }, 1000);
+                        }
+                    })
+                    .catch(function() {
+                        finish();
+                        showNotification('Could not check the export status', 'error');
+                    });
+            };
+            
+            link.innerHTML = '<i class="fas fa-spinner fa-spin me-1"></i>Preparing export';
+            fetch(url, { headers: { 'Accept': 'application/json' } })
+                .then(function(response) { return response.json(); })
+                .then(function(job) { poll(job.status_url); })
+                .catch(function() {
+                    finish();
+                    showNotification('Could not start the export', 'error');
+                });
+        });
+    });
+}
+
+/**
+ * Setup selects whose options are fetched from a JSON search endpoint
+ * (select[data-remote-options="<url>"]) instead of being rendered up front
+ */
+function setupRemoteSelects() {
+    const selects = document.querySelectorAll('select[data-remote-options]');
+    selects.forEach(setupRemoteSelect);
+}
+
+/**
+ * Add a search box to one remote select; also used for rows added to a form later
+ */
+function setupRemoteSelect(select) {
+    const searchInput = document.createElement('input');
+    searchInput.type = 'search';
+    searchInput.className = 'form-control form-control-sm mb-1';
+    searchInput.placeholder = 'Type to search...';
+    select.parentNode.insertBefore(searchInput, select);
+    
+    // Keep the placeholder option and the current selection
+    const placeholder = select.querySelector('option[value=""]');
+    
+    const loadOptions = window.debounce(function() {
+        const url = new URL(select.dataset.remoteOptions, window.location.origin);
+        url.searchParams.set('q', searchInput.value.trim());
+        
+        fetch(url, { headers: { 'Accept': 'application/json' } })
+            .then(function(response) { return response.json(); })
+            .then(function(items) {
+                const selected = select.value;
+                const selectedOption = selected ? select.querySelector(`option[value="${selected}"]`) : null;
+                
+                select.innerHTML = '';
+                if (placeholder) select.appendChild(placeholder);
+                if (selectedOption && !items.some(function(item) { return String(item.id) === selected; })) {
+                    select.appendChild(selectedOption);
+                }
+                
+                items.forEach(function(item) {
+                    const option = document.createElement('option');
+                    option.value = item.id;
+                    if (item.price !== undefined) {
+                        // Products carry their price for the order total
+                        option.dataset.price = item.price;
+                        option.textContent = `${item.name} - ${window.formatCurrency(item.price)} (Stock: ${item.stock_quantity})`;
+                    } else {
+                        option.textContent = item.location_name ? `${item.name} - ${item.location_name}` : item.name;
+                    }
+                    select.appendChild(option);
+                });
+                select.value = selected;
+            });
+    }, 300);
+    
+    searchInput.addEventListener('input', loadOptions);
+    select.addEventListener('focus', function() {
+        if (!select.dataset.remoteLoaded) {
+            select.dataset.remoteLoaded = 'true';
+            loadOptions();
+        }
+    });
+}
+
+window.setupRemoteSelect = setupRemoteSelect;
+
 /**
  * Setup notification handling
  */
@@ -1,5 +1,6 @@
 from flask import render_template, request, redirect, url_for, flash, session, make_response
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 import csv, io
 from app import db
@@ -7,55 +8,33 @@ from models import Agency, User, Order, Product, Customer, ActivityLog, Location
 from super_admin import super_admin_bp
 from auth.utils import login_required, role_required
 from utils.decorators import log_activity
+from utils.dashboard_stats import get_dashboard_snapshot
+from utils.reports import agency_performance as get_agency_performance
+from super_admin.services import import_user_rows
+from utils.export_jobs import register_export, export_response, csv_output, iter_with_progress
+from utils.bulk_import import error_report_url
+from utils.db_routing import read_replica
 
 @super_admin_bp.route('/dashboard')
 @login_required
 @role_required('super_admin')
+@read_replica
 def dashboard():
-    # Get statistics
-    stats = {
-        'total_agencies': Agency.query.count(),
-        'active_agencies': Agency.query.filter_by(is_active=True).count(),
-        'total_users': User.query.count(),
-        'active_users': User.query.filter_by(is_active=True).count(),
-        'total_orders': Order.query.count(),
-        'pending_orders': Order.query.filter_by(status='pending').count(),
-        'total_products': Product.query.count(),
-        'total_customers': Customer.query.count()
-    }
-    
-    # Recent activities removed as not required
-    
-    # Get order statistics by status
-    order_stats = db.session.query(
-        Order.status,
-        func.count(Order.id).label('count')
-    ).group_by(Order.status).all()
-    
-    # Get monthly order trends (last 6 months)
-    six_months_ago = datetime.utcnow() - timedelta(days=180)
-    monthly_orders = db.session.query(
-        func.date_trunc('month', Order.created_at).label('month'),
-        func.count(Order.id).label('count')
-    ).filter(Order.created_at >= six_months_ago).group_by(func.date_trunc('month', Order.created_at)).all()
-    
-    # Get top agencies by orders
-    top_agencies = db.session.query(
-        Agency.name,
-        func.count(Order.id).label('order_count')
-    ).join(Order).group_by(Agency.id).order_by(func.count(Order.id).desc()).limit(5).all()
+    # Get statistics (one aggregate query, cached briefly and shared with the API)
+    snapshot = get_dashboard_snapshot('super_admin', include_charts=True)
     
     return render_template('super_admin/dashboard.html',
-                         stats=stats,
-                         order_stats=order_stats,
-                         monthly_orders=monthly_orders,
-                         top_agencies=top_agencies)
+                         stats=snapshot['stats'],
+                         order_stats=snapshot['order_stats'],
+                         monthly_orders=snapshot['monthly_orders'],
+                         top_agencies=snapshot['top_agencies'])
 
 @super_admin_bp.route('/users')
 @login_required
 @role_required('super_admin')
+@read_replica
 def manage_users():
-    users = User.query.all()
+    users = User.query.options(joinedload(User.agency)).all()
     return render_template('super_admin/users.html', users=users)
 
 @super_admin_bp.route('/users/<int:user_id>/toggle_status', methods=['POST'])
@@ -81,9 +60,10 @@ def toggle_user_status(user_id):
 @super_admin_bp.route('/activities')
 @login_required
 @role_required('super_admin')
+@read_replica
 def view_activities():
     page = request.args.get('page', 1, type=int)
-    activities = ActivityLog.query.order_by(ActivityLog.created_at.desc()).paginate(
+    activities = ActivityLog.query.options(joinedload(ActivityLog.user)).order_by(ActivityLog.created_at.desc()).paginate(
         page=page, per_page=50, error_out=False
     )
     return render_template('super_admin/activities.html', activities=activities)
@@ -103,18 +83,12 @@ def system_config():
 @super_admin_bp.route('/reports')
 @login_required
 @role_required('super_admin')
+@read_replica
 def reports():
     # Generate various reports
     
     # Agency performance report
-    agency_performance = db.session.query(
-        Agency.name,
-        Agency.code,
-        func.count(Order.id).label('total_orders'),
-        func.sum(Order.total_amount).label('total_revenue'),
-        func.count(Product.id).label('total_products'),
-        func.count(Customer.id).label('total_customers')
-    ).outerjoin(Order).outerjoin(Product).outerjoin(Location).outerjoin(Customer).group_by(Agency.id).all()
+    agency_performance = get_agency_performance()
     
     # User activity report
     user_activity = db.session.query(
@@ -261,38 +235,35 @@ def download_user_template():
 @role_required('super_admin')
 def export_users():
     """Export existing users to CSV"""
-    users = User.query.join(Agency).all()
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow(['username', 'email', 'first_name', 'last_name', 'role', 'agency_code', 'is_active', 'created_at', 'last_login'])
-    
-    # Write data
-    for user in users:
-        writer.writerow([
-            user.username,
-            user.email,
-            user.first_name or '',
-            user.last_name or '',
-            user.role,
-            user.agency.code if user.agency else '',
-            'Yes' if user.is_active else 'No',
-            user.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else ''
-        ])
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=users_export.csv'
-    response.headers['Content-Type'] = 'text/csv'
+    return export_response('users')
+
+@register_export('users', 'users_export.csv', 'text/csv')
+def write_users_csv(output, scope, progress):
+    query = User.query.join(Agency).options(joinedload(User.agency))
+    total = query.count()
     
-    return response
+    with csv_output(output) as writer:
+        # Write header
+        writer.writerow(['username', 'email', 'first_name', 'last_name', 'role', 'agency_code', 'is_active', 'created_at', 'last_login'])
+        
+        # Write data
+        for user in iter_with_progress(query.order_by(User.id).yield_per(1000), progress, total):
+            writer.writerow([
+                user.username,
+                user.email,
+                user.first_name or '',
+                user.last_name or '',
+                user.role,
+                user.agency.code if user.agency else '',
+                'Yes' if user.is_active else 'No',
+                user.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+                user.last_login.strftime('%Y-%m-%d %H:%M:%S') if user.last_login else ''
+            ])
 
 @super_admin_bp.route('/users/import', methods=['GET', 'POST'])
 @login_required
 @role_required('super_admin')
-@log_activity('import_users')
+@log_activity('import_users', dry_run_action='validate_users_import')
 def import_users():
     """Import users from CSV file"""
     if request.method == 'POST':
@@ -310,85 +281,25 @@ def import_users():
             return redirect(url_for('super_admin.import_users'))
         
         try:
-            # Read CSV file
+            # Read CSV file once; lookups, hashing and inserts are batched
             stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            csv_input = csv.DictReader(stream)
-            
-            success_count = 0
-            error_count = 0
-            errors = []
+            rows = list(csv.DictReader(stream))
             
-            valid_roles = ['super_admin', 'agency_admin', 'staff', 'salesperson']
-            
-            for row_num, row in enumerate(csv_input, start=2):  # Start from 2 to account for header
-                try:
-                    # Validate required fields
-                    required_fields = ['username', 'email', 'role', 'agency_code', 'password']
-                    missing_fields = [field for field in required_fields if not row.get(field, '').strip()]
-                    
-                    if missing_fields:
-                        errors.append(f"Row {row_num}: Missing required fields: {', '.join(missing_fields)}")
-                        error_count += 1
-                        continue
-                    
-                    # Validate role
-                    role = row['role'].strip()
-                    if role not in valid_roles:
-                        errors.append(f"Row {row_num}: Invalid role '{role}'. Must be one of: {', '.join(valid_roles)}")
-                        error_count += 1
-                        continue
-                    
-                    # Find agency by code
-                    agency_code = row['agency_code'].strip()
-                    agency = Agency.query.filter_by(code=agency_code, is_active=True).first()
-                    if not agency:
-                        errors.append(f"Row {row_num}: Agency with code '{agency_code}' not found or inactive")
-                        error_count += 1
-                        continue
-                    
-                    # Check for existing username
-                    existing_user = User.query.filter_by(username=row['username'].strip()).first()
-                    if existing_user:
-                        errors.append(f"Row {row_num}: Username '{row['username'].strip()}' already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Check for existing email
-                    existing_email = User.query.filter_by(email=row['email'].strip()).first()
-                    if existing_email:
-                        errors.append(f"Row {row_num}: Email '{row['email'].strip()}' already exists")
-                        error_count += 1
-                        continue
-                    
-                    # Validate password length
-                    password = row['password'].strip()
-                    if len(password) < 6:
-                        errors.append(f"Row {row_num}: Password must be at least 6 characters long")
-                        error_count += 1
-                        continue
-                    
-                    # Create new user
-                    user = User(
-                        username=row['username'].strip(),
-                        email=row['email'].strip(),
-                        first_name=row.get('first_name', '').strip(),
-                        last_name=row.get('last_name', '').strip(),
-                        role=role,
-                        agency_id=agency.id,
-                        is_active=True
-                    )
-                    user.set_password(password)
-                    
-                    db.session.add(user)
-                    success_count += 1
-                    
-                except Exception as e:
-                    errors.append(f"Row {row_num}: {str(e)}")
-                    error_count += 1
+            # A dry run validates every row and offers the rejected ones as a CSV
+            dry_run = bool(request.form.get('dry_run'))
+            result = import_user_rows(rows, dry_run=dry_run)
+            if dry_run:
+                return render_template('super_admin/import_users.html', validation=result,
+                                       error_report_url=error_report_url(result, 'user_import_errors.csv'))
+
+            success_count = result['success_count']
+            error_count = result['error_count']
+            errors = result['errors']
             
             if success_count > 0:
-                db.session.commit()
-                flash(f'Successfully imported {success_count} users', 'success')
+                flash(f'Successfully imported {success_count} users in {result["seconds"]:.1f}s '
+                      f'({result["rows_per_second"]:.0f} rows/second; passwords hashed in '
+                      f'{result["hash_seconds"]:.1f}s on {result["hash_workers"]} processes)', 'success')
             
             if error_count > 0:
                 flash(f'{error_count} errors occurred during import', 'warning')
@@ -0,0 +1,178 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from flask import current_app
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Agency
+from utils.bulk_import import IMPORT_CHUNK_SIZE, ImportErrors, chunked
+from utils.bulk_load import get_bulk_loader
+from utils.filter_options import invalidate_filter_options
+
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VALID_ROLES = ['super_admin', 'agency_admin', 'staff', 'salesperson']
+REQUIRED_FIELDS = ['username', 'email', 'role', 'agency_code', 'password']
+
+def available_cores():
+    """CPUs this process may run on, which can be fewer than os.cpu_count() in a container"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def hash_passwords(passwords, workers=None):
+    """Hash passwords with werkzeug's default method, spread across processes.
+
+    Hashing is deliberately CPU-bound, so threads would not help. Small
+    batches are hashed inline because starting the processes costs more
+    than it saves. Returns (hashes in input order, number of processes used).
+    """
+    workers = workers or current_app.config.get('USER_IMPORT_HASH_WORKERS') or available_cores()
+    workers = max(1, min(workers, len(passwords) // 16))
+    if workers == 1:
+        return [generate_password_hash(password) for password in passwords], 1
+
+    # Each slice goes to a fresh interpreter running utils/password_hashing.py.
+    # A multiprocessing pool would fork this worker mid-request, with gunicorn's
+    # threads (or gevent's hub), the activity log writer and the export pool
+    # running, and a child can inherit a lock one of them held and hang; its
+    # spawn and forkserver modes re-import __main__, which may create the app.
+    size = -(-len(passwords) // workers)
+    slices = [passwords[i:i + size] for i in range(0, len(passwords), size)]
+    children = [subprocess.Popen([sys.executable, '-m', 'utils.password_hashing'], cwd=PROJECT_ROOT,
+                                 stdin=subprocess.PIPE, stdout=subprocess.PIPE) for _ in slices]
+    try:
+        # The children read all of their input before writing any output
+        for child, batch in zip(children, slices):
+            child.stdin.write(json.dumps(batch).encode())
+            child.stdin.close()
+        hashes = []
+        for child in children:
+            output = child.stdout.read()
+            if child.wait() != 0:
+                raise RuntimeError(f'password hashing process exited with {child.returncode}')
+            hashes.extend(json.loads(output))
+    except (OSError, ValueError, RuntimeError):
+        logger.exception('Hashing in child processes failed; hashing inline')
+        for child in children:
+            child.kill()
+            child.wait()
+        return [generate_password_hash(password) for password in passwords], 1
+    return hashes, len(children)
+
+def _prefetch_lookups(rows):
+    """Active agencies by code plus the usernames and emails already taken"""
+    codes = {(row.get('agency_code') or '').strip() for row in rows} - {''}
+    usernames = {(row.get('username') or '').strip() for row in rows} - {''}
+    emails = {(row.get('email') or '').strip() for row in rows} - {''}
+
+    agencies = {}
+    for chunk in chunked(codes):
+        for agency_id, code in db.session.query(Agency.id, Agency.code).filter(
+                Agency.code.in_(chunk), Agency.is_active == True):
+            agencies[code] = agency_id
+
+    taken_usernames = set()
+    for chunk in chunked(usernames):
+        taken_usernames.update(username for (username,) in
+                               db.session.query(User.username).filter(User.username.in_(chunk)))
+    taken_emails = set()
+    for chunk in chunked(emails):
+        taken_emails.update(email for (email,) in
+                            db.session.query(User.email).filter(User.email.in_(chunk)))
+    return agencies, taken_usernames, taken_emails
+
+def import_user_rows(rows, dry_run=False):
+    """Validate CSV user rows in memory, hash passwords in parallel and bulk insert.
+
+    With dry_run nothing is hashed or written. Returns a dict with
+    success_count, error_count, errors (one message per rejected row),
+    error_report (an ImportErrors), dry_run, seconds, rows_per_second,
+    hash_seconds and hash_workers.
+    """
+    started = time.perf_counter()
+    agencies, taken_usernames, taken_emails = _prefetch_lookups(rows)
+
+    # Rejected rows go into a downloadable report, which must not hold their passwords
+    errors = ImportErrors(exclude=['password'])
+    pending = []
+    passwords = []
+    for row_num, row in enumerate(rows, start=2):  # Start from 2 to account for header
+        # Validate required fields
+        values = {field: (row.get(field) or '').strip() for field in REQUIRED_FIELDS}
+        missing_fields = [field for field in REQUIRED_FIELDS if not values[field]]
+        if missing_fields:
+            errors.add(row_num, f"Missing required fields: {', '.join(missing_fields)}", row)
+            continue
+
+        # Validate role
+        role = values['role']
+        if role not in VALID_ROLES:
+            errors.add(row_num, f"Invalid role '{role}'. Must be one of: {', '.join(VALID_ROLES)}", row)
+            continue
+
+        agency_id = agencies.get(values['agency_code'])
+        if not agency_id:
+            errors.add(row_num, f"Agency with code '{values['agency_code']}' not found or inactive", row)
+            continue
+
+        # Earlier rows of the same file count as existing users too
+        if values['username'] in taken_usernames:
+            errors.add(row_num, f"Username '{values['username']}' already exists", row)
+            continue
+        if values['email'] in taken_emails:
+            errors.add(row_num, f"Email '{values['email']}' already exists", row)
+            continue
+
+        # Validate password length
+        if len(values['password']) < 6:
+            errors.add(row_num, f"Password must be at least 6 characters long", row)
+            continue
+
+        taken_usernames.add(values['username'])
+        taken_emails.add(values['email'])
+        passwords.append(values['password'])
+        pending.append({
+            'username': values['username'],
+            'email': values['email'],
+            'first_name': (row.get('first_name') or '').strip(),
+            'last_name': (row.get('last_name') or '').strip(),
+            'role': role,
+            'agency_id': agency_id,
+            'is_active': True
+        })
+
+    hash_seconds, hash_workers = 0.0, 0
+    if not dry_run:
+        hash_started = time.perf_counter()
+        hashes, hash_workers = hash_passwords(passwords) if passwords else ([], 0)
+        hash_seconds = time.perf_counter() - hash_started
+        for user, password_hash in zip(pending, hashes):
+            user['password_hash'] = password_hash
+
+        loader = get_bulk_loader(User)
+        for chunk in chunked(pending, IMPORT_CHUNK_SIZE):
+            loader.insert(chunk)
+            db.session.commit()
+
+        # Bulk inserts skip the flush listener that keeps the salesperson filter lists fresh
+        for agency_id in {user['agency_id'] for user in pending}:
+            invalidate_filter_options('salespersons', agency_id)
+
+    seconds = time.perf_counter() - started
+    return {
+        'success_count': len(pending),
+        'error_count': len(errors),
+        'errors': errors.messages(),
+        'error_report': errors,
+        'dry_run': dry_run,
+        'seconds': seconds,
+        'rows_per_second': len(rows) / seconds if seconds > 0 else 0,
+        'hash_seconds': hash_seconds,
+        'hash_workers': hash_workers
+    }
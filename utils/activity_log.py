@@ -0,0 +1,132 @@
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from app import db
+from models import ActivityLog
+
+logger = logging.getLogger(__name__)
+
+class ActivityLogWriter:
+    """Buffers ActivityLog rows in a bounded queue and bulk-inserts them from a background thread.
+
+    Rows are written when batch_size rows are waiting or flush_interval seconds
+    have passed, whichever comes first. When the queue is full new rows are
+    dropped and counted rather than blocking the request.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.dropped = 0
+        self.written = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('ACTIVITY_LOG_ASYNC', True)
+        self.batch_size = app.config.setdefault('ACTIVITY_LOG_BATCH_SIZE', 200)
+        self.flush_interval = app.config.setdefault('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0)
+        self._queue = queue.Queue(maxsize=app.config.setdefault('ACTIVITY_LOG_QUEUE_SIZE', 10000))
+        app.extensions['activity_log_writer'] = self
+        atexit.register(self.shutdown)
+
+    def log(self, user_id, action, description=None, ip_address=None, user_agent=None):
+        """Record an activity; returns immediately unless async writing is disabled"""
+        row = {
+            'user_id': user_id,
+            'action': action,
+            'description': description,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'created_at': datetime.utcnow()
+        }
+        if not self.enabled:
+            self._write([row])
+            return
+
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+                dropped = self.dropped
+            if dropped == 1 or dropped % 1000 == 0:
+                logger.warning('Activity log queue full, %d records dropped so far', dropped)
+
+    def flush(self):
+        """Write everything currently queued from the calling thread"""
+        while True:
+            batch = []
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if not batch:
+                return
+            self._write(batch)
+
+    def shutdown(self, timeout=5.0):
+        """Stop the background thread and flush whatever is left"""
+        self._stop.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        if self.app is not None:
+            self.flush()
+
+    def _ensure_started(self):
+        # The worker thread does not survive a fork (gunicorn preload_app), so
+        # it is started lazily in whichever process first logs something.
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            batch = self._collect_batch()
+            if batch:
+                self._write(batch)
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, rows):
+        try:
+            with self.app.app_context():
+                with db.engine.begin() as connection:
+                    connection.execute(insert(ActivityLog.__table__), rows)
+            with self._lock:
+                self.written += len(rows)
+        except Exception:
+            # Logging must never take down a request or the writer thread
+            logger.exception('Failed to write %d activity log records', len(rows))
+            with self._lock:
+                self.dropped += len(rows)
+
+activity_log_writer = ActivityLogWriter()
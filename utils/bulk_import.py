@@ -0,0 +1,54 @@
+from flask import session, url_for
+from utils.export_jobs import csv_output, export_job_runner
+
+IMPORT_CHUNK_SIZE = 1000
+
+def chunked(values, size=IMPORT_CHUNK_SIZE):
+    """Split values into lists of at most size items, e.g. to keep IN lists and executemany batches bounded"""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+# Columns never kept for the error report, whatever the importer: the report is
+# stored in the export spool and stays downloadable for EXPORT_JOB_TTL
+SENSITIVE_FIELDS = {'password', 'password_hash'}
+
+class ImportErrors:
+    """Row-level import errors: row number, message and the values of the rejected row.
+
+    Columns named in exclude, and credential columns (SENSITIVE_FIELDS),
+    are dropped from the stored row, matched case-insensitively.
+    """
+
+    def __init__(self, exclude=()):
+        self.rows = []
+        self.exclude = SENSITIVE_FIELDS | {field.lower() for field in exclude}
+
+    def add(self, row_num, message, row=None):
+        row = {field: value for field, value in (row or {}).items()
+               if (field or '').strip().lower() not in self.exclude}
+        self.rows.append((row_num, message, row))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def messages(self):
+        return [f"Row {row_num}: {message}" for row_num, message, _ in self.rows]
+
+    def write_csv(self, output):
+        """Write row, error and the original columns of every rejected row as CSV to a binary file"""
+        fields = []
+        for _, _, row in self.rows:
+            fields.extend(field for field in row if field not in fields)
+        with csv_output(output) as writer:
+            writer.writerow(['row', 'error'] + fields)
+            for row_num, message, row in self.rows:
+                writer.writerow([row_num, message] + ['' if row.get(field) is None else row.get(field) for field in fields])
+
+def error_report_url(result, filename):
+    """Store result['error_report'] as a CSV download for the current user and return its URL"""
+    if not result['error_count']:
+        return None
+    job = export_job_runner.store('import_errors', session.get('user_id'), filename,
+                                  'text/csv', result['error_report'].write_csv)
+    return url_for('exports.download', job_id=job['id'])
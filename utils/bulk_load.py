@@ -0,0 +1,161 @@
+import io
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import bindparam, insert, select, update
+from app import db
+
+class ExecutemanyLoader:
+    """Writes validated import rows with executemany batches; works on every dialect.
+
+    rows are lists of dicts with the same keys, one per table row. The
+    loader writes inside the session's current transaction and leaves
+    committing to the caller.
+    """
+    name = 'executemany'
+
+    def __init__(self, model):
+        self.model = model
+        self.table = model.__table__
+
+    def insert(self, rows):
+        """Insert rows, returning how many were written"""
+        if rows:
+            db.session.execute(insert(self.model), rows)
+        return len(rows)
+
+    def upsert(self, rows, key, update_columns):
+        """Insert rows, or update update_columns of the row with the same unique key"""
+        if not rows:
+            return 0
+        dialect = db.session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert as dialect_insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert as dialect_insert
+            stmt = dialect_insert(self.model)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[self.table.c[key]],
+                set_={column: stmt.excluded[column] for column in update_columns}
+            )
+            db.session.execute(stmt, rows)
+            return len(rows)
+
+        # No ON CONFLICT: split on the keys that already exist
+        key_column = self.table.c[key]
+        existing = set(db.session.execute(
+            select(key_column).where(key_column.in_([row[key] for row in rows]))
+        ).scalars())
+        self.insert([row for row in rows if row[key] not in existing])
+        updates = [dict({column: row[column] for column in update_columns}, _key=row[key])
+                   for row in rows if row[key] in existing]
+        if updates:
+            db.session.execute(
+                update(self.table).where(key_column == bindparam('_key')).values(
+                    {column: bindparam(column) for column in update_columns}),
+                updates
+            )
+        return len(rows)
+
+class PostgresCopyLoader(ExecutemanyLoader):
+    """Streams rows with COPY FROM STDIN over the session's psycopg2 connection.
+
+    Inserts are copied straight into the table. Upserts are copied into a
+    temporary staging table and merged with one INSERT ... SELECT ... ON
+    CONFLICT statement. COPY bypasses SQLAlchemy, so Python-side column
+    defaults (such as created_at) are filled in here.
+    """
+    name = 'copy'
+
+    def insert(self, rows):
+        if not rows:
+            return 0
+        rows, columns = self._complete(rows)
+        self._copy(self.table.name, columns, rows)
+        return len(rows)
+
+    def upsert(self, rows, key, update_columns):
+        if not rows:
+            return 0
+        rows, columns = self._complete(rows)
+        staging = f'_staging_{self.table.name}'
+        column_list = ', '.join(self._quote(column) for column in columns)
+        connection = db.session.connection()
+        connection.exec_driver_sql(
+            f'CREATE TEMP TABLE IF NOT EXISTS {self._quote(staging)} ON COMMIT DROP AS '
+            f'SELECT {column_list} FROM {self._quote(self.table.name)} WITH NO DATA'
+        )
+        connection.exec_driver_sql(f'TRUNCATE {self._quote(staging)}')
+        self._copy(staging, columns, rows)
+        assignments = ', '.join(f'{self._quote(column)} = EXCLUDED.{self._quote(column)}' for column in update_columns)
+        connection.exec_driver_sql(
+            f'INSERT INTO {self._quote(self.table.name)} ({column_list}) '
+            f'SELECT {column_list} FROM {self._quote(staging)} '
+            f'ON CONFLICT ({self._quote(key)}) DO UPDATE SET {assignments}'
+        )
+        return len(rows)
+
+    def _complete(self, rows):
+        """Add Python-side defaults for columns the rows leave out"""
+        defaults = {}
+        for column in self.table.columns:
+            if column.name in rows[0] or column.primary_key or column.default is None:
+                continue
+            if column.default.is_callable or column.default.is_scalar:
+                defaults[column.name] = column.default
+        if not defaults:
+            return rows, list(rows[0])
+
+        completed = []
+        for row in rows:
+            row = dict(row)
+            for name, default in defaults.items():
+                # Callable defaults are wrapped by SQLAlchemy to take an execution context
+                row[name] = default.arg(None) if default.is_callable else default.arg
+            completed.append(row)
+        return completed, list(completed[0])
+
+    def _copy(self, table_name, columns, rows):
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write(','.join(_copy_value(row[column]) for column in columns))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        column_list = ', '.join(self._quote(column) for column in columns)
+        dbapi_connection = db.session.connection().connection.dbapi_connection
+        with dbapi_connection.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY {self._quote(table_name)} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+
+    @staticmethod
+    def _quote(identifier):
+        return '"' + identifier.replace('"', '""') + '"'
+
+def _copy_value(value):
+    # Quoted CSV fields are never read as NULL, so only None is written bare
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    return '"' + str(value).replace('"', '""') + '"'
+
+def get_bulk_loader(model):
+    """The configured loader for model.
+
+    BULK_LOAD_BACKEND is 'auto' (COPY on PostgreSQL with psycopg2,
+    executemany elsewhere), 'copy' or 'executemany'. benchmarks/bulk_load.py
+    checks that both write the same rows; run it against PostgreSQL after
+    changing either loader.
+    """
+    backend = current_app.config.get('BULK_LOAD_BACKEND', 'auto')
+    if backend == 'auto':
+        bind = db.session.get_bind()
+        backend = 'copy' if bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2' else 'executemany'
+    if backend == 'copy':
+        return PostgresCopyLoader(model)
+    return ExecutemanyLoader(model)
@@ -0,0 +1,43 @@
+import threading
+import time
+
+# Simple in-process TTL cache shared by all requests in a worker
+_lock = threading.Lock()
+_store = {}
+
+def cache_get(key):
+    """Return a cached value, or None if it is missing or expired"""
+    with _lock:
+        entry = _store.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del _store[key]
+            return None
+        return value
+
+def cache_set(key, value, ttl=60):
+    """Store a value for ttl seconds"""
+    with _lock:
+        _store[key] = (time.monotonic() + ttl, value)
+    return value
+
+def cache_get_or_set(key, factory, ttl=60):
+    """Return the cached value for key, computing it with factory() on a miss"""
+    value = cache_get(key)
+    if value is None:
+        value = cache_set(key, factory(), ttl)
+    return value
+
+def cache_delete_prefix(prefix):
+    """Drop every entry whose tuple key starts with prefix"""
+    size = len(prefix)
+    with _lock:
+        for key in [k for k in _store if k[:size] == prefix]:
+            del _store[key]
+
+def cache_clear():
+    """Drop every cached entry"""
+    with _lock:
+        _store.clear()
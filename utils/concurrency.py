@@ -0,0 +1,129 @@
+"""Worker, thread and database pool sizing shared by gunicorn.conf.py and the app.
+
+Kept free of Flask imports so the gunicorn config can load it before the
+app. Both sides call concurrency_settings() with the same environment,
+so every worker's connection pool matches the concurrency it was started
+with.
+"""
+import os
+
+PROFILES = ('sync', 'gthread', 'gevent')
+
+# Fewest requests a worker should handle at once before workers are dropped instead
+MIN_IN_FLIGHT = {'sync': 1, 'gthread': 2, 'gevent': 5}
+
+def available_cpus():
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def _env_int(environ, name):
+    value = environ.get(name)
+    return int(value) if value else None
+
+def _connection_budget(max_connections, reserved):
+    """Connections the app may open on one database once the reserved ones are set aside"""
+    max_connections = max_connections or 100
+    return max(1, max_connections - (reserved if reserved is not None else max(2, max_connections // 10)))
+
+def concurrency_settings(environ=None, cpus=None):
+    """Derive the gunicorn worker settings and per-worker SQLAlchemy pool from CPUs and DB limits.
+
+    GUNICORN_PROFILE selects 'sync' (one request per process), 'gthread'
+    (the default: GUNICORN_THREADS threads per process) or 'gevent'
+    (GUNICORN_WORKER_CONNECTIONS greenlets per process). WEB_CONCURRENCY
+    overrides the worker count. DB_MAX_CONNECTIONS is how many connections
+    the app may hold in total (say, Postgres max_connections minus what
+    other clients need); DB_RESERVED_CONNECTIONS of those are left for
+    CLI commands and a deploy's overlapping workers. When the pools would
+    not fit in what remains, workers are dropped first, down to the
+    profile's minimum concurrency per worker, then threads.
+
+    The budget is per database. With a read replica (DATABASE_REPLICA_URL)
+    every worker has a second pool there, sized like the primary's but
+    shrunk to fit DB_REPLICA_MAX_CONNECTIONS less
+    DB_REPLICA_RESERVED_CONNECTIONS; both default to the primary's values.
+
+    Each worker's pool_size covers its concurrent requests; max_overflow
+    covers the background threads that sometimes need a connection too
+    (the activity log writer and EXPORT_JOB_WORKERS export threads).
+
+    Returns a dict with profile, worker_class, workers, threads,
+    worker_connections, pool_size, max_overflow, pool_timeout,
+    db_connections (the most the app can open at once on the primary),
+    replica_pool_size, replica_max_overflow and replica_connections (the
+    same for the replica, if there is one).
+    """
+    environ = os.environ if environ is None else environ
+    cpus = cpus or available_cpus()
+    profile = (environ.get('GUNICORN_PROFILE') or 'gthread').lower()
+    if profile not in PROFILES:
+        raise ValueError(f"GUNICORN_PROFILE must be one of {', '.join(PROFILES)}, not '{profile}'")
+
+    max_connections = _env_int(environ, 'DB_MAX_CONNECTIONS')
+    reserved = _env_int(environ, 'DB_RESERVED_CONNECTIONS')
+    budget = _connection_budget(max_connections, reserved)
+    replica_reserved = _env_int(environ, 'DB_REPLICA_RESERVED_CONNECTIONS')
+    replica_budget = _connection_budget(_env_int(environ, 'DB_REPLICA_MAX_CONNECTIONS') or max_connections,
+                                        reserved if replica_reserved is None else replica_reserved)
+
+    threads = 1
+    worker_connections = 1000
+    if profile == 'sync':
+        workers = _env_int(environ, 'WEB_CONCURRENCY') or 2 * cpus + 1
+        in_flight = 1
+    elif profile == 'gthread':
+        workers = _env_int(environ, 'WEB_CONCURRENCY') or cpus + 1
+        threads = _env_int(environ, 'GUNICORN_THREADS') or 8
+        in_flight = threads
+    else:
+        # One process per CPU is enough: greenlets switch on I/O, not on the GIL
+        workers = _env_int(environ, 'WEB_CONCURRENCY') or cpus
+        worker_connections = _env_int(environ, 'GUNICORN_WORKER_CONNECTIONS') or 200
+        # Most greenlets wait on the client or the network, so the pool
+        # covers a fraction of them; the rest queue for pool_timeout
+        in_flight = max(1, worker_connections // 10)
+
+    background = 1 + (_env_int(environ, 'EXPORT_JOB_WORKERS') or 2)
+    while workers > 1 and workers * (MIN_IN_FLIGHT[profile] + background) > budget:
+        workers -= 1
+    per_worker = max(1, budget // workers)
+    in_flight = max(1, min(in_flight, per_worker - background))
+    if profile == 'gthread':
+        threads = in_flight
+
+    pool_size = in_flight
+    max_overflow = max(0, min(per_worker - pool_size, background))
+
+    # The replica serves the same requests and export threads, so its pool
+    # never needs to be bigger than the primary's, only sometimes smaller
+    replica_per_worker = max(1, replica_budget // workers)
+    replica_pool_size = min(pool_size, replica_per_worker)
+    replica_max_overflow = max(0, min(max_overflow, replica_per_worker - replica_pool_size))
+
+    return {
+        'profile': profile,
+        'worker_class': profile,
+        'workers': workers,
+        'threads': threads,
+        'worker_connections': worker_connections,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': 10,
+        'db_connections': workers * (pool_size + max_overflow),
+        'replica_pool_size': replica_pool_size,
+        'replica_max_overflow': replica_max_overflow,
+        'replica_connections': workers * (replica_pool_size + replica_max_overflow)
+    }
+
+def engine_pool_options(database_uri, environ=None, replica=False):
+    """SQLAlchemy engine options for this process's pool (on the replica with replica), or {} for SQLite (which manages its own)"""
+    if database_uri.startswith('sqlite'):
+        return {}
+    settings = concurrency_settings(environ)
+    prefix = 'replica_' if replica else ''
+    return {
+        'pool_size': settings[f'{prefix}pool_size'],
+        'max_overflow': settings[f'{prefix}max_overflow'],
+        'pool_timeout': settings['pool_timeout']
+    }
@@ -0,0 +1,123 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import func, or_, select, true
+from app import db
+from models import Agency, User, Product, Customer, Location, DailySalesRollup
+from utils.cache import cache_get_or_set
+
+ORDER_STATUSES = ['pending', 'confirmed', 'shipped', 'delivered', 'cancelled']
+
+def _status_counts(condition=None):
+    """Order counts per status from the daily rollup as FILTER aggregates, optionally restricted by condition.
+
+    Orders whose status is not in ORDER_STATUSES are counted in other_orders,
+    so the per-status counts always add up to total_orders.
+    """
+    order_count = DailySalesRollup.order_count
+    columns = [func.coalesce(func.sum(order_count), 0).label('total_orders')]
+    columns += [func.coalesce(func.sum(order_count).filter(DailySalesRollup.status == status), 0).label(f'{status}_orders')
+                for status in ORDER_STATUSES]
+    other = or_(DailySalesRollup.status.is_(None), DailySalesRollup.status.not_in(ORDER_STATUSES))
+    columns.append(func.coalesce(func.sum(order_count).filter(other), 0).label('other_orders'))
+    query = select(*columns)
+    if condition is not None:
+        query = query.where(condition)
+    return query.subquery()
+
+def _single_row(*subqueries):
+    """Select every column of several single-row aggregate subqueries as one row"""
+    from_clause = subqueries[0]
+    for subquery in subqueries[1:]:
+        from_clause = from_clause.join(subquery, true())
+    row = db.session.execute(select(*subqueries).select_from(from_clause)).one()
+    return dict(row._mapping)
+
+def _system_counters():
+    """Every super admin counter in a single statement of single-row aggregates"""
+    agencies = select(
+        func.count(Agency.id).label('total_agencies'),
+        func.count(Agency.id).filter(Agency.is_active == True).label('active_agencies')
+    ).subquery()
+    users = select(
+        func.count(User.id).label('total_users'),
+        func.count(User.id).filter(User.is_active == True).label('active_users')
+    ).subquery()
+    products = select(func.count(Product.id).label('total_products')).subquery()
+    customers = select(func.count(Customer.id).label('total_customers')).subquery()
+    return _single_row(agencies, users, products, customers, _status_counts())
+
+def _agency_counters(agency_id):
+    """Counters for one agency in a single statement"""
+    products = select(func.count(Product.id).label('agency_products')) \
+        .where(Product.agency_id == agency_id).subquery()
+    customers = select(func.count(Customer.id).label('agency_customers')) \
+        .join(Location, Customer.location_id == Location.id) \
+        .where(Location.agency_id == agency_id).subquery()
+    counters = _single_row(products, customers, _status_counts(DailySalesRollup.agency_id == agency_id))
+    counters['agency_orders'] = counters['total_orders']
+    return counters
+
+def _salesperson_counters(user_id):
+    """Counters for one salesperson's own orders"""
+    counters = _single_row(_status_counts(DailySalesRollup.salesperson_id == user_id))
+    counters['my_orders'] = counters['total_orders']
+    return counters
+
+def _order_stats():
+    """(status, count) for every status with orders: ORDER_STATUSES first, then any others by name"""
+    counts = {}
+    for status, count in db.session.query(DailySalesRollup.status, func.sum(DailySalesRollup.order_count)) \
+            .group_by(DailySalesRollup.status):
+        if count:
+            counts[status or 'unknown'] = counts.get(status or 'unknown', 0) + count
+    known = [(status, counts.pop(status)) for status in ORDER_STATUSES if status in counts]
+    return known + sorted(counts.items())
+
+def _system_snapshot():
+    return {
+        'stats': _system_counters(),
+        'order_stats': _order_stats()
+    }
+
+def _system_charts():
+    snapshot = {}
+
+    # Get monthly order trends (last 6 months), bucketed in Python so any dialect works
+    six_months_ago = (datetime.utcnow() - timedelta(days=180)).date()
+    daily = db.session.query(
+        DailySalesRollup.day,
+        func.sum(DailySalesRollup.order_count)
+    ).filter(DailySalesRollup.day >= six_months_ago).group_by(DailySalesRollup.day).all()
+    monthly = {}
+    for day, count in daily:
+        month = day.strftime('%Y-%m')
+        monthly[month] = monthly.get(month, 0) + count
+    snapshot['monthly_orders'] = sorted(monthly.items())
+
+    # Get top agencies by orders
+    order_count = func.sum(DailySalesRollup.order_count)
+    snapshot['top_agencies'] = [tuple(row) for row in db.session.query(
+        Agency.name,
+        order_count.label('order_count')
+    ).join(DailySalesRollup, DailySalesRollup.agency_id == Agency.id)
+     .group_by(Agency.id, Agency.name).order_by(order_count.desc()).limit(5).all()]
+    return snapshot
+
+def get_dashboard_snapshot(role, user_id=None, agency_id=None, include_charts=False):
+    """Cached dashboard statistics for a role/agency scope.
+
+    Returns a dict with a 'stats' mapping of counters. The super admin
+    snapshot also carries order_stats, plus monthly_orders and top_agencies
+    when include_charts is set.
+    """
+    ttl = current_app.config['DASHBOARD_STATS_CACHE_TTL']
+    if role == 'super_admin':
+        snapshot = cache_get_or_set(('dashboard', 'system'), _system_snapshot, ttl)
+        if include_charts:
+            snapshot = dict(snapshot, **cache_get_or_set(('dashboard', 'system', 'charts'), _system_charts, ttl))
+        return snapshot
+    if role == 'salesperson':
+        return cache_get_or_set(('dashboard', 'salesperson', user_id),
+                                lambda: {'stats': _salesperson_counters(user_id)}, ttl)
+    return cache_get_or_set(('dashboard', 'agency', agency_id),
+                            lambda: {'stats': _agency_counters(agency_id)}, ttl)
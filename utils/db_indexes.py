@@ -0,0 +1,70 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import inspect, text
+from app import db
+
+def missing_indexes():
+    """Indexes declared on the models that the connected database does not have yet"""
+    inspector = inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in sorted(table.indexes, key=lambda i: i.name)
+                       if index.name not in present)
+    return missing
+
+def create_missing_indexes(concurrently=False, echo=None):
+    """Create the declared indexes an existing database is missing.
+
+    db.create_all() only builds indexes together with new tables, so
+    databases created before an index was declared need this. With
+    concurrently on PostgreSQL the indexes are built with CREATE INDEX
+    CONCURRENTLY, which does not block writes but cannot run inside a
+    transaction. Returns the names of the indexes created.
+    """
+    created = []
+    use_concurrently = concurrently and db.engine.dialect.name == 'postgresql'
+    for index in missing_indexes():
+        if echo:
+            echo(f'Creating {index.name} on {index.table.name}')
+        if use_concurrently:
+            index.dialect_options['postgresql']['concurrently'] = True
+            with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+                index.create(connection)
+            index.dialect_options['postgresql']['concurrently'] = False
+        else:
+            with db.engine.begin() as connection:
+                index.create(connection)
+        created.append(index.name)
+    return created
+
+def explain(query):
+    """The database's query plan for a SQLAlchemy query or select, as one string"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True})
+    dialect = db.engine.dialect.name
+    prefix = 'EXPLAIN QUERY PLAN ' if dialect == 'sqlite' else 'EXPLAIN '
+    rows = db.session.execute(text(prefix + str(compiled))).fetchall()
+    if dialect == 'sqlite':
+        # (id, parent, notused, detail)
+        return '\n'.join(row[-1] for row in rows)
+    return '\n'.join(str(row[0]) for row in rows)
+
+@click.command('create-indexes')
+@click.option('--concurrently', is_flag=True,
+              help='On PostgreSQL, build indexes without locking the tables against writes.')
+@click.option('--dry-run', is_flag=True, help='Only list the indexes that are missing.')
+@with_appcontext
+def create_indexes_command(concurrently, dry_run):
+    """Create indexes declared in models.py that the database is missing."""
+    if dry_run:
+        missing = missing_indexes()
+        for index in missing:
+            click.echo(f'Missing {index.name} on {index.table.name}')
+        click.echo(f'{len(missing)} indexes missing')
+        return
+    created = create_missing_indexes(concurrently=concurrently, echo=click.echo)
+    click.echo(f'{len(created)} indexes created')
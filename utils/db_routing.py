@@ -0,0 +1,67 @@
+"""Send reads from designated views to a read replica and everything else to the primary.
+
+With DATABASE_REPLICA_URL set the replica is configured as the 'replica'
+bind. Views opt in with @read_replica (export jobs and /api/v1 GETs call
+use_read_replica()); within them, plain SELECTs go to the replica while
+flushes, UPDATE/DELETE statements, SELECT ... FOR UPDATE and raw SQL stay
+on the primary. Once a session has written, its later reads use the
+primary too, and after a commit the user's requests read from the primary
+for DATABASE_REPLICA_STICKY_SECONDS so a redirect to a list page shows
+what was just saved despite replication lag.
+"""
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+
+REPLICA_BIND = 'replica'
+
+class RoutingSession(Session):
+    """db.session class that picks the replica for reads when the current view allows it"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reads_from_replica(clause):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reads_from_replica(self, clause):
+        if not g.get('db_read_replica') or self._flushing or self.info.get('wrote'):
+            return False
+        if clause is None or not getattr(clause, 'is_select', False):
+            return False
+        if getattr(clause, '_for_update_arg', None) is not None:
+            return False
+        return not (has_request_context() and flask_session.get('_db_primary_until', 0) > time.time())
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _after_flush(db_session, flush_context):
+    db_session.info['wrote'] = True
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _after_commit(db_session):
+    # Background threads have no user to pin; they read their own writes through the session
+    if not (db_session.info.get('wrote') and has_request_context()):
+        return
+    if REPLICA_BIND in current_app.config.get('SQLALCHEMY_BINDS', {}):
+        flask_session['_db_primary_until'] = time.time() + current_app.config['DATABASE_REPLICA_STICKY_SECONDS']
+
+def replica_binds(replica_url, engine_options):
+    """SQLALCHEMY_BINDS entry for DATABASE_REPLICA_URL, or {} when there is no replica"""
+    if not replica_url:
+        return {}
+    return {REPLICA_BIND: {'url': replica_url, **engine_options}}
+
+def use_read_replica():
+    """Let the rest of this request (or app context) read from the replica"""
+    g.db_read_replica = True
+
+def read_replica(f):
+    """Decorator for read-only views whose queries may run on the replica"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        use_read_replica()
+        return f(*args, **kwargs)
+    return decorated_function
@@ -0,0 +1,112 @@
+import logging
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy.exc import DBAPIError
+from werkzeug.security import generate_password_hash
+from app import db
+from models import User, Agency, Order, DailySalesRollup
+from utils.sales_rollup import backfill_sales_rollup
+from utils.search import create_search_index
+
+def init_db(demo=True):
+    """Create missing tables and the search index, the default super admin and, with demo, the sample agency and its users.
+
+    Also backfills the daily sales rollup when it is empty but orders exist.
+    Safe to run repeatedly: existing tables and users are left alone.
+    Returns the seconds it took.
+    """
+    started = time.perf_counter()
+    db.create_all()
+    try:
+        create_search_index()
+    except DBAPIError as e:
+        # pg_trgm needs a privileged user to install; search still works, unindexed
+        logging.warning("Search index not created, run `flask create-search-index` as a privileged user: %s", e.orig)
+
+    # Dashboards, reports and API stats read the rollup, so fill it on the first
+    # deploy that has it; afterwards commits keep it current
+    if not DailySalesRollup.query.first() and Order.query.first():
+        rows = backfill_sales_rollup()
+        logging.info("Daily sales rollup backfilled: %d rows", rows)
+
+    # Create default super admin if not exists
+    if not User.query.filter_by(role='super_admin').first():
+        admin = User(
+            username='admin',
+            email='admin@system.com',
+            password_hash=generate_password_hash('admin123'),
+            role='super_admin',
+            is_active=True
+        )
+        db.session.add(admin)
+        db.session.commit()
+        logging.info("Default super admin created: admin/admin123")
+
+    # Create sample agency and users for testing
+    if demo and not Agency.query.first():
+        # Create sample agency
+        sample_agency = Agency(
+            name='Sample Marketing Agency',
+            code='SMA001',
+            address='123 Business Street, City, State 12345',
+            phone='(555) 123-4567',
+            email='info@sampleagency.com',
+            is_active=True
+        )
+        db.session.add(sample_agency)
+        db.session.commit()
+
+        # Create agency admin
+        agency_admin = User(
+            username='agency_admin',
+            email='admin@sampleagency.com',
+            password_hash=generate_password_hash('admin123'),
+            first_name='John',
+            last_name='Manager',
+            role='agency_admin',
+            agency_id=sample_agency.id,
+            is_active=True
+        )
+
+        # Create agency staff
+        agency_staff = User(
+            username='agency_staff',
+            email='staff@sampleagency.com',
+            password_hash=generate_password_hash('staff123'),
+            first_name='Jane',
+            last_name='Staff',
+            role='staff',
+            agency_id=sample_agency.id,
+            is_active=True
+        )
+
+        # Create salesperson
+        salesperson = User(
+            username='salesperson',
+            email='sales@sampleagency.com',
+            password_hash=generate_password_hash('sales123'),
+            first_name='Mike',
+            last_name='Sales',
+            role='salesperson',
+            agency_id=sample_agency.id,
+            is_active=True
+        )
+
+        db.session.add_all([agency_admin, agency_staff, salesperson])
+        db.session.commit()
+        logging.info("Sample agency and users created:")
+        logging.info("  Agency Admin: agency_admin/admin123")
+        logging.info("  Staff: agency_staff/staff123")
+        logging.info("  Salesperson: salesperson/sales123")
+
+    return time.perf_counter() - started
+
+@click.command('init-db')
+@click.option('--demo/--no-demo', default=True, show_default=True,
+              help='Also create the sample agency and its users.')
+@with_appcontext
+def init_db_command(demo):
+    """Create missing tables and seed the default accounts."""
+    seconds = init_db(demo=demo)
+    click.echo(f'Database initialised in {seconds:.2f}s')
@@ -1,10 +1,13 @@
 from functools import wraps
 from flask import session, request
-from app import db
-from models import ActivityLog
+from utils.activity_log import activity_log_writer
 
-def log_activity(action):
-    """Decorator to log user activities"""
+def log_activity(action, dry_run_action=None):
+    """Decorator to log user activities
+
+    With dry_run_action, a request whose form has dry_run set (a validation
+    pass that writes nothing) is logged under that action instead.
+    """
     def decorator(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -13,17 +16,19 @@ def log_activity(action):
                 # Execute the function first
                 result = f(*args, **kwargs)
                 
-                # Log the activity after successful execution
+                logged_action = action
+                if dry_run_action and request.form.get('dry_run'):
+                    logged_action = dry_run_action
+                
+                # Log the activity after successful execution; written in the background
                 try:
-                    log = ActivityLog(
+                    activity_log_writer.log(
                         user_id=user_id,
-                        action=action,
-                        description=f'User performed {action}',
+                        action=logged_action,
+                        description=f'User performed {logged_action}',
                         ip_address=request.remote_addr,
                         user_agent=request.headers.get('User-Agent')
                     )
-                    db.session.add(log)
-                    db.session.commit()
                 except Exception as e:
                     # Don't fail the request if logging fails
                     pass
@@ -1,14 +1,28 @@
 import io
 import csv
+import tempfile
+import time
 from datetime import datetime
-from openpyxl import Workbook
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.styles import Font, PatternFill
+from decimal import Decimal
+from sqlalchemy import func
 from app import db
-from models import Product, Order, OrderItem
+from utils.bulk_import import IMPORT_CHUNK_SIZE, ImportErrors
+from utils.bulk_load import get_bulk_loader
+from utils.export_jobs import iter_with_progress
+from utils.filter_options import invalidate_filter_options
+from utils.typeahead import invalidate_typeahead
+from models import Product, Order, OrderItem, Customer, Location, Agency, User
 
-def export_products_to_excel(products):
-    """Export products to Excel file using openpyxl"""
+def export_products_to_excel(products, output=None, progress=None):
+    """Export products to Excel file using openpyxl.
+
+    Written to output when given, otherwise to a new BytesIO. progress, if
+    given, is called as progress(done) while rows are added.
+    """
+    # openpyxl is imported on use so that workers which never export do not load it
+    from openpyxl import Workbook
+    from openpyxl.styles import Font, PatternFill
+    
     wb = Workbook()
     ws = wb.active
     ws.title = "Products"
@@ -25,6 +39,9 @@ def export_products_to_excel(products):
         cell.font = header_font
         cell.fill = header_fill
     
+    if progress is not None:
+        products = iter_with_progress(products, progress)
+    
     # Add data
     for product in products:
         row_data = [
@@ -55,123 +72,202 @@ def export_products_to_excel(products):
         adjusted_width = min(max_length + 2, 50)
         ws.column_dimensions[column_letter].width = adjusted_width
     
-    # Save to BytesIO
-    output = io.BytesIO()
+    # Save to BytesIO unless the caller supplied a file
+    if output is None:
+        output = io.BytesIO()
     wb.save(output)
     output.seek(0)
     return output
 
-def import_products_from_excel(file, agency_id, user_role):
-    """Import products from Excel or CSV file"""
+def _cell_text(value):
+    return '' if value is None else str(value).strip()
+
+def _iter_csv_rows(stream):
+    """(row number, dict row) pairs from a CSV upload, decoded incrementally"""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        for row_num, row in enumerate(csv.DictReader(text), start=2):  # Start from 2 to account for header
+            yield row_num, row
+    finally:
+        text.detach()
+
+def _iter_excel_rows(stream):
+    """(row number, dict row) pairs from the active sheet of a workbook opened in read-only mode"""
+    from openpyxl import load_workbook
+    
+    wb = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        headers = next(rows, None) or ()
+        for row_num, row in enumerate(rows, start=2):
+            if not any(row):  # Skip empty rows
+                continue
+            yield row_num, {header: value for header, value in zip(headers, row) if header}
+    finally:
+        wb.close()
+
+def iter_product_rows(file):
+    """Rows of an uploaded product file as (row number, dict keyed by header), one at a time"""
+    stream = getattr(file, 'stream', file)
+    if file.filename.lower().endswith('.csv'):
+        return _iter_csv_rows(stream)
+    return _iter_excel_rows(stream)
+
+def parse_product_row(row, agency_id):
+    """Column values for a Product insert.
+
+    Raises ValueError with a user-facing message when a required field is
+    missing or a number cannot be parsed.
+    """
+    name = _cell_text(row.get('Name') or row.get('name'))
+    sku = _cell_text(row.get('SKU') or row.get('sku'))
+    price = _cell_text(row.get('Price') or row.get('price'))
+    missing_fields = [field for field, value in (('Name', name), ('SKU', sku), ('Price', price)) if not value]
+    if missing_fields:
+        raise ValueError(f"Missing required fields: {', '.join(missing_fields)}")
+    
+    try:
+        return {
+            'name': name,
+            'description': _cell_text(row.get('Description')),
+            'sku': sku,
+            'price': float(price),
+            'cost': float(row.get('Cost')) if row.get('Cost') else 0,
+            'stock_quantity': int(row.get('Stock Quantity')) if row.get('Stock Quantity') else 0,
+            'category': _cell_text(row.get('Category')),
+            'agency_id': agency_id,
+            'is_active': True
+        }
+    except (ValueError, TypeError):
+        raise ValueError('Price and Cost must be numbers and Stock Quantity a whole number')
+
+# Columns an upsert import may change on an existing product
+PRODUCT_UPSERT_COLUMNS = ['price', 'cost', 'stock_quantity', 'category', 'description']
+
+def _new_rows(chunk, seen_skus, errors):
+    """Reject rows whose SKU appeared earlier in the file; returns the rest and records their SKUs"""
+    rows = []
+    for row_num, row, product in chunk:
+        if product['sku'] in seen_skus:
+            errors.add(row_num, f"Duplicate SKU '{product['sku']}' earlier in the file", row)
+            continue
+        seen_skus.add(product['sku'])
+        rows.append((row_num, row, product))
+    return rows
+
+def _insert_new_products(chunk, seen_skus, counts, errors, dry_run):
+    """Bulk insert the products whose SKU is neither in the database nor seen earlier in the file"""
+    rows = _new_rows(chunk, seen_skus, errors)
+    existing = {sku for (sku,) in db.session.query(Product.sku).filter(
+        Product.sku.in_([product['sku'] for _, _, product in rows]))}
+    new_products = []
+    for row_num, row, product in rows:
+        if product['sku'] in existing:
+            errors.add(row_num, f"SKU '{product['sku']}' already exists", row)
+        else:
+            new_products.append(product)
+    if not dry_run:
+        get_bulk_loader(Product).insert(new_products)
+    counts['imported'] += len(new_products)
+
+def _normalised(column, value):
+    # Compare the way the database stores values: money to the cent, blank text as NULL
+    if column in ('price', 'cost'):
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+    if column == 'stock_quantity':
+        return int(value or 0)
+    return value or None
+
+def _upsert_products(chunk, seen_skus, agency_id, user_role, counts, errors, dry_run):
+    """Insert new products and update changed ones by SKU, leaving unchanged rows alone"""
+    rows = _new_rows(chunk, seen_skus, errors)
+    existing = {p.sku: p for p in db.session.query(
+        Product.sku, Product.agency_id, *[getattr(Product, c) for c in PRODUCT_UPSERT_COLUMNS]
+    ).filter(Product.sku.in_([product['sku'] for _, _, product in rows]))}
+    
+    writes = []
+    for row_num, row, product in rows:
+        current = existing.get(product['sku'])
+        if current is None:
+            writes.append(product)
+            counts['imported'] += 1
+            continue
+        # Only super admins may touch another agency's products
+        if user_role != 'super_admin' and current.agency_id != agency_id:
+            errors.add(row_num, f"SKU '{product['sku']}' belongs to another agency", row)
+            continue
+        if all(_normalised(c, product[c]) == _normalised(c, getattr(current, c)) for c in PRODUCT_UPSERT_COLUMNS):
+            counts['unchanged'] += 1
+            continue
+        counts['updated'] += 1
+        counts['agencies'].add(current.agency_id)
+        writes.append(dict(product, agency_id=current.agency_id))
+    
+    if not dry_run:
+        get_bulk_loader(Product).upsert(writes, 'sku', PRODUCT_UPSERT_COLUMNS)
+
+def import_products_from_excel(file, agency_id, user_role, chunk_size=IMPORT_CHUNK_SIZE, mode='insert',
+                               dry_run=False):
+    """Import products from Excel or CSV file.
+
+    The file is read row by row (CSV incrementally, Excel in read-only
+    mode). SKUs are checked against the database one chunk at a time and
+    against the SKUs seen earlier in the file. In 'insert' mode existing
+    SKUs are rejected; in 'upsert' mode they are updated (price, cost,
+    stock, category, description) and rows that would not change anything
+    are not written. Writes go through the configured bulk loader (COPY on
+    PostgreSQL, executemany elsewhere).
+    Memory is bounded by the chunk size plus the set of SKUs in the file.
+    Everything is committed at the end, or rolled back on error. With
+    dry_run nothing is written and the counts say what would happen.
+    Rejected rows are counted as skipped and listed in errors and
+    error_report (an ImportErrors). success_count, error_count and seconds
+    follow the CSV importers in the customer, location and super_admin
+    services.
+    """
+    started = time.perf_counter()
     try:
-        imported = 0
-        skipped = 0
+        counts = {'imported': 0, 'updated': 0, 'unchanged': 0, 'agencies': {agency_id}}
+        errors = ImportErrors()
+        seen_skus = set()
+        chunk = []
         
-        if file.filename.lower().endswith('.csv'):
-            # Handle CSV file
-            content = file.read().decode('utf-8')
-            csv_file = io.StringIO(content)
-            reader = csv.DictReader(csv_file)
-            
-            for row in reader:
-                # Extract data from row
-                name = row.get('Name') or row.get('name') or ''
-                sku = row.get('SKU') or row.get('sku') or ''
-                price = row.get('Price') or row.get('price') or ''
-                
-                if not all([name.strip(), sku.strip(), price]):
-                    skipped += 1
-                    continue
-                
-                # Check if SKU already exists
-                if Product.query.filter_by(sku=sku.strip()).first():
-                    skipped += 1
-                    continue
-                
-                # Create product
-                try:
-                    product = Product(
-                        name=name.strip(),
-                        description=row.get('Description', '').strip(),
-                        sku=sku.strip(),
-                        price=float(price),
-                        cost=float(row.get('Cost', 0)) if row.get('Cost') else 0,
-                        stock_quantity=int(row.get('Stock Quantity', 0)) if row.get('Stock Quantity') else 0,
-                        category=row.get('Category', '').strip(),
-                        agency_id=agency_id,
-                        is_active=True
-                    )
-                    
-                    db.session.add(product)
-                    imported += 1
-                except (ValueError, TypeError):
-                    skipped += 1
-                    continue
+        def flush_chunk(chunk):
+            if mode == 'upsert':
+                _upsert_products(chunk, seen_skus, agency_id, user_role, counts, errors, dry_run)
+            else:
+                _insert_new_products(chunk, seen_skus, counts, errors, dry_run)
         
-        else:
-            # Handle Excel file using openpyxl
-            from openpyxl import load_workbook
-            
-            wb = load_workbook(file)
-            ws = wb.active
-            
-            # Get headers from first row
-            headers = []
-            for cell in ws[1]:
-                headers.append(cell.value)
+        for row_num, row in iter_product_rows(file):
+            try:
+                product = parse_product_row(row, agency_id)
+            except ValueError as e:
+                errors.add(row_num, str(e), row)
+                continue
             
-            # Process data rows
-            for row in ws.iter_rows(min_row=2, values_only=True):
-                if not any(row):  # Skip empty rows
-                    continue
-                
-                # Create row dictionary
-                row_dict = {}
-                for i, value in enumerate(row):
-                    if i < len(headers) and headers[i]:
-                        row_dict[headers[i]] = value
-                
-                # Extract data from row
-                name = row_dict.get('Name') or row_dict.get('name') or ''
-                sku = row_dict.get('SKU') or row_dict.get('sku') or ''
-                price = row_dict.get('Price') or row_dict.get('price') or ''
-                
-                if not all([str(name).strip(), str(sku).strip(), price]):
-                    skipped += 1
-                    continue
-                
-                # Check if SKU already exists
-                if Product.query.filter_by(sku=str(sku).strip()).first():
-                    skipped += 1
-                    continue
-                
-                # Create product
-                try:
-                    product = Product(
-                        name=str(name).strip(),
-                        description=str(row_dict.get('Description', '')).strip(),
-                        sku=str(sku).strip(),
-                        price=float(price),
-                        cost=float(row_dict.get('Cost', 0)) if row_dict.get('Cost') else 0,
-                        stock_quantity=int(row_dict.get('Stock Quantity', 0)) if row_dict.get('Stock Quantity') else 0,
-                        category=str(row_dict.get('Category', '')).strip(),
-                        agency_id=agency_id,
-                        is_active=True
-                    )
-                    
-                    db.session.add(product)
-                    imported += 1
-                except (ValueError, TypeError):
-                    skipped += 1
-                    continue
+            chunk.append((row_num, row, product))
+            if len(chunk) >= chunk_size:
+                flush_chunk(chunk)
+                chunk = []
         
-        db.session.commit()
+        if chunk:
+            flush_chunk(chunk)
         
-        return {
-            'success': True,
-            'imported': imported,
-            'skipped': skipped
-        }
+        changed_agencies = counts.pop('agencies')
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+            # Bulk writes skip the flush listeners that keep the category filter lists
+            # and the order form's product typeahead fresh
+            for changed_agency_id in changed_agencies:
+                invalidate_filter_options('categories', changed_agency_id)
+                invalidate_typeahead('products', changed_agency_id)
+        
+        return dict(counts, success=True, dry_run=dry_run, skipped=len(errors),
+                    success_count=counts['imported'] + counts['updated'] + counts['unchanged'],
+                    error_count=len(errors), errors=errors.messages(), error_report=errors,
+                    seconds=time.perf_counter() - started)
         
     except Exception as e:
         db.session.rollback()
@@ -180,116 +276,144 @@ def import_products_from_excel(file, agency_id, user_role):
             'message': str(e)
         }
 
-def export_orders_to_excel(orders):
-    """Export orders to Excel file using openpyxl"""
-    wb = Workbook()
-    
-    # Orders details sheet
-    ws_details = wb.active
-    ws_details.title = "Order Details"
-    
-    # Headers for details
-    detail_headers = [
-        'Order ID', 'Order Number', 'Customer', 'Customer Email', 'Customer Phone',
-        'Location', 'Agency', 'Salesperson', 'Product Name', 'Product SKU',
-        'Quantity', 'Unit Price', 'Total Price', 'Order Status', 'Order Total',
-        'Discount', 'Tax', 'Order Date', 'Delivery Date', 'Notes'
-    ]
-    ws_details.append(detail_headers)
+ORDER_DETAIL_HEADERS = [
+    'Order ID', 'Order Number', 'Customer', 'Customer Email', 'Customer Phone',
+    'Location', 'Agency', 'Salesperson', 'Product Name', 'Product SKU',
+    'Quantity', 'Unit Price', 'Total Price', 'Order Status', 'Order Total',
+    'Discount', 'Tax', 'Order Date', 'Delivery Date', 'Notes'
+]
+
+ORDER_SUMMARY_HEADERS = [
+    'Order Number', 'Customer', 'Agency', 'Salesperson', 'Status',
+    'Total Amount', 'Order Date', 'Items Count'
+]
+
+EXPORT_BATCH_SIZE = 1000
+WIDTH_SAMPLE_SIZE = 500
+SPOOL_MAX_SIZE = 8 * 1024 * 1024
+
+def _format_datetime(value, fmt='%Y-%m-%d %H:%M:%S'):
+    return value.strftime(fmt) if value else ''
+
+def _full_name(first_name, last_name):
+    # Same as User.full_name, which is a Python property and cannot be selected
+    return f"{first_name or ''} {last_name or ''}".strip()
+
+def _float(value):
+    return float(value) if value is not None else 0.0
+
+def _write_streamed_sheet(ws, headers, rows, sample_size=WIDTH_SAMPLE_SIZE):
+    """Append rows to a write-only sheet, sizing columns from the first sample_size rows.
+
+    Write-only sheets need their column widths before the first row is
+    written, so a small sample is buffered, measured and then flushed.
+    """
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
     
-    # Style headers
+    rows = iter(rows)
+    sample = []
+    for row in rows:
+        sample.append(row)
+        if len(sample) >= sample_size:
+            break
+
+    # Estimate column widths from the header and sample
+    for index, header in enumerate(headers):
+        lengths = [len(str(row[index])) for row in sample if row[index] is not None]
+        max_length = max(lengths + [len(header)])
+        ws.column_dimensions[get_column_letter(index + 1)].width = min(max_length + 2, 50)
+
+    # Styled header row
     header_font = Font(bold=True)
     header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    
-    for cell in ws_details[1]:
-        cell.font = header_font
-        cell.fill = header_fill
-    
-    # Add order details data
-    for order in orders:
-        for item in order.order_items:
-            row_data = [
-                order.id,
-                order.order_number,
-                order.customer.name,
-                order.customer.email,
-                order.customer.phone,
-                order.customer.location.name,
-                order.agency.name,
-                order.salesperson.full_name,
-                item.product.name,
-                item.product.sku,
-                item.quantity,
-                float(item.unit_price),
-                float(item.total_price),
-                order.status,
-                float(order.total_amount),
-                float(order.discount),
-                float(order.tax),
-                order.order_date.strftime('%Y-%m-%d %H:%M:%S'),
-                order.delivery_date.strftime('%Y-%m-%d') if order.delivery_date else '',
-                order.notes
-            ]
-            ws_details.append(row_data)
-    
-    # Auto-size columns for details
-    for column in ws_details.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_details.column_dimensions[column_letter].width = adjusted_width
-    
-    # Order summary sheet
-    ws_summary = wb.create_sheet("Order Summary")
-    summary_headers = [
-        'Order Number', 'Customer', 'Agency', 'Salesperson', 'Status',
-        'Total Amount', 'Order Date', 'Items Count'
-    ]
-    ws_summary.append(summary_headers)
-    
-    # Style summary headers
-    for cell in ws_summary[1]:
+    header_cells = []
+    for header in headers:
+        cell = WriteOnlyCell(ws, value=header)
         cell.font = header_font
         cell.fill = header_fill
-    
-    # Add summary data
-    order_summary = {}
-    for order in orders:
-        if order.id not in order_summary:
-            row_data = [
-                order.order_number,
-                order.customer.name,
-                order.agency.name,
-                order.salesperson.full_name,
-                order.status,
-                float(order.total_amount),
-                order.order_date.strftime('%Y-%m-%d %H:%M:%S'),
-                len(order.order_items)
-            ]
-            ws_summary.append(row_data)
-            order_summary[order.id] = True
-    
-    # Auto-size columns for summary
-    for column in ws_summary.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = min(max_length + 2, 50)
-        ws_summary.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to BytesIO
-    output = io.BytesIO()
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    for row in sample:
+        ws.append(row)
+    for row in rows:
+        ws.append(row)
+
+def _order_detail_rows(orders):
+    """One row per order item from a single joined query streamed in batches"""
+    query = orders.join(OrderItem, OrderItem.order_id == Order.id) \
+        .join(Product, OrderItem.product_id == Product.id) \
+        .join(Customer, Order.customer_id == Customer.id) \
+        .join(Location, Customer.location_id == Location.id) \
+        .join(Agency, Order.agency_id == Agency.id) \
+        .outerjoin(User, Order.salesperson_id == User.id) \
+        .with_entities(
+            Order.id, Order.order_number, Customer.name, Customer.email, Customer.phone,
+            Location.name, Agency.name, User.first_name, User.last_name, Product.name, Product.sku,
+            OrderItem.quantity, OrderItem.unit_price, OrderItem.total_price, Order.status,
+            Order.total_amount, Order.discount, Order.tax, Order.order_date,
+            Order.delivery_date, Order.notes
+        ).order_by(Order.id, OrderItem.id)
+
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        (order_id, order_number, customer, email, phone, location, agency, first_name, last_name,
+         product, sku, quantity, unit_price, total_price, status, total_amount,
+         discount, tax, order_date, delivery_date, notes) = row
+        yield [
+            order_id, order_number, customer, email, phone, location, agency,
+            _full_name(first_name, last_name), product, sku, quantity, _float(unit_price), _float(total_price), status,
+            _float(total_amount), _float(discount), _float(tax),
+            _format_datetime(order_date), _format_datetime(delivery_date, '%Y-%m-%d'), notes
+        ]
+
+def _order_summary_rows(orders):
+    """One row per order with its item count, streamed in batches"""
+    # Counted per exported order (via ix_order_items_order) rather than by
+    # grouping the whole order_items table, so the cost follows the export
+    items_count = db.session.query(func.count(OrderItem.id)) \
+        .filter(OrderItem.order_id == Order.id) \
+        .correlate(Order).scalar_subquery()
+
+    query = orders.join(Customer, Order.customer_id == Customer.id) \
+        .join(Agency, Order.agency_id == Agency.id) \
+        .outerjoin(User, Order.salesperson_id == User.id) \
+        .with_entities(
+            Order.order_number, Customer.name, Agency.name, User.first_name, User.last_name, Order.status,
+            Order.total_amount, Order.order_date, items_count
+        ).order_by(Order.id)
+
+    for row in query.yield_per(EXPORT_BATCH_SIZE):
+        order_number, customer, agency, first_name, last_name, status, total_amount, order_date, items_count = row
+        yield [order_number, customer, agency, _full_name(first_name, last_name), status,
+               _float(total_amount), _format_datetime(order_date), items_count]
+
+def export_orders_to_excel(orders, output=None, progress=None):
+    """Export orders to an Excel file with bounded memory.
+
+    orders is an Order query (a list of orders is also accepted). Rows are
+    streamed from the database into write-only worksheets and the workbook
+    is written to output, or spooled to a temporary file when no output is
+    given, so memory stays flat however many orders are exported. The
+    caller owns the returned file object. progress, if given, is called as
+    progress(done) with the number of detail rows written.
+    """
+    if not hasattr(orders, 'with_entities'):
+        orders = Order.query.filter(Order.id.in_([order.id for order in orders]))
+
+    detail_rows = _order_detail_rows(orders)
+    if progress is not None:
+        detail_rows = iter_with_progress(detail_rows, progress)
+
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    _write_streamed_sheet(wb.create_sheet("Order Details"), ORDER_DETAIL_HEADERS, detail_rows)
+    _write_streamed_sheet(wb.create_sheet("Order Summary"), ORDER_SUMMARY_HEADERS, _order_summary_rows(orders))
+
+    # Spool to disk past a few MB instead of holding the whole file in memory
+    if output is None:
+        output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
     wb.save(output)
     output.seek(0)
-    return output
\ No newline at end of file
+    return output
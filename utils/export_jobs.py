@@ -0,0 +1,279 @@
+import atexit
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from flask import request, session, jsonify, send_file, url_for
+from utils.db_routing import use_read_replica
+
+logger = logging.getLogger(__name__)
+
+class ExportDefinition:
+    def __init__(self, name, fn, filename, mimetype):
+        self.name = name
+        self.fn = fn
+        self.filename = filename
+        self.mimetype = mimetype
+
+_exports = {}
+
+def register_export(name, filename, mimetype):
+    """Register fn(output, scope, progress) as an export that can run inline or as a job.
+
+    output is a binary file to write to, scope a dict with the requesting
+    user's role, agency_id and user_id, and progress(done, total=None) a
+    callback for reporting how many rows have been written.
+    """
+    def decorator(fn):
+        _exports[name] = ExportDefinition(name, fn, filename, mimetype)
+        return fn
+    return decorator
+
+def iter_with_progress(rows, progress, total=None, every=500):
+    """Yield rows unchanged, reporting progress every `every` rows and at the end"""
+    done = 0
+    for row in rows:
+        yield row
+        done += 1
+        if done % every == 0:
+            progress(done, total)
+    progress(done, total)
+
+@contextmanager
+def csv_output(output):
+    """csv.writer over a binary file, detached afterwards so the file stays open"""
+    text = io.TextIOWrapper(output, encoding='utf-8', newline='')
+    try:
+        yield csv.writer(text)
+    finally:
+        text.flush()
+        text.detach()
+
+class ExportJobRunner:
+    """Runs registered exports on a small thread pool and spools the results to disk.
+
+    Job state is kept as JSON next to the result file in the spool
+    directory, so every worker process on the host can report status and
+    serve downloads. Finished, failed and abandoned jobs are removed once
+    they are older than EXPORT_JOB_TTL seconds.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._futures = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.max_workers = app.config.setdefault('EXPORT_JOB_WORKERS', 2)
+        self.spool_dir = app.config.setdefault(
+            'EXPORT_SPOOL_DIR', os.path.join(tempfile.gettempdir(), 'agencysales_exports'))
+        self.ttl = app.config.setdefault('EXPORT_JOB_TTL', 3600)
+        os.makedirs(self.spool_dir, exist_ok=True)
+        app.extensions['export_jobs'] = self
+        atexit.register(self.shutdown)
+
+    def submit(self, name, scope):
+        """Queue export `name` for the given scope and return the job record"""
+        export = _exports[name]
+        self.cleanup_expired()
+        job = {
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'user_id': scope.get('user_id'),
+            'status': 'queued',
+            'done': 0,
+            'total': None,
+            'filename': export.filename,
+            'mimetype': export.mimetype,
+            'error': None,
+            'created_at': time.time(),
+            'finished_at': None
+        }
+        self._save(job)
+        future = self._get_executor().submit(self._run, job['id'], scope)
+        with self._lock:
+            self._futures[job['id']] = future
+        future.add_done_callback(lambda f, job_id=job['id']: self._futures.pop(job_id, None))
+        return job
+
+    def store(self, name, user_id, filename, mimetype, write):
+        """Run write(output) now and keep the file as a finished job, so it downloads like an export"""
+        self.cleanup_expired()
+        now = time.time()
+        job = {
+            'id': uuid.uuid4().hex,
+            'name': name,
+            'user_id': user_id,
+            'status': 'finished',
+            'done': 0,
+            'total': None,
+            'filename': filename,
+            'mimetype': mimetype,
+            'error': None,
+            'created_at': now,
+            'finished_at': now
+        }
+        partial = self._path(job['id'], 'part')
+        with open(partial, 'wb') as output:
+            write(output)
+        os.replace(partial, self.result_path(job['id']))
+        self._save(job)
+        return job
+
+    def get(self, job_id):
+        """The job record, or None if it does not exist or has expired"""
+        if not self._valid_id(job_id):
+            return None
+        try:
+            with open(self._path(job_id, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_path(self, job_id):
+        return self._path(job_id, 'out')
+
+    def cleanup_expired(self):
+        """Delete job records and results older than the TTL"""
+        cutoff = time.time() - self.ttl
+        try:
+            names = os.listdir(self.spool_dir)
+        except OSError:
+            return
+        for filename in names:
+            path = os.path.join(self.spool_dir, filename)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def shutdown(self, wait=True):
+        """Cancel queued jobs and wait for running ones to finish"""
+        if self._executor is None or self._pid != os.getpid():
+            return
+        with self._lock:
+            futures = dict(self._futures)
+        for job_id, future in futures.items():
+            if future.cancel():
+                self._update(job_id, status='failed', error='Export was interrupted, please try again',
+                             finished_at=time.time())
+        self._executor.shutdown(wait=wait)
+        self._executor = None
+
+    def _get_executor(self):
+        # Like the activity log writer, threads do not survive a fork so the
+        # pool is created in whichever process submits the first job.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._futures = {}
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix='export-job')
+            return self._executor
+
+    def _run(self, job_id, scope):
+        job = self.get(job_id)
+        if job is None:
+            return
+        export = _exports[job['name']]
+        self._update(job_id, status='running')
+
+        state = {'done': 0, 'total': None, 'saved_at': 0.0}
+        def progress(done, total=None):
+            # Throttled so a fast export does not rewrite its state file per batch
+            state.update(done=done, total=total)
+            now = time.monotonic()
+            if now - state['saved_at'] >= 0.5:
+                state['saved_at'] = now
+                self._update(job_id, done=done, total=total)
+
+        partial = self._path(job_id, 'part')
+        try:
+            with self.app.app_context():
+                # Exports only read, so they can run on the replica when there is one
+                use_read_replica()
+                with open(partial, 'wb') as output:
+                    export.fn(output, scope, progress)
+            os.replace(partial, self.result_path(job_id))
+            self._update(job_id, status='finished', done=state['done'], total=state['total'],
+                         finished_at=time.time())
+        except Exception:
+            logger.exception('Export job %s (%s) failed', job_id, job['name'])
+            if os.path.exists(partial):
+                os.remove(partial)
+            self._update(job_id, status='failed', error='Export failed', finished_at=time.time())
+
+    def _update(self, job_id, **changes):
+        job = self.get(job_id)
+        if job is not None:
+            job.update(changes)
+            self._save(job)
+
+    def _save(self, job):
+        # Written to a temporary name and renamed so readers never see a partial file
+        path = self._path(job['id'], 'json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job, f)
+        os.replace(path + '.tmp', path)
+
+    def _path(self, job_id, extension):
+        return os.path.join(self.spool_dir, f'{job_id}.{extension}')
+
+    @staticmethod
+    def _valid_id(job_id):
+        return isinstance(job_id, str) and len(job_id) == 32 and all(c in '0123456789abcdef' for c in job_id)
+
+export_job_runner = ExportJobRunner()
+
+def export_scope():
+    """The part of the session that decides which rows an export may contain"""
+    return {
+        'role': session.get('role'),
+        'agency_id': session.get('agency_id'),
+        'user_id': session.get('user_id')
+    }
+
+def job_payload(job):
+    payload = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'done': job['done'],
+        'total': job['total'],
+        'error': job['error'],
+        'status_url': url_for('exports.job_status', job_id=job['id'])
+    }
+    if job['status'] == 'finished':
+        payload['download_url'] = url_for('exports.download', job_id=job['id'])
+    return payload
+
+def export_response(name):
+    """Run export `name` for the current user.
+
+    With ?background=1 the export is queued and a 202 with the job id and
+    status URL is returned straight away; otherwise it runs inline and the
+    file is sent as before.
+    """
+    scope = export_scope()
+    if request.args.get('background'):
+        job = export_job_runner.submit(name, scope)
+        return jsonify(job_payload(job)), 202
+
+    export = _exports[name]
+    use_read_replica()
+    output = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    export.fn(output, scope, lambda done, total=None: None)
+    output.seek(0)
+    return send_file(output, as_attachment=True, download_name=export.filename, mimetype=export.mimetype)
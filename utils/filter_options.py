@@ -0,0 +1,113 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from models import Agency, Location, User, Product, Customer
+from utils.cache import cache_get_or_set, cache_delete_prefix
+
+# Option lists are small and change rarely; entries are dropped on write and the
+# TTL bounds staleness for other worker processes that did not see the write.
+OPTIONS_CACHE_TTL = 300
+
+SALESPERSON_ROLES = ['salesperson', 'staff', 'agency_admin']
+
+def _key(kind, agency_id):
+    return ('filter_options', kind, int(agency_id) if agency_id else None)
+
+def get_agency_options():
+    """Active agencies for the super admin agency filter"""
+    def load():
+        agencies = Agency.query.filter_by(is_active=True).order_by(Agency.name).all()
+        return [{'id': a.id, 'name': a.name, 'code': a.code} for a in agencies]
+    return cache_get_or_set(_key('agencies', None), load, OPTIONS_CACHE_TTL)
+
+def get_location_options(agency_id=None):
+    """Active locations of an agency, or of every agency when agency_id is None"""
+    def load():
+        query = Location.query.filter_by(is_active=True)
+        if agency_id:
+            query = query.filter_by(agency_id=agency_id)
+        return [{'id': l.id, 'name': l.name} for l in query.order_by(Location.name).all()]
+    return cache_get_or_set(_key('locations', agency_id), load, OPTIONS_CACHE_TTL)
+
+def get_salesperson_options(agency_id=None):
+    """Users that can own orders, scoped like get_location_options"""
+    def load():
+        query = User.query.filter(User.role.in_(SALESPERSON_ROLES))
+        if agency_id:
+            query = query.filter_by(agency_id=agency_id)
+        return [{
+            'id': u.id,
+            'username': u.username,
+            'full_name': u.full_name
+        } for u in query.order_by(User.first_name, User.last_name).all()]
+    return cache_get_or_set(_key('salespersons', agency_id), load, OPTIONS_CACHE_TTL)
+
+def get_category_options(agency_id=None):
+    """Distinct product categories, scoped like get_location_options"""
+    def load():
+        query = db.session.query(Product.category).distinct().filter(Product.category.isnot(None))
+        if agency_id:
+            query = query.filter(Product.agency_id == agency_id)
+        return sorted(cat[0] for cat in query.all() if cat[0])
+    return cache_get_or_set(_key('categories', agency_id), load, OPTIONS_CACHE_TTL)
+
+def customer_search_query(agency_id, term):
+    """Active customers whose name contains term, limited to an agency unless agency_id is None"""
+    query = db.session.query(Customer.id, Customer.name, Location.name.label('location_name')) \
+        .join(Location, Customer.location_id == Location.id) \
+        .filter(Customer.is_active == True)
+    if agency_id:
+        query = query.filter(Location.agency_id == agency_id)
+    if term:
+        query = query.filter(Customer.name.ilike(f'%{term}%'))
+    return query.order_by(Customer.name)
+
+def invalidate_filter_options(kind, agency_id=None):
+    """Drop a cached option list for one agency (and the all-agencies list)"""
+    if agency_id:
+        cache_delete_prefix(_key(kind, agency_id))
+    cache_delete_prefix(_key(kind, None))
+
+# Model -> (option list kind, attributes that appear in that list)
+_WATCHED = {
+    Agency: ('agencies', ('name', 'code', 'is_active')),
+    Location: ('locations', ('name', 'is_active', 'agency_id')),
+    User: ('salespersons', ('first_name', 'last_name', 'username', 'role', 'agency_id')),
+    Product: ('categories', ('category', 'agency_id')),
+}
+
+# Cache key prefixes made stale by the current transaction live in session.info
+# and are only dropped once it commits: dropping them at flush time would let a
+# concurrent request reload the old rows and cache them for OPTIONS_CACHE_TTL.
+_STALE_KEY = 'filter_options_stale'
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_options(session, flush_context):
+    changed = [(obj, True) for obj in session.new] + [(obj, True) for obj in session.deleted]
+    changed += [(obj, False) for obj in session.dirty]
+
+    stale = session.info.setdefault(_STALE_KEY, set())
+    for obj, always in changed:
+        watched = _WATCHED.get(type(obj))
+        if not watched:
+            continue
+        kind, attrs = watched
+        state = inspect(obj)
+        if not always and not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            continue
+        if kind == 'agencies':
+            stale.add(_key(kind, None))
+        elif not always and state.attrs.agency_id.history.has_changes():
+            # Moved between agencies: both the old and new lists are stale
+            stale.add(('filter_options', kind))
+        else:
+            stale.update((_key(kind, obj.agency_id), _key(kind, None)))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_options(session):
+    for prefix in session.info.pop(_STALE_KEY, ()):
+        cache_delete_prefix(prefix)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_options(session):
+    session.info.pop(_STALE_KEY, None)
@@ -0,0 +1,109 @@
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+class KeysetPage:
+    """One page of a keyset (cursor) paginated query"""
+
+    def __init__(self, items, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_prev(self):
+        return self.prev_cursor is not None
+
+    # URL arguments for the pager links, shared with OffsetPage by _pagination.html
+    @property
+    def next_args(self):
+        return {'after': self.next_cursor}
+
+    @property
+    def prev_args(self):
+        return {'before': self.prev_cursor}
+
+class OffsetPage:
+    """One numbered page of a query, for orderings a cursor cannot follow (such as search rank)"""
+
+    def __init__(self, items, number, has_next):
+        self.items = items
+        self.number = number
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.number > 1
+
+    @property
+    def next_args(self):
+        return {'page': self.number + 1}
+
+    @property
+    def prev_args(self):
+        return {'page': self.number - 1}
+
+def offset_paginate(query, number, per_page):
+    """Return page number (from 1) of an already ordered query; only per_page + 1 rows are read"""
+    number = max(1, number or 1)
+    rows = query.offset((number - 1) * per_page).limit(per_page + 1).all()
+    return OffsetPage(rows[:per_page], number, len(rows) > per_page)
+
+def encode_cursor(sort_value, row_id):
+    """Encode a (datetime, id) position as an opaque URL-safe token"""
+    raw = f"{sort_value.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_cursor(token):
+    """Decode a cursor token, returning (datetime, id) or None if it is invalid"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = base64.urlsafe_b64decode(padded).decode('utf-8').split('|', 1)
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+def keyset_paginate(query, sort_column, id_column, per_page, after=None, before=None):
+    """Return a newest-first KeysetPage of query ordered by (sort_column, id_column).
+
+    after/before are cursor tokens; after walks towards older rows and
+    before walks back towards newer rows. Only per_page + 1 rows are read.
+    """
+    after_pos = decode_cursor(after)
+    before_pos = decode_cursor(before)
+    query = query.order_by(None)
+
+    if before_pos and not after_pos:
+        sort_value, row_id = before_pos
+        rows = query.filter(or_(
+            sort_column > sort_value,
+            and_(sort_column == sort_value, id_column > row_id)
+        )).order_by(sort_column.asc(), id_column.asc()).limit(per_page + 1).all()
+        has_more = len(rows) > per_page
+        items = list(reversed(rows[:per_page]))
+        next_cursor = _cursor_for(items[-1], sort_column, id_column) if items else None
+        prev_cursor = _cursor_for(items[0], sort_column, id_column) if has_more else None
+        return KeysetPage(items, next_cursor, prev_cursor)
+
+    if after_pos:
+        sort_value, row_id = after_pos
+        query = query.filter(or_(
+            sort_column < sort_value,
+            and_(sort_column == sort_value, id_column < row_id)
+        ))
+
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    items = rows[:per_page]
+    next_cursor = _cursor_for(items[-1], sort_column, id_column) if has_more else None
+    prev_cursor = _cursor_for(items[0], sort_column, id_column) if after_pos and items else None
+    return KeysetPage(items, next_cursor, prev_cursor)
+
+def _cursor_for(row, sort_column, id_column):
+    return encode_cursor(getattr(row, sort_column.key), getattr(row, id_column.key))
@@ -0,0 +1,16 @@
+"""Hash a batch of passwords in a child process: python -m utils.password_hashing
+
+Reads a JSON list of passwords on stdin and writes the JSON list of their
+werkzeug hashes, in the same order, to stdout. It imports nothing from the
+app, so a child costs only an interpreter start and werkzeug.security.
+"""
+import json
+import sys
+from werkzeug.security import generate_password_hash
+
+def main():
+    passwords = json.load(sys.stdin)
+    json.dump([generate_password_hash(password) for password in passwords], sys.stdout)
+
+if __name__ == '__main__':
+    main()
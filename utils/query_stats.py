@@ -0,0 +1,118 @@
+import json
+import logging
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+class NPlusOneDetected(Exception):
+    """Raised at the end of a request that repeated a statement too often, when configured to"""
+
+class RequestQueryStats:
+    """Counts SQL statements and database time per request.
+
+    Every request gets a Server-Timing header (`db;dur=<ms>;desc="<n>
+    queries"`) and one JSON log line with the counts. With
+    N_PLUS_ONE_THRESHOLD set, a statement run that many times with
+    different parameters in one request is reported as a probable N+1:
+    logged as a warning, or raised as NPlusOneDetected when
+    N_PLUS_ONE_RAISE is set (the default under app.testing), so a test
+    client request fails.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.setdefault('QUERY_STATS', True)
+        threshold = app.config.setdefault('N_PLUS_ONE_THRESHOLD', 0)
+        if not threshold and (app.debug or app.testing):
+            threshold = 10
+        self.threshold = threshold
+        self.raise_on_n_plus_one = app.config.setdefault('N_PLUS_ONE_RAISE', app.testing)
+        app.extensions['query_stats'] = self
+        if not self.enabled:
+            return
+
+        # Engine-wide listeners also see queries from background threads;
+        # those have no request context and are ignored.
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        app.before_request(self._start)
+        app.after_request(self._finish)
+
+    def _start(self):
+        g.query_stats = {'count': 0, 'seconds': 0.0, 'statements': {}, 'started': time.perf_counter()}
+
+    def _finish(self, response):
+        stats = g.pop('query_stats', None)
+        if stats is None:
+            return response
+
+        db_ms = stats['seconds'] * 1000
+        total_ms = (time.perf_counter() - stats['started']) * 1000
+        response.headers.add('Server-Timing', f'db;dur={db_ms:.1f};desc="{stats["count"]} queries"')
+        response.headers.add('Server-Timing', f'app;dur={total_ms:.1f}')
+
+        suspects = self._suspects(stats)
+        logger.info(json.dumps({
+            'event': 'request_queries',
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'queries': stats['count'],
+            'db_ms': round(db_ms, 1),
+            'total_ms': round(total_ms, 1),
+            'n_plus_one': len(suspects)
+        }))
+        for statement, executions, variants in suspects:
+            logger.warning('Probable N+1 on %s: %d executions with %d different parameter sets of %s',
+                           request.endpoint, executions, variants, statement)
+        if suspects and self.raise_on_n_plus_one:
+            statement, executions, variants = suspects[0]
+            raise NPlusOneDetected(f'{request.endpoint} ran {executions} times ({variants} parameter sets): {statement}')
+        return response
+
+    def _suspects(self, stats):
+        if not self.threshold:
+            return []
+        return sorted(
+            ((statement, entry['count'], len(entry['parameters']))
+             for statement, entry in stats['statements'].items()
+             if len(entry['parameters']) >= self.threshold),
+            key=lambda suspect: -suspect[1]
+        )
+
+def current_query_stats():
+    """(query count, database seconds) of the current request so far, or None outside a request"""
+    stats = g.get('query_stats') if has_request_context() else None
+    if stats is None:
+        return None
+    return stats['count'], stats['seconds']
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and 'query_stats' in g:
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not (has_request_context() and 'query_stats' in g):
+        return
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    stats = g.query_stats
+    stats['count'] += 1
+    stats['seconds'] += time.perf_counter() - started.pop()
+    entry = stats['statements'].setdefault(statement, {'count': 0, 'parameters': set()})
+    entry['count'] += 1
+    if len(entry['parameters']) < 1000:
+        entry['parameters'].add(repr(parameters))
+
+request_query_stats = RequestQueryStats()
@@ -0,0 +1,38 @@
+from sqlalchemy import func, select
+from app import db
+from models import Agency, Product, Customer, Location, DailySalesRollup
+
+def agency_performance():
+    """Per-agency order, revenue, product and customer totals.
+
+    Order totals come from the daily sales rollup. Each measure is aggregated per agency in its own subquery before being
+    joined to the agency, so rows are never multiplied across tables and the
+    cost stays linear in the size of each table.
+    """
+    orders = select(
+        DailySalesRollup.agency_id,
+        func.sum(DailySalesRollup.order_count).label('total_orders'),
+        func.sum(DailySalesRollup.revenue).label('total_revenue')
+    ).group_by(DailySalesRollup.agency_id).subquery()
+
+    products = select(
+        Product.agency_id,
+        func.count(Product.id).label('total_products')
+    ).group_by(Product.agency_id).subquery()
+
+    customers = select(
+        Location.agency_id,
+        func.count(Customer.id).label('total_customers')
+    ).join(Customer, Customer.location_id == Location.id).group_by(Location.agency_id).subquery()
+
+    return db.session.query(
+        Agency.name,
+        Agency.code,
+        func.coalesce(orders.c.total_orders, 0).label('total_orders'),
+        func.coalesce(orders.c.total_revenue, 0).label('total_revenue'),
+        func.coalesce(products.c.total_products, 0).label('total_products'),
+        func.coalesce(customers.c.total_customers, 0).label('total_customers')
+    ).outerjoin(orders, orders.c.agency_id == Agency.id) \
+     .outerjoin(products, products.c.agency_id == Agency.id) \
+     .outerjoin(customers, customers.c.agency_id == Agency.id) \
+     .order_by(Agency.name).all()
@@ -0,0 +1,139 @@
+from datetime import datetime, timedelta
+import hashlib
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, insert, inspect, select, tuple_
+from sqlalchemy.orm import Session
+from app import db
+from models import Order, DailySalesRollup
+
+# Keys of the rollup buckets touched in the current transaction live in session.info
+_PENDING_KEY = 'sales_rollup_pending'
+
+def _day_of(value):
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+def mark_sales_rollup_dirty(session, agency_id, salesperson_id, created_at):
+    """Schedule the (agency, salesperson, day) bucket of an order for recomputation at commit"""
+    if agency_id is None or salesperson_id is None or created_at is None:
+        return
+    session.info.setdefault(_PENDING_KEY, set()).add(
+        (int(agency_id), int(salesperson_id), _day_of(created_at))
+    )
+
+def _rollup_select(condition):
+    """Aggregate orders matching condition into rollup rows"""
+    day = func.date(Order.created_at)
+    return select(
+        Order.agency_id,
+        Order.salesperson_id,
+        day,
+        Order.status,
+        func.count(Order.id),
+        func.coalesce(func.sum(Order.total_amount), 0),
+        func.coalesce(func.sum(Order.discount), 0),
+        func.coalesce(func.sum(Order.tax), 0)
+    ).where(condition).group_by(Order.agency_id, Order.salesperson_id, day, Order.status)
+
+_ROLLUP_COLUMNS = ['agency_id', 'salesperson_id', 'day', 'status', 'order_count', 'revenue', 'discount', 'tax']
+
+def _bucket_lock_id(key):
+    """A stable 64-bit advisory lock id for an (agency_id, salesperson_id, day) bucket"""
+    digest = hashlib.blake2b(repr(('sales_rollup',) + tuple(key)).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def _lock_buckets(session, keys):
+    """Serialise refreshes of the same buckets until the transaction ends.
+
+    Without this, two transactions committing orders into one bucket on
+    PostgreSQL each delete what their snapshot shows and both insert, so the
+    second fails on the unique key (and would have missed the first's order).
+    Waiting for the lock lets the second one's statements see the first's
+    committed orders. Locks are taken in a fixed order so they cannot
+    deadlock; SQLite already allows a single writer at a time.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return
+    for lock_id in sorted({_bucket_lock_id(key) for key in keys}):
+        session.execute(select(func.pg_advisory_xact_lock(lock_id)))
+
+def refresh_sales_rollup(session, keys):
+    """Recompute the given (agency_id, salesperson_id, day) buckets from the orders table"""
+    _lock_buckets(session, keys)
+    by_day = {}
+    for agency_id, salesperson_id, day in keys:
+        by_day.setdefault(day, set()).add((agency_id, salesperson_id))
+
+    table = DailySalesRollup.__table__
+    for day, pairs in by_day.items():
+        start = datetime.combine(day, datetime.min.time())
+        pairs = list(pairs)
+        session.execute(delete(table).where(
+            table.c.day == day,
+            tuple_(table.c.agency_id, table.c.salesperson_id).in_(pairs)
+        ))
+        session.execute(insert(table).from_select(_ROLLUP_COLUMNS, _rollup_select(
+            (Order.created_at >= start) & (Order.created_at < start + timedelta(days=1))
+            & tuple_(Order.agency_id, Order.salesperson_id).in_(pairs)
+        )))
+
+def backfill_sales_rollup(since=None):
+    """Rebuild the rollup from scratch, or from the day `since` onwards"""
+    table = DailySalesRollup.__table__
+    condition = Order.created_at.isnot(None)
+    if since:
+        condition = condition & (Order.created_at >= datetime.combine(since, datetime.min.time()))
+        db.session.execute(delete(table).where(table.c.day >= since))
+    else:
+        db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(_ROLLUP_COLUMNS, _rollup_select(condition)))
+    db.session.commit()
+    return db.session.query(func.count(DailySalesRollup.id)).scalar()
+
+@event.listens_for(Session, 'before_flush')
+def _collect_deleted_orders(session, flush_context, instances):
+    # Read before the DELETE runs so expired attributes can still be loaded
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            mark_sales_rollup_dirty(session, obj.agency_id, obj.salesperson_id, obj.created_at)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_orders(session, flush_context):
+    # After the INSERT so column defaults such as created_at are populated
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Order):
+            continue
+        state = inspect(obj)
+        mark_sales_rollup_dirty(session, obj.agency_id, obj.salesperson_id, obj.created_at)
+
+        # Orders moved to another agency, salesperson or day also leave a stale old bucket
+        old = {attr: state.attrs[attr].history.deleted for attr in ('agency_id', 'salesperson_id', 'created_at')}
+        if any(old.values()):
+            mark_sales_rollup_dirty(
+                session,
+                (old['agency_id'] or [obj.agency_id])[0],
+                (old['salesperson_id'] or [obj.salesperson_id])[0],
+                (old['created_at'] or [obj.created_at])[0]
+            )
+
+@event.listens_for(Session, 'before_commit')
+def _refresh_pending_buckets(session):
+    session.flush()
+    keys = session.info.pop(_PENDING_KEY, None)
+    if keys:
+        refresh_sales_rollup(session, keys)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_pending_buckets(session):
+    session.info.pop(_PENDING_KEY, None)
+
+@click.command('backfill-sales-rollup')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Only rebuild days on or after this date (YYYY-MM-DD).')
+@with_appcontext
+def backfill_sales_rollup_command(since):
+    """Rebuild the daily sales rollup from the orders table."""
+    rows = backfill_sales_rollup(since.date() if since else None)
+    click.echo(f'Daily sales rollup rebuilt: {rows} rows')
@@ -0,0 +1,217 @@
+"""Indexed substring search over customers, products and orders.
+
+On PostgreSQL the pg_trgm extension backs ILIKE '%term%' with GIN trigram
+indexes and ranks matches by similarity(). On SQLite an FTS5 table with the
+trigram tokenizer per entity, kept in sync by triggers, does the matching
+and bm25 ranks it. Without either index (pg_trgm not installable, SQLite
+built without FTS5, or `flask create-search-index` not run yet) the same
+search runs as plain ILIKE, unindexed. Terms shorter than three characters
+cannot use a trigram index and always run as ILIKE.
+"""
+import logging
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, column, func, literal, or_, select, table, text
+from sqlalchemy.exc import DBAPIError
+from app import db
+from models import Customer, Order, Product
+from utils.cache import cache_delete_prefix, cache_get_or_set
+
+logger = logging.getLogger(__name__)
+
+MIN_TRIGRAM_TERM = 3
+BACKEND_CACHE_TTL = 300
+
+# entity -> (model, {column name: table it lives on}); orders are found by their customer's name too
+SEARCHABLE = {
+    'customers': (Customer, {'name': Customer, 'email': Customer, 'phone': Customer}),
+    'products': (Product, {'name': Product, 'sku': Product, 'category': Product}),
+    'orders': (Order, {'order_number': Order, 'name': Customer}),
+}
+
+def _fts_table(entity):
+    return f'{SEARCHABLE[entity][0].__tablename__}_search'
+
+def _columns(entity):
+    return [getattr(model, name) for name, model in SEARCHABLE[entity][1].items()]
+
+def _sqlite_ddl(entity):
+    """CREATE statements for an entity's FTS5 table and the triggers that keep it current"""
+    fts = _fts_table(entity)
+    if entity == 'orders':
+        orders, customers = Order.__tablename__, Customer.__tablename__
+        return [
+            f"CREATE VIRTUAL TABLE {fts} USING fts5(order_number, customer_name, tokenize='trigram')",
+            f"INSERT INTO {fts}(rowid, order_number, customer_name) SELECT o.id, o.order_number, c.name "
+            f"FROM {orders} o JOIN {customers} c ON c.id = o.customer_id",
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {orders} BEGIN "
+            f"INSERT INTO {fts}(rowid, order_number, customer_name) "
+            f"VALUES (new.id, new.order_number, (SELECT name FROM {customers} WHERE id = new.customer_id)); END",
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {orders} BEGIN "
+            f"DELETE FROM {fts} WHERE rowid = old.id; END",
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF order_number, customer_id ON {orders} BEGIN "
+            f"UPDATE {fts} SET order_number = new.order_number, "
+            f"customer_name = (SELECT name FROM {customers} WHERE id = new.customer_id) WHERE rowid = new.id; END",
+            f"CREATE TRIGGER {fts}_customer_au AFTER UPDATE OF name ON {customers} BEGIN "
+            f"UPDATE {fts} SET customer_name = new.name "
+            f"WHERE rowid IN (SELECT id FROM {orders} WHERE customer_id = new.id); END",
+        ]
+
+    # External content table: the FTS index points at the base table's rows
+    base = SEARCHABLE[entity][0].__tablename__
+    names = list(SEARCHABLE[entity][1])
+    cols = ', '.join(names)
+    new_values = ', '.join(f'new.{name}' for name in names)
+    old_values = ', '.join(f'old.{name}' for name in names)
+    return [
+        f"CREATE VIRTUAL TABLE {fts} USING fts5({cols}, content='{base}', content_rowid='id', tokenize='trigram')",
+        f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {base} BEGIN "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {cols} ON {base} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new_values}); END",
+    ]
+
+def _postgres_indexes():
+    """(index name, table, column) of the trigram indexes, one per searchable column"""
+    indexes = []
+    for _, columns in SEARCHABLE.values():
+        for name, owner in columns.items():
+            index = (f'ix_{owner.__tablename__[4:]}_{name}_trgm', owner.__tablename__, name)
+            if index not in indexes:
+                indexes.append(index)
+    return indexes
+
+def _sqlite_existing():
+    with db.engine.connect() as connection:
+        return {row[0] for row in connection.execute(
+            text("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')"))}
+
+def create_search_index(concurrently=False, rebuild=False, echo=None):
+    """Create the search index for the connected database; returns the objects created.
+
+    Safe to run repeatedly. rebuild drops and recreates the SQLite FTS
+    tables (use it if rows were written with the triggers missing). With
+    concurrently on PostgreSQL the trigram indexes are built without
+    blocking writes, as in `flask create-indexes --concurrently`.
+    """
+    dialect = db.engine.dialect.name
+    created = []
+    if dialect == 'sqlite':
+        existing = _sqlite_existing()
+        with db.engine.begin() as connection:
+            for entity in SEARCHABLE:
+                fts = _fts_table(entity)
+                if rebuild and fts in existing:
+                    for suffix in ('ai', 'ad', 'au', 'customer_au'):
+                        connection.execute(text(f'DROP TRIGGER IF EXISTS {fts}_{suffix}'))
+                    connection.execute(text(f'DROP TABLE {fts}'))
+                    existing.discard(fts)
+                if fts in existing:
+                    continue
+                if echo:
+                    echo(f'Creating {fts}')
+                for statement in _sqlite_ddl(entity):
+                    connection.execute(text(statement))
+                created.append(fts)
+    elif dialect == 'postgresql':
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            connection.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+            present = {row[0] for row in connection.execute(text('SELECT indexname FROM pg_indexes'))}
+            for name, table_name, column_name in _postgres_indexes():
+                if name in present:
+                    continue
+                if echo:
+                    echo(f'Creating {name} on {table_name}')
+                keyword = 'CONCURRENTLY ' if concurrently else ''
+                connection.execute(text(
+                    f'CREATE INDEX {keyword}{name} ON "{table_name}" USING gin ({column_name} gin_trgm_ops)'))
+                created.append(name)
+    cache_delete_prefix(('search_backend',))
+    return created
+
+def search_backend():
+    """'trigram' (PostgreSQL), 'fts5' (SQLite) or 'like' when the index is not in place"""
+    def detect():
+        dialect = db.engine.dialect.name
+        try:
+            if dialect == 'sqlite':
+                existing = _sqlite_existing()
+                return 'fts5' if all(_fts_table(entity) in existing for entity in SEARCHABLE) else 'like'
+            if dialect == 'postgresql':
+                with db.engine.connect() as connection:
+                    installed = connection.execute(
+                        text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first()
+                return 'trigram' if installed else 'like'
+        except DBAPIError:
+            logger.exception('Could not check for the search index')
+        return 'like'
+    return cache_get_or_set(('search_backend', str(db.engine.url)), detect, BACKEND_CACHE_TTL)
+
+def _escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+def _like_filter(entity, tokens):
+    # Every token has to appear in one of the columns
+    return and_(*(
+        or_(*(column_.ilike(f'%{_escape_like(token)}%', escape='\\') for column_ in _columns(entity)))
+        for token in tokens
+    ))
+
+def _from(entity):
+    if entity == 'orders':
+        return select(Order.id).join(Customer, Customer.id == Order.customer_id)
+    return select(SEARCHABLE[entity][0].id)
+
+def _match_subquery(entity, term):
+    """A subquery of (id, score) for the rows matching term, higher scores first"""
+    tokens = term.split()
+    backend = search_backend()
+    first_column = _columns(entity)[0]
+    if backend == 'fts5' and all(len(token) >= MIN_TRIGRAM_TERM for token in tokens):
+        fts = _fts_table(entity)
+        fts_table = table(fts, column('rowid'), column('rank'))
+        match = ' AND '.join('"{}"'.format(token.replace('"', '""')) for token in tokens)
+        # FTS5 rank is bm25, where more relevant is more negative. rowid + 0 keeps
+        # SQLite from probing the FTS table once per outer row (a MATCH each time)
+        # and makes it run the MATCH once as the outer loop instead.
+        return select((fts_table.c.rowid + 0).label('id'), (-fts_table.c.rank).label('score')) \
+            .select_from(fts_table) \
+            .where(text(f'{fts} MATCH :search_match').bindparams(search_match=match)) \
+            .subquery('search_matches')
+
+    if backend == 'trigram':
+        score = func.greatest(*(func.similarity(func.coalesce(column_, ''), term) for column_ in _columns(entity)))
+    else:
+        # Unranked fallback: exact, then prefix matches on the main column first
+        score = case(
+            (func.lower(first_column) == term.lower(), literal(3)),
+            (first_column.ilike(f'{_escape_like(term)}%', escape='\\'), literal(2)),
+            else_=literal(1)
+        )
+    return _from(entity).add_columns(score.label('score')) \
+        .where(_like_filter(entity, tokens)) \
+        .subquery('search_matches')
+
+def apply_search(query, entity, term):
+    """Restrict a query over the entity's model to rows matching term, best matches first"""
+    model = SEARCHABLE[entity][0]
+    matches = _match_subquery(entity, term.strip())
+    return query.join(matches, matches.c.id == model.id) \
+        .order_by(None).order_by(matches.c.score.desc(), model.id.desc())
+
+@click.command('create-search-index')
+@click.option('--concurrently', is_flag=True,
+              help='On PostgreSQL, build the trigram indexes without locking the tables against writes.')
+@click.option('--rebuild', is_flag=True, help='On SQLite, drop and rebuild the FTS5 tables.')
+@with_appcontext
+def create_search_index_command(concurrently, rebuild):
+    """Create the customer, product and order search index."""
+    try:
+        created = create_search_index(concurrently=concurrently, rebuild=rebuild, echo=click.echo)
+    except DBAPIError as e:
+        raise click.ClickException(f'Could not create the search index: {e.orig}')
+    click.echo(f'{len(created)} search index objects created; search backend is {search_backend()}')
@@ -0,0 +1,341 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+import click
+from flask.cli import with_appcontext
+from werkzeug.security import generate_password_hash
+from app import db
+from models import ActivityLog, Agency, Customer, Location, Order, OrderItem, Product, User
+from utils.bulk_import import chunked
+from utils.bulk_load import get_bulk_loader
+from utils.sales_rollup import backfill_sales_rollup
+
+SYNTHETIC_PASSWORD = 'synthetic123'
+
+ORDER_STATUSES = ['delivered', 'shipped', 'confirmed', 'pending', 'cancelled']
+ORDER_STATUS_WEIGHTS = [55, 15, 12, 10, 8]
+CATEGORIES = ['Beverages', 'Snacks', 'Dairy', 'Bakery', 'Frozen', 'Household', 'Personal Care', 'Produce']
+ACTIVITY_ACTIONS = ['login', 'view_orders', 'create_order', 'update_order_status', 'export_orders',
+                    'view_customers', 'import_customers', 'logout']
+CITIES = [('Springfield', 'IL'), ('Riverside', 'CA'), ('Franklin', 'TN'), ('Greenville', 'SC'),
+          ('Madison', 'WI'), ('Salem', 'OR'), ('Georgetown', 'TX'), ('Clinton', 'NY')]
+
+WRITE_CHUNK_SIZE = 5000
+
+def _zipf_weights(count, exponent):
+    """Weights 1/rank^exponent: a few large entries and a long tail, like agency sizes or product popularity"""
+    return [1.0 / (rank + 1) ** exponent for rank in range(count)]
+
+def _split(total, weights, minimum=0):
+    """Split total into integer shares proportional to weights, each at least minimum"""
+    scale = sum(weights)
+    shares = [max(minimum, int(total * weight / scale)) for weight in weights]
+    shares[0] += max(0, total - sum(shares))
+    return shares
+
+def _cumulative(weights):
+    running = 0.0
+    cumulative = []
+    for weight in weights:
+        running += weight
+        cumulative.append(running)
+    return cumulative
+
+def _load(model, rows):
+    loader = get_bulk_loader(model)
+    for chunk in chunked(rows, WRITE_CHUNK_SIZE):
+        loader.insert(chunk)
+        db.session.commit()
+
+class SyntheticDataGenerator:
+    """Builds a deterministic, production-shaped dataset with bulk inserts.
+
+    Agency sizes, product popularity and customer activity follow Zipf
+    distributions; order dates favour weekdays and business hours over
+    the `days` days up to end_date; prices are log-normal. The same seed
+    and end_date always produce the same rows. Every generated code,
+    username and order number starts with prefix, so several datasets can
+    live side by side.
+    """
+
+    def __init__(self, agencies=10, locations_per_agency=5, customers=2000, products_per_agency=200,
+                 salespeople_per_agency=5, orders=10000, max_items_per_order=8, activity_logs=None,
+                 days=365, end_date=None, seed=42, prefix='SYN', echo=None):
+        self.agencies = agencies
+        self.locations_per_agency = locations_per_agency
+        self.customers = customers
+        self.products_per_agency = products_per_agency
+        self.salespeople_per_agency = salespeople_per_agency
+        self.orders = orders
+        self.max_items_per_order = max_items_per_order
+        self.activity_logs = orders if activity_logs is None else activity_logs
+        self.days = days
+        self.prefix = prefix
+        self.rng = random.Random(seed)
+        self.echo = echo or (lambda message: None)
+        # Dates are relative to end_date (default today), not the clock, so reruns match
+        self.now = datetime.combine(end_date or datetime.utcnow().date(), datetime.min.time())
+
+    def generate(self):
+        """Insert the dataset and return the number of rows written per table"""
+        if Agency.query.filter(Agency.code.like(f'{self.prefix}%')).first():
+            raise ValueError(f"A dataset with prefix '{self.prefix}' already exists")
+
+        counts = {}
+        agency_weights = _zipf_weights(self.agencies, 0.8)
+        agency_ids = self._agencies()
+        counts['agencies'] = len(agency_ids)
+        users = self._users(agency_ids)
+        counts['users'] = sum(len(ids) for ids in users.values())
+        locations = self._locations(agency_ids)
+        counts['locations'] = sum(len(ids) for ids in locations.values())
+        customers = self._customers(agency_ids, agency_weights, locations)
+        counts['customers'] = sum(len(ids) for ids in customers.values())
+        products = self._products(agency_ids)
+        counts['products'] = sum(len(items) for items in products.values())
+        counts['orders'], counts['order_items'] = self._orders(agency_ids, agency_weights, users, customers, products)
+        counts['activity_logs'] = self._activity_logs(users)
+
+        started = time.perf_counter()
+        backfill_sales_rollup()
+        self.echo(f'  sales rollup rebuilt in {time.perf_counter() - started:.1f}s')
+        return counts
+
+    def _timed(self, label, fn):
+        started = time.perf_counter()
+        result = fn()
+        self.echo(f'  {label} in {time.perf_counter() - started:.1f}s')
+        return result
+
+    def _agencies(self):
+        def build():
+            _load(Agency, [{
+                'name': f'{self.prefix} Agency {n:04d}',
+                'code': f'{self.prefix}{n:04d}',
+                'email': f'info@{self.prefix.lower()}{n:04d}.example.com',
+                'is_active': True,
+                'created_at': self.now - timedelta(days=self.days)
+            } for n in range(self.agencies)])
+            return [agency_id for agency_id, in db.session.query(Agency.id).filter(
+                Agency.code.like(f'{self.prefix}%')).order_by(Agency.code)]
+        return self._timed(f'{self.agencies} agencies', build)
+
+    def _users(self, agency_ids):
+        """One agency admin and salespeople_per_agency salespeople per agency, all sharing one password hash"""
+        password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+        rows = []
+        for n, agency_id in enumerate(agency_ids):
+            rows.append({
+                'username': f'{self.prefix.lower()}_admin_{n:04d}',
+                'email': f'admin{n:04d}@{self.prefix.lower()}.example.com',
+                'password_hash': password_hash, 'first_name': 'Admin', 'last_name': f'{n:04d}',
+                'role': 'agency_admin', 'agency_id': agency_id, 'is_active': True
+            })
+            for s in range(self.salespeople_per_agency):
+                rows.append({
+                    'username': f'{self.prefix.lower()}_sales_{n:04d}_{s:03d}',
+                    'email': f'sales{n:04d}.{s:03d}@{self.prefix.lower()}.example.com',
+                    'password_hash': password_hash, 'first_name': 'Sales', 'last_name': f'{n:04d}-{s:03d}',
+                    'role': 'salesperson', 'agency_id': agency_id, 'is_active': self.rng.random() > 0.05
+                })
+
+        def build():
+            _load(User, rows)
+            users = {}
+            for user_id, agency_id, role in db.session.query(User.id, User.agency_id, User.role).filter(
+                    User.username.like(f'{self.prefix.lower()}\\_%', escape='\\')).order_by(User.id):
+                users.setdefault((agency_id, role), []).append(user_id)
+            return users
+        return self._timed(f'{len(rows)} users', build)
+
+    def _locations(self, agency_ids):
+        rows = []
+        for n, agency_id in enumerate(agency_ids):
+            for l in range(self.locations_per_agency):
+                city, state = self.rng.choice(CITIES)
+                rows.append({
+                    'name': f'{city} Branch {l + 1}', 'address': f'{self.rng.randint(1, 9999)} Main Street',
+                    'city': city, 'state': state, 'zip_code': f'{self.rng.randint(10000, 99999)}',
+                    'agency_id': agency_id, 'is_active': self.rng.random() > 0.05
+                })
+
+        def build():
+            _load(Location, rows)
+            locations = {}
+            for location_id, agency_id in db.session.query(Location.id, Location.agency_id).filter(
+                    Location.agency_id.in_(agency_ids)).order_by(Location.id):
+                locations.setdefault(agency_id, []).append(location_id)
+            return locations
+        return self._timed(f'{len(rows)} locations', build)
+
+    def _customers(self, agency_ids, agency_weights, locations):
+        rows = []
+        shares = _split(self.customers, agency_weights, minimum=1)
+        for agency_id, share in zip(agency_ids, shares):
+            for c in range(share):
+                rows.append({
+                    'name': f'{self.prefix} Customer {agency_id}-{c:06d}',
+                    'email': f'customer{agency_id}.{c}@example.com' if self.rng.random() > 0.2 else None,
+                    'phone': f'555-{self.rng.randint(1000, 9999)}',
+                    'address': f'{self.rng.randint(1, 9999)} Market Road',
+                    'location_id': self.rng.choice(locations[agency_id]),
+                    'is_active': self.rng.random() > 0.03,
+                    'created_at': self.now - timedelta(days=self.rng.randint(0, self.days))
+                })
+
+        def build():
+            _load(Customer, rows)
+            location_agency = {location_id: agency_id for agency_id, ids in locations.items() for location_id in ids}
+            customers = {}
+            for chunk in chunked(location_agency):
+                for customer_id, location_id in db.session.query(Customer.id, Customer.location_id).filter(
+                        Customer.location_id.in_(chunk)).order_by(Customer.id):
+                    customers.setdefault(location_agency[location_id], []).append(customer_id)
+            return customers
+        return self._timed(f'{len(rows)} customers', build)
+
+    def _products(self, agency_ids):
+        rows = []
+        for n, agency_id in enumerate(agency_ids):
+            for p in range(self.products_per_agency):
+                price = Decimal(str(round(min(self.rng.lognormvariate(3.0, 0.8), 5000), 2))).quantize(Decimal('0.01'))
+                rows.append({
+                    'name': f'{self.rng.choice(CATEGORIES)} Item {p:05d}',
+                    'sku': f'{self.prefix}-{n:04d}-{p:05d}',
+                    'price': price,
+                    'cost': (price * Decimal(str(round(self.rng.uniform(0.4, 0.8), 2)))).quantize(Decimal('0.01')),
+                    'stock_quantity': self.rng.randint(0, 500),
+                    'category': self.rng.choice(CATEGORIES),
+                    'agency_id': agency_id,
+                    'is_active': self.rng.random() > 0.05,
+                    'created_at': self.now - timedelta(days=self.rng.randint(0, self.days))
+                })
+
+        def build():
+            _load(Product, rows)
+            products = {}
+            for product_id, agency_id, price in db.session.query(Product.id, Product.agency_id, Product.price).filter(
+                    Product.sku.like(f'{self.prefix}-%')).order_by(Product.sku):
+                products.setdefault(agency_id, []).append((product_id, Decimal(str(price))))
+            return products
+        return self._timed(f'{len(rows)} products', build)
+
+    def _order_time(self):
+        """A weekday-heavy timestamp during business hours within the last `days` days"""
+        while True:
+            day = self.now - timedelta(days=self.rng.randint(0, self.days - 1))
+            if day.weekday() < 5 or self.rng.random() < 0.4:
+                break
+        return day.replace(hour=self.rng.randint(8, 18), minute=self.rng.randint(0, 59),
+                           second=self.rng.randint(0, 59))
+
+    def _orders(self, agency_ids, agency_weights, users, customers, products):
+        started = time.perf_counter()
+        agency_cumulative = _cumulative(agency_weights)
+        popularity = {agency_id: _cumulative(_zipf_weights(len(items), 1.1)) for agency_id, items in products.items()}
+        customer_activity = {agency_id: _cumulative(_zipf_weights(len(ids), 0.7)) for agency_id, ids in customers.items()}
+        salespeople = {agency_id: users.get((agency_id, 'salesperson')) or users[(agency_id, 'agency_admin')]
+                       for agency_id in agency_ids}
+        order_loader = get_bulk_loader(Order)
+        item_loader = get_bulk_loader(OrderItem)
+        item_count = 0
+
+        for chunk_start in range(0, self.orders, WRITE_CHUNK_SIZE):
+            orders = []
+            lines = {}
+            for n in range(chunk_start, min(chunk_start + WRITE_CHUNK_SIZE, self.orders)):
+                agency_id = self.rng.choices(agency_ids, cum_weights=agency_cumulative)[0]
+                order_number = f'{self.prefix}-{n:09d}'
+                item_total = Decimal('0')
+                order_lines = []
+                line_count = min(self.max_items_per_order, 1 + int(self.rng.expovariate(0.6)))
+                chosen = set(self.rng.choices(range(len(products[agency_id])), cum_weights=popularity[agency_id],
+                                              k=line_count))
+                for index in sorted(chosen):
+                    product_id, price = products[agency_id][index]
+                    quantity = min(50, 1 + int(self.rng.expovariate(0.3)))
+                    total = price * quantity
+                    item_total += total
+                    order_lines.append({'product_id': product_id, 'quantity': quantity,
+                                        'unit_price': price, 'total_price': total})
+                discount = (item_total * Decimal('0.05')).quantize(Decimal('0.01')) if self.rng.random() < 0.15 else Decimal('0')
+                tax = ((item_total - discount) * Decimal('0.08')).quantize(Decimal('0.01'))
+                created_at = self._order_time()
+                status = self.rng.choices(ORDER_STATUSES, weights=ORDER_STATUS_WEIGHTS)[0]
+                orders.append({
+                    'order_number': order_number,
+                    'customer_id': customers[agency_id][
+                        self.rng.choices(range(len(customers[agency_id])), cum_weights=customer_activity[agency_id])[0]],
+                    'agency_id': agency_id,
+                    'salesperson_id': self.rng.choice(salespeople[agency_id]),
+                    'status': status,
+                    'total_amount': item_total - discount + tax,
+                    'discount': discount,
+                    'tax': tax,
+                    'order_date': created_at,
+                    'delivery_date': created_at + timedelta(days=self.rng.randint(1, 7)) if status == 'delivered' else None,
+                    'created_at': created_at
+                })
+                lines[order_number] = order_lines
+
+            order_loader.insert(orders)
+            # Order numbers are zero-padded, so a range scan on the unique index finds the new ids
+            ids = dict(db.session.query(Order.order_number, Order.id).filter(
+                Order.order_number.between(orders[0]['order_number'], orders[-1]['order_number'])))
+            items = [dict(line, order_id=ids[order_number])
+                     for order_number, order_lines in lines.items() for line in order_lines]
+            item_loader.insert(items)
+            db.session.commit()
+            item_count += len(items)
+            done = chunk_start + len(orders)
+            if done % (WRITE_CHUNK_SIZE * 20) == 0 or done == self.orders:
+                self.echo(f'  {done} orders, {item_count} items ({time.perf_counter() - started:.1f}s)')
+        return self.orders, item_count
+
+    def _activity_logs(self, users):
+        user_ids = [user_id for ids in users.values() for user_id in ids]
+        if not user_ids or not self.activity_logs:
+            return 0
+
+        def build():
+            loader = get_bulk_loader(ActivityLog)
+            for chunk_start in range(0, self.activity_logs, WRITE_CHUNK_SIZE):
+                loader.insert([{
+                    'user_id': self.rng.choice(user_ids),
+                    'action': self.rng.choice(ACTIVITY_ACTIONS),
+                    'ip_address': f'10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}',
+                    'user_agent': 'synthetic',
+                    'created_at': self._order_time()
+                } for _ in range(chunk_start, min(chunk_start + WRITE_CHUNK_SIZE, self.activity_logs))])
+                db.session.commit()
+            return self.activity_logs
+        return self._timed(f'{self.activity_logs} activity logs', build)
+
+@click.command('generate-data')
+@click.option('--agencies', default=10, show_default=True)
+@click.option('--locations-per-agency', default=5, show_default=True)
+@click.option('--customers', default=2000, show_default=True)
+@click.option('--products-per-agency', default=200, show_default=True)
+@click.option('--salespeople-per-agency', default=5, show_default=True)
+@click.option('--orders', default=10000, show_default=True)
+@click.option('--max-items-per-order', default=8, show_default=True)
+@click.option('--activity-logs', default=None, type=int, help='Defaults to the number of orders.')
+@click.option('--days', default=365, show_default=True, help='Spread orders over this many days.')
+@click.option('--end-date', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Last day with data (YYYY-MM-DD), defaults to today.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--prefix', default='SYN', show_default=True, help='Prefix for codes, usernames and order numbers.')
+@with_appcontext
+def generate_data_command(**options):
+    """Generate a synthetic dataset for load and scale testing."""
+    started = time.perf_counter()
+    if options['end_date']:
+        options['end_date'] = options['end_date'].date()
+    try:
+        counts = SyntheticDataGenerator(echo=click.echo, **options).generate()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(', '.join(f'{count} {table}' for table, count in counts.items()))
+    click.echo(f'Done in {time.perf_counter() - started:.1f}s. '
+               f'Users log in as {options["prefix"].lower()}_admin_0000 / {SYNTHETIC_PASSWORD}')
@@ -0,0 +1,163 @@
+"""In-memory prefix indexes behind the order form's product and customer typeaheads.
+
+Each agency's active products (found by SKU or by any word of the name)
+and customers (by any word of the name) are loaded once into a sorted list
+of lowercased keys, so a lookup is a bisect and a short scan instead of a
+query over the catalog. An index is dropped when a transaction that
+changed a row it shows commits, and rebuilt on the next lookup; bulk
+imports, which bypass the session, drop it with invalidate_typeahead().
+INDEX_TTL bounds staleness in other worker processes, as for the cached
+filter options.
+"""
+import re
+from bisect import bisect_left
+from flask import current_app, jsonify, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from app import db
+from models import Customer, Location, Product
+from utils.cache import cache_get_or_set, cache_delete_prefix
+
+INDEX_TTL = 300
+
+_WORD = re.compile(r'\w+')
+
+def _words(value):
+    """Lowercased keys for value: its whitespace-separated parts and the words within them"""
+    value = (value or '').lower()
+    return set(value.split()) | set(_WORD.findall(value))
+
+class PrefixIndex:
+    """Rows in display order, looked up by a prefix of any of their keys"""
+
+    def __init__(self, rows, keys):
+        self.rows = rows
+        self._row_keys = []
+        entries = []
+        for position, row in enumerate(rows):
+            row_keys = tuple(keys(row))
+            self._row_keys.append(row_keys)
+            entries.extend((key, position) for key in row_keys)
+        entries.sort()
+        self._keys = [key for key, _ in entries]
+        self._positions = [position for _, position in entries]
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _matching(self, prefix):
+        start = bisect_left(self._keys, prefix)
+        end = bisect_left(self._keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), start)
+        return sorted(set(self._positions[start:end]))
+
+    def lookup(self, term, limit):
+        """The first limit rows where every word of term starts one of the row's keys"""
+        tokens = sorted(term.lower().split(), key=len, reverse=True)
+        if not tokens:
+            return self.rows[:limit]
+
+        # Scan the rows matching the longest (most selective) word and check the others per row
+        results = []
+        for position in self._matching(tokens[0]):
+            row_keys = self._row_keys[position]
+            if all(any(key.startswith(token) for key in row_keys) for token in tokens[1:]):
+                results.append(self.rows[position])
+                if len(results) == limit:
+                    break
+        return results
+
+def _key(kind, agency_id):
+    return ('typeahead', kind, int(agency_id) if agency_id else None)
+
+def get_product_index(agency_id=None):
+    """Index of an agency's active products, or of every agency's when agency_id is None"""
+    def load():
+        query = db.session.query(Product.id, Product.name, Product.sku, Product.price, Product.stock_quantity) \
+            .filter(Product.is_active == True)
+        if agency_id:
+            query = query.filter(Product.agency_id == agency_id)
+        rows = [{
+            'id': p.id,
+            'name': p.name,
+            'sku': p.sku,
+            'price': float(p.price),
+            'stock_quantity': p.stock_quantity or 0
+        } for p in query.order_by(Product.name, Product.id)]
+        return PrefixIndex(rows, lambda row: _words(row['name']) | {row['sku'].lower()})
+    return cache_get_or_set(_key('products', agency_id), load, INDEX_TTL)
+
+def get_customer_index(agency_id=None):
+    """Index of active customers, scoped like get_product_index"""
+    def load():
+        query = db.session.query(Customer.id, Customer.name, Location.name.label('location_name')) \
+            .join(Location, Customer.location_id == Location.id) \
+            .filter(Customer.is_active == True)
+        if agency_id:
+            query = query.filter(Location.agency_id == agency_id)
+        rows = [{
+            'id': c.id,
+            'name': c.name,
+            'location_name': c.location_name
+        } for c in query.order_by(Customer.name, Customer.id)]
+        return PrefixIndex(rows, lambda row: _words(row['name']))
+    return cache_get_or_set(_key('customers', agency_id), load, INDEX_TTL)
+
+def typeahead_response(items):
+    """JSON response for a typeahead lookup that browsers may reuse and revalidate by ETag"""
+    response = jsonify(items)
+    response.cache_control.private = True
+    response.cache_control.max_age = current_app.config['TYPEAHEAD_MAX_AGE']
+    # Results depend on the logged-in user's agency
+    response.vary.add('Cookie')
+    response.add_etag()
+    return response.make_conditional(request)
+
+def invalidate_typeahead(kind, agency_id=None):
+    """Drop an agency's index (and the all-agencies one) so the next lookup rebuilds it"""
+    if agency_id:
+        cache_delete_prefix(_key(kind, agency_id))
+    cache_delete_prefix(_key(kind, None))
+
+# Model -> (index kind, attributes that appear in that index)
+_WATCHED = {
+    Product: ('products', ('name', 'sku', 'price', 'stock_quantity', 'is_active', 'agency_id')),
+    Customer: ('customers', ('name', 'is_active', 'location_id')),
+    Location: ('customers', ('name', 'agency_id')),
+}
+
+# Index keys made stale by the current transaction live in session.info and are
+# only dropped once it commits, as for the filter options: dropping them at
+# flush time would let a concurrent request rebuild an index from the rows as
+# they were before the commit and keep it for INDEX_TTL.
+_STALE_KEY = 'typeahead_stale'
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_indexes(session, flush_context):
+    changed = [(obj, True) for obj in session.new] + [(obj, True) for obj in session.deleted]
+    changed += [(obj, False) for obj in session.dirty]
+
+    stale = session.info.setdefault(_STALE_KEY, set())
+    for obj, always in changed:
+        watched = _WATCHED.get(type(obj))
+        if not watched:
+            continue
+        kind, attrs = watched
+        state = inspect(obj)
+        if not always and not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            continue
+        agency_id = getattr(obj, 'agency_id', None)
+        if agency_id is None or (not always and state.attrs.agency_id.history.has_changes()):
+            # A customer's agency is its location's; rather than look that up mid-flush
+            # (or track both agencies of a moved row) every agency's index is dropped
+            stale.add(('typeahead', kind))
+        else:
+            stale.update((_key(kind, agency_id), _key(kind, None)))
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_indexes(session):
+    for prefix in session.info.pop(_STALE_KEY, ()):
+        cache_delete_prefix(prefix)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_indexes(session):
+    session.info.pop(_STALE_KEY, None)